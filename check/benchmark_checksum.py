@@ -0,0 +1,94 @@
+"""Micro-benchmark for oeleo.utils.calculate_checksum.
+
+Compares the old 8 KiB read loop with the readinto implementation for files
+from 1 KB up to --max-size (default 1 GB; pass 10G for the full range - the files
+are written to --dir and removed afterwards, so make sure there is room).
+
+    python check/benchmark_checksum.py --max-size 10G --algo md5 blake2b
+
+Note that after the first pass the files are in the page cache, so the numbers
+show the hashing overhead rather than the disk speed. Drop the caches (or use
+files larger than RAM) to measure cold reads.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from oeleo.utils import calculate_checksum, new_hash
+
+SIZES = [
+    1_000,
+    100_000,
+    10_000_000,
+    100_000_000,
+    1_000_000_000,
+    10_000_000_000,
+]
+UNITS = {"K": 1_000, "M": 1_000_000, "G": 1_000_000_000}
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().upper()
+    if text[-1] in UNITS:
+        return int(float(text[:-1]) * UNITS[text[-1]])
+    return int(text)
+
+
+def old_checksum(file_path: Path, algo: str) -> str:
+    with open(file_path, "rb") as f:
+        file_hash = new_hash(algo)
+        while chunk := f.read(8192):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+def write_file(file_path: Path, size: int) -> None:
+    block = os.urandom(1_048_576)
+    with open(file_path, "wb") as f:
+        remaining = size
+        while remaining > 0:
+            f.write(block[:remaining])
+            remaining -= len(block)
+
+
+def best_of(repeat: int, func, *args) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-size", default="1G", help="largest file (e.g. 10G)")
+    parser.add_argument("--dir", default=None, help="where to write the test files")
+    parser.add_argument("--algo", nargs="+", default=["md5"])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    max_size = parse_size(args.max_size)
+    sizes = [size for size in SIZES if size <= max_size]
+
+    print(f"{'algo':8} {'size':>14} {'old [s]':>10} {'new [s]':>10} {'MB/s new':>10}")
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        for size in sizes:
+            file_path = Path(tmp) / f"bench_{size}.bin"
+            write_file(file_path, size)
+            for algo in args.algo:
+                assert old_checksum(file_path, algo) == calculate_checksum(
+                    file_path, algo
+                )
+                old = best_of(args.repeat, old_checksum, file_path, algo)
+                new = best_of(args.repeat, calculate_checksum, file_path, algo)
+                rate = size / new / 1e6 if new else float("inf")
+                print(f"{algo:8} {size:>14,} {old:>10.4f} {new:>10.4f} {rate:>10.1f}")
+            file_path.unlink()
+
+
+if __name__ == "__main__":
+    main()
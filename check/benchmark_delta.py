@@ -0,0 +1,198 @@
+"""Benchmark of delta transfers (oeleo.delta) against sending whole files.
+
+For each scenario a file is changed in a typical way and sent again, once in full
+and once as a delta. Without --ssh, the "remote" is a temporary directory and the
+remote scripts run with the local python3, so the numbers show the bytes saved and
+the cpu time of the delta, but no network time:
+
+    python check/benchmark_delta.py --size 200M
+
+With --ssh, the files are sent with an SSHConnector to OELEO_BASE_DIR_TO on
+OELEO_EXTERNAL_HOST (configured as for ssh_worker; the test files are removed
+afterwards):
+
+    python check/benchmark_delta.py --size 1G --ssh
+"""
+
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+from pathlib import Path, PurePosixPath
+from types import SimpleNamespace
+
+from oeleo.connectors import SSHConnector
+from oeleo.delta import delta_block_size
+
+UNITS = {"K": 1_000, "M": 1_000_000, "G": 1_000_000_000}
+SCENARIOS = ["header", "insert", "append", "rewrite"]
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().upper()
+    if text[-1] in UNITS:
+        return int(float(text[:-1]) * UNITS[text[-1]])
+    return int(text)
+
+
+def write_random(file_path: Path, size: int) -> None:
+    with open(file_path, "wb") as f:
+        remaining = size
+        while remaining > 0:
+            f.write(os.urandom(min(remaining, 1_048_576)))
+            remaining -= 1_048_576
+
+
+def change(file_path: Path, scenario: str) -> None:
+    size = file_path.stat().st_size
+    with open(file_path, "r+b") as f:
+        if scenario == "header":
+            f.write(b"rewritten header".ljust(512, b"\0"))
+        elif scenario == "append":
+            f.seek(0, 2)
+            f.write(os.urandom(100_000))
+        elif scenario == "insert":
+            f.seek(size // 2)
+            rest = f.read()
+            f.seek(size // 2)
+            f.write(b"inserted record" + rest)
+        elif scenario == "rewrite":
+            f.seek(0)
+            f.write(os.urandom(size))
+
+
+class CountingSFTP:
+    """Counts the bytes written through an SFTP client (or to local files)."""
+
+    def __init__(self, sftp=None):
+        self.sftp = sftp
+        self.sent = 0
+
+    def open(self, name, mode, bufsize=-1):
+        if self.sftp is None:
+            f = open(name, mode)
+            f.set_pipelined = lambda pipelined: None
+        else:
+            f = self.sftp.open(name, mode, bufsize)
+        write = f.write
+
+        def counting_write(data):
+            self.sent += len(data)
+            return write(data)
+
+        f.write = counting_write
+        return f
+
+    def chmod(self, name, mode):
+        (self.sftp or os).chmod(name, mode)
+
+
+def local_connector(remote_dir: Path):
+    os.environ.setdefault("OELEO_USERNAME", "benchmark")
+    os.environ.setdefault("OELEO_EXTERNAL_HOST", "localhost")
+    connector = SSHConnector(directory=remote_dir, delta_transfer=True)
+    sftp = CountingSFTP()
+    connector._get_sftp = lambda c: sftp
+
+    def run(cmd, **kwargs):
+        out = subprocess.run(["sh", "-c", cmd], capture_output=True, text=True)
+        return SimpleNamespace(ok=out.returncode == 0, stdout=out.stdout, stderr="")
+
+    c = SimpleNamespace(run=run)
+    return connector, c, sftp
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def bench_local(size: int, tmp: Path) -> None:
+    remote_dir = tmp / "remote"
+    remote_dir.mkdir()
+    connector, c, sftp = local_connector(remote_dir)
+    local = tmp / "local.bin"
+    remote = remote_dir / "local.bin"
+    for scenario in SCENARIOS:
+        write_random(local, size)
+        shutil.copyfile(local, remote)
+        change(local, scenario)
+
+        _, full_time = timed(shutil.copyfile, local, tmp / "full.bin")
+        sftp.sent = 0
+        ok, delta_time = timed(connector._delta_put, local, remote, c)
+        assert ok and remote.read_bytes() == local.read_bytes()
+        new_size = local.stat().st_size
+        report(scenario, new_size, new_size, full_time, sftp.sent, delta_time)
+
+
+def bench_ssh(size: int, tmp: Path) -> None:
+    connector = SSHConnector(delta_transfer=True)
+    connector.connect()
+    get_sftp = connector._get_sftp
+    sftp = None
+
+    def counting_sftp(c):
+        nonlocal sftp
+        if sftp is None:
+            sftp = CountingSFTP(get_sftp(c))
+        return sftp
+
+    connector._get_sftp = counting_sftp
+    remote = PurePosixPath(connector.directory) / "oeleo-delta-benchmark.bin"
+    original = tmp / "original.bin"
+    local = tmp / "local.bin"
+    try:
+        with connector._borrow() as c:
+            for scenario in SCENARIOS:
+                write_random(original, size)
+                shutil.copyfile(original, local)
+                change(local, scenario)
+
+                connector._put_file(original, remote, c)
+                sftp.sent = 0
+                _, full_time = timed(connector._put_file, local, remote, c)
+                full_sent = sftp.sent
+
+                connector._put_file(original, remote, c)
+                sftp.sent = 0
+                ok, delta_time = timed(connector._delta_put, local, remote, c)
+                assert ok
+                new_size = local.stat().st_size
+                report(scenario, new_size, full_sent, full_time, sftp.sent, delta_time)
+            c.run(f"rm -f {connector._remote_shell_token(remote)}", hide=True)
+    finally:
+        connector.close()
+
+
+def report(scenario, size, full_sent, full_time, delta_sent, delta_time):
+    print(
+        f"{scenario:8} {size:>14,} {delta_block_size(size):>8,} "
+        f"{full_sent:>14,} {full_time:>9.3f} {delta_sent:>14,} {delta_time:>9.3f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", default="100M", help="size of the test file")
+    parser.add_argument("--dir", default=None, help="where to write the test files")
+    parser.add_argument("--ssh", action="store_true", help="send to a real remote")
+    args = parser.parse_args()
+
+    size = parse_size(args.size)
+    print(
+        f"{'scenario':8} {'size':>14} {'block':>8} "
+        f"{'full [B]':>14} {'full [s]':>9} {'delta [B]':>14} {'delta [s]':>9}"
+    )
+    with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+        if args.ssh:
+            bench_ssh(size, Path(tmp))
+        else:
+            bench_local(size, Path(tmp))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""A long-lived helper process on the SSH remote that runs shell commands.
+
+Every ``Connection.run`` opens a new exec channel and starts a new login shell on
+the remote, which costs a round trip or two plus the shell startup for each
+command. With `SSHConnector(remote_agent=True)`, AGENT_SCRIPT is started once per
+connection with ``python3 -c`` and reads one JSON request per line on its stdin:
+
+    {"id": 1, "cmd": "mkdir -p /data/pub/2024"}
+
+runs the command with ``/bin/sh``, and answers on its stdout with one line:
+
+    {"id": 1, "status": 0, "stdout": "", "stderr": ""}
+
+Requests can be sent before the replies of earlier ones have arrived (see
+`RemoteAgent.run_many`). `AgentConnection` wraps a fabric Connection so that its
+``run`` goes through the agent while everything else (sftp, exec_command, ...)
+still uses the connection itself.
+"""
+
+import json
+import logging
+import shlex
+import socket
+import threading
+from typing import Any, List, Optional, Tuple
+
+from invoke import Result, UnexpectedExit
+
+log = logging.getLogger("oeleo")
+
+# seconds to wait for the agent to report that it is ready
+AGENT_START_TIMEOUT = 15
+# requests sent ahead of their replies (keeps both ssh windows from filling up)
+AGENT_PIPELINE_DEPTH = 32
+
+AGENT_SCRIPT = """
+import json, subprocess, sys
+out = sys.stdout
+out.write('{"ready": 1}\\n')
+out.flush()
+for line in sys.stdin:
+    request = json.loads(line)
+    try:
+        p = subprocess.run(
+            request["cmd"], shell=True, stdin=subprocess.DEVNULL, capture_output=True
+        )
+        status, stdout, stderr = p.returncode, p.stdout, p.stderr
+    except Exception as e:
+        status, stdout, stderr = 127, b"", str(e).encode()
+    reply = {
+        "id": request["id"],
+        "status": status,
+        "stdout": stdout.decode("utf-8", "surrogateescape"),
+        "stderr": stderr.decode("utf-8", "surrogateescape"),
+    }
+    out.write(json.dumps(reply) + "\\n")
+    out.flush()
+"""
+
+# (exit status, stdout, stderr)
+Reply = Tuple[int, str, str]
+
+
+class RemoteAgent:
+    """Client side of AGENT_SCRIPT running on the other end of an exec channel.
+
+    Requests are serialized with a lock, so an agent may be shared by threads.
+    """
+
+    def __init__(self, stdin, stdout):
+        self.stdin = stdin
+        self.stdout = stdout
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def start(cls, c, timeout: float = AGENT_START_TIMEOUT) -> Optional["RemoteAgent"]:
+        """Start the agent on connection c; None if it does not come up (no python3)."""
+        c.open()
+        stdin, stdout, _ = c.client.exec_command(
+            f"python3 -u -c {shlex.quote(AGENT_SCRIPT)}"
+        )
+        agent = cls(stdin, stdout)
+        stdout.channel.settimeout(timeout)
+        try:
+            ready = json.loads(stdout.readline() or "{}").get("ready") == 1
+        except (socket.timeout, ValueError):
+            ready = False
+        if not ready:
+            agent.close()
+            return None
+        stdout.channel.settimeout(None)
+        return agent
+
+    def run(self, cmd: str) -> Reply:
+        return self.run_many([cmd])[0]
+
+    def run_many(self, cmds: List[str]) -> List[Reply]:
+        """Run the commands one after the other, sending them ahead of the replies."""
+        replies = []
+        with self._lock:
+            for i in range(0, len(cmds), AGENT_PIPELINE_DEPTH):
+                ids = []
+                for cmd in cmds[i : i + AGENT_PIPELINE_DEPTH]:
+                    self._next_id += 1
+                    ids.append(self._next_id)
+                    request = json.dumps({"id": self._next_id, "cmd": cmd}) + "\n"
+                    self.stdin.write(request.encode())
+                self.stdin.flush()
+                received = {}
+                while len(received) < len(ids):
+                    line = self.stdout.readline()
+                    if not line:
+                        raise EOFError("the remote agent has stopped")
+                    reply = json.loads(line)
+                    received[reply["id"]] = reply
+                replies.extend(
+                    (r["status"], r["stdout"], r["stderr"])
+                    for r in (received[n] for n in ids)
+                )
+        return replies
+
+    def close(self) -> None:
+        try:
+            self.stdin.close()
+            self.stdout.channel.close()
+        except Exception as e:
+            log.debug(f"Got an exception during closing the remote agent: {e}")
+
+
+class AgentConnection:
+    """A fabric Connection whose `run` goes through a RemoteAgent.
+
+    If the agent fails, it is dropped and the command (and all later ones) is run
+    on the connection itself.
+    """
+
+    def __init__(self, connection, agent: RemoteAgent):
+        self.connection = connection
+        self.agent = agent
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.connection, name)
+
+    def run(self, command: str, warn: bool = False, **kwargs) -> Result:
+        return self.run_many([command], warn=warn, **kwargs)[0]
+
+    def run_many(self, commands: List[str], warn: bool = False, **kwargs) -> list:
+        """Run several commands, pipelined through the agent if it is up."""
+        if self.agent is not None:
+            try:
+                replies = self.agent.run_many(commands)
+            except Exception as e:
+                log.debug(f"The remote agent failed - using plain exec: {e}")
+                self.close_agent()
+            else:
+                return [
+                    self._result(command, reply, warn)
+                    for command, reply in zip(commands, replies)
+                ]
+        return [self.connection.run(cmd, warn=warn, **kwargs) for cmd in commands]
+
+    @staticmethod
+    def _result(command: str, reply: Reply, warn: bool) -> Result:
+        status, stdout, stderr = reply
+        result = Result(stdout=stdout, stderr=stderr, command=command, exited=status)
+        if not warn and not result.ok:
+            raise UnexpectedExit(result)
+        return result
+
+    def close_agent(self) -> None:
+        if self.agent is not None:
+            self.agent.close()
+            self.agent = None
+
+
+def unwrap(c):
+    """The fabric Connection behind c (c itself unless it is an AgentConnection)."""
+    return c.connection if isinstance(c, AgentConnection) else c
@@ -0,0 +1,357 @@
+import datetime
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
+
+from oeleo.models import STAT_FIELDS, ChecksumCacheEntry, DirectoryState
+from oeleo.utils import to_bool
+
+CHECKSUM_CACHE_SIZE = 100_000
+# seconds between the full scans of an incremental scan (see DirectoryIndex)
+FULL_SCAN_INTERVAL = 86_400
+
+log = logging.getLogger("oeleo")
+
+CacheKey = Tuple[str, str]  # (path, hash algorithm)
+
+
+def make_checksum_cache(size: Union[int, None] = None) -> Optional["ChecksumCache"]:
+    """Create a ChecksumCache of the resolved size (None if the cache is turned off)."""
+    size = resolve_checksum_cache_size(size)
+    return ChecksumCache(size) if size else None
+
+
+def resolve_checksum_cache_size(size: Union[int, None] = None) -> int:
+    """Resolve the cache size: explicit kwarg, else OELEO_CHECKSUM_CACHE_SIZE, else
+    CHECKSUM_CACHE_SIZE. A size of 0 turns the cache off."""
+    if size is None:
+        raw = os.environ.get("OELEO_CHECKSUM_CACHE_SIZE")
+        if raw is None or raw == "":
+            return CHECKSUM_CACHE_SIZE
+        try:
+            size = int(raw)
+        except ValueError as e:
+            raise ValueError(
+                f"OELEO_CHECKSUM_CACHE_SIZE must be an integer, got {raw!r}"
+            ) from e
+    size = int(size)
+    if size < 0:
+        raise ValueError("the checksum cache size must be 0 or more")
+    return size
+
+
+class ChecksumCache:
+    """Checksums of local files keyed by path and hash algorithm.
+
+    An entry is only returned while the file has the size, mtime and inode it had
+    when it was hashed. The entries live in an in-memory LRU of at most `max_entries`
+    items that may be used from several threads. `load` and `flush` move them to and
+    from the checksumcache table and must be called from the thread that owns the db
+    connection (the worker calls them between chunks).
+    """
+
+    def __init__(self, max_entries: int = CHECKSUM_CACHE_SIZE):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[CacheKey, Dict[str, Any]]" = OrderedDict()
+        self._used = set()  # keys to write (new, changed or used since last flush)
+        self._evicted = set()  # keys to delete
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self)}
+
+    @staticmethod
+    def _key(path: Path, algo: str) -> CacheKey:
+        return str(path), algo
+
+    @staticmethod
+    def _matches(entry: Dict[str, Any], stat: Dict[str, Any]) -> bool:
+        for k in STAT_FIELDS:
+            if k == "inode" and (entry[k] is None or stat[k] is None):
+                continue
+            if entry[k] != stat[k]:
+                return False
+        return True
+
+    def get(self, path: Path, stat: Dict[str, Any], algo: str) -> Optional[str]:
+        """Return the cached checksum if the file still has this stat fingerprint."""
+        key = self._key(path, algo)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not self._matches(entry, stat):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._used.add(key)
+            self.hits += 1
+            return entry["checksum"]
+
+    def put(self, path: Path, stat: Dict[str, Any], algo: str, checksum: str) -> None:
+        key = self._key(path, algo)
+        entry = {k: stat.get(k) for k in STAT_FIELDS}
+        entry["checksum"] = checksum
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._used.add(key)
+            self._evicted.discard(key)
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                self._used.discard(old_key)
+                self._evicted.add(old_key)
+
+    def load(self) -> None:
+        """Fill the cache with the most recently used entries of the table."""
+        query = (
+            ChecksumCacheEntry.select()
+            .order_by(ChecksumCacheEntry.last_used.desc())
+            .limit(self.max_entries)
+        )
+        entries = OrderedDict()
+        for row in reversed(list(query)):
+            entry = {k: getattr(row, k) for k in STAT_FIELDS}
+            entry["checksum"] = row.checksum
+            entries[(row.path, row.hash_algo)] = entry
+        with self._lock:
+            entries.update(self._entries)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+            self._entries = entries
+        log.debug(f"Loaded {len(entries)} cached checksums")
+
+    def flush(self) -> None:
+        """Write new and used entries to the table and delete the evicted ones."""
+        with self._lock:
+            used = [(key, dict(self._entries[key])) for key in self._used]
+            evicted = list(self._evicted)
+            self._used.clear()
+            self._evicted.clear()
+        if not used and not evicted:
+            return
+        now = datetime.datetime.now()
+        model = ChecksumCacheEntry
+        with model._meta.database.atomic():
+            for path, algo in evicted:
+                model.delete().where(
+                    (model.path == path) & (model.hash_algo == algo)
+                ).execute()
+            rows = [
+                {"path": path, "hash_algo": algo, "last_used": now, **entry}
+                for (path, algo), entry in used
+            ]
+            for i in range(0, len(rows), 100):
+                model.replace_many(rows[i : i + 100]).execute()
+        self._trim()
+
+    def _trim(self) -> None:
+        # entries evicted in an earlier session are still in the table
+        model = ChecksumCacheEntry
+        surplus = model.select().count() - self.max_entries
+        if surplus > 0:
+            oldest = model.select(model.id).order_by(model.last_used).limit(surplus)
+            model.delete().where(model.id.in_(oldest)).execute()
+
+
+def make_directory_index(
+    incremental_scan: Union[bool, None] = None,
+    full_scan_interval: Union[float, None] = None,
+) -> Optional["DirectoryIndex"]:
+    """Create a DirectoryIndex if incremental scanning is turned on (else None)."""
+    if not resolve_incremental_scan(incremental_scan):
+        return None
+    return DirectoryIndex(resolve_full_scan_interval(full_scan_interval))
+
+
+def resolve_incremental_scan(incremental_scan: Union[bool, None] = None) -> bool:
+    """Resolve incremental scanning: explicit kwarg, else OELEO_INCREMENTAL_SCAN, else
+    False."""
+    if incremental_scan is not None:
+        return incremental_scan
+    raw = os.environ.get("OELEO_INCREMENTAL_SCAN")
+    if raw is None or raw == "":
+        return False
+    return to_bool(raw)
+
+
+def resolve_full_scan_interval(full_scan_interval: Union[float, None] = None) -> float:
+    """Resolve the seconds between full scans: explicit kwarg, else
+    OELEO_FULL_SCAN_INTERVAL, else FULL_SCAN_INTERVAL."""
+    if full_scan_interval is None:
+        raw = os.environ.get("OELEO_FULL_SCAN_INTERVAL")
+        if raw is None or raw == "":
+            return FULL_SCAN_INTERVAL
+        try:
+            full_scan_interval = float(raw)
+        except ValueError as e:
+            raise ValueError(
+                f"OELEO_FULL_SCAN_INTERVAL must be a number, got {raw!r}"
+            ) from e
+    full_scan_interval = float(full_scan_interval)
+    if full_scan_interval < 0:
+        raise ValueError("the full scan interval must be 0 or more")
+    return full_scan_interval
+
+
+class DirectoryIndex:
+    """The mtime, entry count and subdirectories of scanned local directories.
+
+    Used by `scan_files` for incremental scans: a directory whose mtime is the one
+    it had when it was last listed is not listed again, only its known
+    subdirectories are visited. Creating, deleting or renaming a file changes the
+    mtime of its directory, but writing to a file does not. A directory is
+    therefore always listed when it, or the newest of its files when it was last
+    listed, was modified within the last `full_scan_interval` seconds (where the
+    instruments are writing), and the first scan and then one scan every
+    `full_scan_interval` seconds list everything. A file that starts changing
+    again after being left alone for longer, in a directory that did not change
+    either, is only seen by the next full scan (at most `full_scan_interval`
+    seconds later). The directories in `pending` (holding files that are still
+    to be transferred, see `Worker.run`) are listed by every scan.
+
+    `load` and `flush` move the states to and from the directorystate table and
+    must be called from the thread that owns the db connection.
+    """
+
+    def __init__(self, full_scan_interval: float = FULL_SCAN_INTERVAL):
+        self.full_scan_interval = full_scan_interval
+        self.last_full_scan: Optional[float] = None  # time.time() at its start
+        self.full = True
+        self.listed = 0
+        self.skipped = 0
+        self.skipped_dirs: Set[str] = set()  # the directories skipped by this scan
+        self.pending: Set[str] = set()  # directories that are never skipped
+        self._scan_started = 0.0
+        self._states: Dict[str, Dict[str, Any]] = {}
+        self._children: Dict[str, Set[str]] = {}
+        self._dirty: Set[str] = set()  # paths to write
+        self._removed: Set[str] = set()  # paths to delete
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    @property
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "full": self.full,
+            "listed": self.listed,
+            "skipped": self.skipped,
+            "directories": len(self),
+        }
+
+    def start_scan(self, full: bool = False) -> bool:
+        """Start counting a new scan; return True if it has to be a full one.
+
+        With full=True the scan lists everything, whenever the last full scan was.
+        """
+        now = time.time()
+        self.full = (
+            full
+            or self.last_full_scan is None
+            or now - self.last_full_scan >= self.full_scan_interval
+        )
+        if self.full:
+            self.last_full_scan = now
+        self._scan_started = now
+        self.listed = self.skipped = 0
+        self.skipped_dirs = set()
+        return self.full
+
+    def skip(self, path: str, mtime_ns: int) -> bool:
+        """True if the directory does not need to be listed in this scan."""
+        state = self._states.get(path)
+        unchanged = (
+            not self.full
+            and state is not None
+            and path not in self.pending
+            and state["mtime_ns"] == mtime_ns
+            and self._scan_started - mtime_ns / 1e9 > self.full_scan_interval
+            and self._scan_started - state["newest_ns"] / 1e9 > self.full_scan_interval
+        )
+        if unchanged:
+            self.skipped += 1
+            self.skipped_dirs.add(path)
+        return unchanged
+
+    def subdirs(self, path: str) -> List[str]:
+        return sorted(self._children.get(path, ()))
+
+    def update(
+        self,
+        path: str,
+        mtime_ns: int,
+        entries: int,
+        subdirs: List[str],
+        newest_ns: int = 0,
+    ):
+        """Store what listing the directory found (mtime_ns is from before listing).
+
+        newest_ns is the mtime of the newest file found (0 if there were none).
+        """
+        self.listed += 1
+        for gone in self._children.get(path, set()) - set(subdirs):
+            self.forget(gone)
+        self._children[path] = set(subdirs)
+        state = {
+            "parent": os.path.dirname(path),
+            "mtime_ns": mtime_ns,
+            "entries": entries,
+            "newest_ns": newest_ns,
+        }
+        if self._states.get(path) != state:
+            self._states[path] = state
+            self._dirty.add(path)
+            self._removed.discard(path)
+
+    def forget(self, path: str) -> None:
+        """Drop a directory that is gone, with everything below it."""
+        for child in self._children.pop(path, set()):
+            self.forget(child)
+        if self._states.pop(path, None) is not None:
+            self._removed.add(path)
+        self._dirty.discard(path)
+        self._children.get(os.path.dirname(path), set()).discard(path)
+
+    def load(self) -> None:
+        """Read the stored directory states."""
+        self._states.clear()
+        self._children.clear()
+        for row in DirectoryState.select():
+            self._states[row.path] = {
+                "parent": row.parent,
+                "mtime_ns": row.mtime_ns,
+                "entries": row.entries,
+                "newest_ns": row.newest_ns,
+            }
+            self._children.setdefault(row.parent, set()).add(row.path)
+        log.debug(f"Loaded the states of {len(self)} directories")
+
+    def flush(self) -> None:
+        """Write new and changed states to the table and delete the forgotten ones."""
+        if not self._dirty and not self._removed:
+            return
+        now = datetime.datetime.now()
+        model = DirectoryState
+        removed = list(self._removed)
+        rows = [
+            {"path": path, "scanned_date": now, **self._states[path]}
+            for path in self._dirty
+        ]
+        with model._meta.database.atomic():
+            for i in range(0, len(removed), 100):
+                model.delete().where(model.path.in_(removed[i : i + 100])).execute()
+            for i in range(0, len(rows), 100):
+                model.replace_many(rows[i : i + 100]).execute()
+        self._dirty.clear()
+        self._removed.clear()
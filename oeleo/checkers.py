@@ -1,7 +1,64 @@
+import datetime
+import logging
+import os
 from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Iterable, Union
 
-from oeleo.utils import calculate_checksum
+from oeleo.models import LEGACY_HASH_ALGO, STAT_FIELDS
+from oeleo.utils import (
+    QUICK_HASH_SAMPLE_SIZE,
+    HashSink,
+    calculate_checksum,
+    calculate_checksums,
+    calculate_quick_hash,
+    resolve_hash_algo,
+    stat_fingerprint,
+)
+
+CHECK_MODES = ("stat", "quick", "full")
+# in 'quick' mode, a file is read in full again when its last full read is this old
+FULL_VERIFY_DAYS = 7
+
+log = logging.getLogger("oeleo")
+
+
+def resolve_check_mode(mode: str = None) -> str:
+    """Resolve the checker mode: explicit kwarg, else OELEO_CHECK_MODE, else 'stat'."""
+    if mode is None:
+        mode = os.environ.get("OELEO_CHECK_MODE") or "stat"
+    mode = mode.lower()
+    if mode not in CHECK_MODES:
+        raise ValueError(f"check mode must be one of {CHECK_MODES}, got {mode!r}")
+    return mode
+
+
+def _resolve_number(value: Any, env_var: str, default: Any, convert=int) -> Any:
+    if value is None:
+        raw = os.environ.get(env_var)
+        if raw is None or raw == "":
+            return default
+        try:
+            value = convert(raw)
+        except ValueError as e:
+            raise ValueError(f"{env_var} must be a number, got {raw!r}") from e
+    if value < 0:
+        raise ValueError(f"{env_var} must be 0 or more, got {value!r}")
+    return value
+
+
+def resolve_quick_hash_size(size: int = None) -> int:
+    """Resolve the quick hash sample size in bytes: explicit kwarg, else
+    OELEO_QUICK_HASH_SIZE, else 1 MiB."""
+    size = _resolve_number(size, "OELEO_QUICK_HASH_SIZE", QUICK_HASH_SAMPLE_SIZE)
+    if size < 1:
+        raise ValueError("the quick hash sample size must be at least 1 byte")
+    return int(size)
+
+
+def resolve_full_verify_days(days: float = None) -> float:
+    """Resolve the full verification interval: explicit kwarg, else
+    OELEO_FULL_VERIFY_DAYS, else 7 days (0 turns the periodic verification off)."""
+    return _resolve_number(days, "OELEO_FULL_VERIFY_DAYS", FULL_VERIFY_DAYS, float)
 
 
 class Checker:
@@ -11,14 +68,238 @@ class Checker:
     def check(self, f: Path) -> Dict[str, str]:
         pass
 
+    def hash_sink(self) -> Any:
+        """Return a sink that hashes a file during its transfer, or None if the
+        checker cannot take its checksum from the transferred bytes."""
+        return None
+
+    def remember(self, f: Path, checks: Dict[str, Any]) -> None:
+        """Take note of checks of f that were calculated outside the checker."""
+        pass
+
+    def check_many(
+        self, files: Iterable[Path], connector: Any = None, **kwargs
+    ) -> Dict[Path, Dict[str, Any]]:
+        """Check several files; files that could not be checked are left out."""
+        results = {}
+        for f in files:
+            try:
+                results[f] = self.check(f, connector=connector, **kwargs)
+            except Exception as e:
+                log.debug(f"Could not check {f}: {e}")
+        return results
+
 
 class ChecksumChecker(Checker):
+    """Checks files by checksum.
+
+    In 'stat' mode (default) a local file is only re-hashed when its size, mtime or
+    inode differ from the values stored in the record from the previous run; otherwise
+    the stored checksum is re-used. Use mode='full' (or OELEO_CHECK_MODE=full) to
+    always read and hash every file.
+
+    The hash algorithm is given by algo (or OELEO_HASH_ALGO, default md5; see
+    `oeleo.utils.HASH_ALGORITHMS`) and is returned as 'hash_algo' in the checks. When
+    a file whose record holds a checksum of another algorithm is hashed, the file is
+    read once and hashed with both, the old one being returned as 'legacy_checksum'.
+
+    In 'stat' and 'quick' mode, a `oeleo.cache.ChecksumCache` given as cache is
+    consulted before a file is read, and is given every checksum the checker calculates.
+
+    The 'quick' mode works like 'stat' mode, with a tier between the stat fingerprint
+    and the full checksum for files larger than three samples of quick_size bytes
+    (or OELEO_QUICK_HASH_SIZE, default 1 MiB): the size and the first, middle and
+    last samples are hashed and compared with the 'quick_hash' of the record. If
+    they match, the stored checksum is re-used. Files that were last read in full
+    more than verify_days (or OELEO_FULL_VERIFY_DAYS, default 7) days ago are read
+    in full anyway. `check_many` compares remote copies by their quick hashes when
+    the connector can calculate them.
+    """
+
+    def __init__(
+        self,
+        mode: str = None,
+        algo: str = None,
+        cache: Any = None,
+        quick_size: int = None,
+        verify_days: float = None,
+    ):
+        super().__init__()
+        self.mode = resolve_check_mode(mode)
+        self.algo = resolve_hash_algo(algo)
+        self.cache = cache
+        self.quick_size = resolve_quick_hash_size(quick_size)
+        self.verify_days = resolve_full_verify_days(verify_days)
+
     @staticmethod
-    def check(f: Path, connector: Any = None, **kwargs) -> Dict[str, str]:
-        """Calculates checksum using method provided by the connector"""
-        if connector is not None:
-            connector_calculate_checksum = connector.calculate_checksum
+    def _stat_matches(record: Any, stat: Dict[str, Any]) -> bool:
+        if record is None or not getattr(record, "checksum", None):
+            return False
+        for k in STAT_FIELDS:
+            stored = getattr(record, k, None)
+            if k == "inode" and (stored is None or stat[k] is None):
+                continue
+            if stored != stat[k]:
+                return False
+        return True
+
+    def _uses_quick_hash(self, size: Union[int, None]) -> bool:
+        return self.mode == "quick" and size is not None and size > 3 * self.quick_size
+
+    def _verification_due(self, record: Any) -> bool:
+        if self.mode != "quick" or not self.verify_days:
+            return False
+        if record is None or not getattr(record, "checksum", None):
+            return False
+        verified_date = getattr(record, "verified_date", None)
+        if verified_date is None:
+            return True
+        age = datetime.datetime.now() - verified_date
+        return age >= datetime.timedelta(days=self.verify_days)
+
+    def _quick_hash_matches(self, record: Any, checks: Dict[str, Any]) -> bool:
+        if record is None or not getattr(record, "checksum", None):
+            return False
+        if (getattr(record, "hash_algo", None) or LEGACY_HASH_ALGO) != self.algo:
+            return False
+        return (
+            getattr(record, "quick_hash", None) == checks["quick_hash"]
+            and getattr(record, "size", None) == checks["size"]
+        )
+
+    def hash_sink(self) -> HashSink:
+        return HashSink(self.algo)
+
+    def remember(self, f: Path, checks: Dict[str, Any]) -> None:
+        if self.cache is not None and checks.get("checksum"):
+            algo = checks.get("hash_algo", self.algo)
+            self.cache.put(f, checks, algo, checks["checksum"])
+
+    def _cached_checks(
+        self, f: Path, stat: Dict[str, Any], record_algo: Union[str, None]
+    ) -> Union[Dict[str, Any], None]:
+        if self.cache is None:
+            return None
+        checksum = self.cache.get(f, stat, self.algo)
+        if checksum is None:
+            return None
+        checks = {"checksum": checksum, "hash_algo": self.algo, **stat}
+        if record_algo is not None and record_algo != self.algo:
+            legacy_checksum = self.cache.get(f, stat, record_algo)
+            if legacy_checksum is None:
+                return None
+            checks["legacy_checksum"] = legacy_checksum
+        return checks
+
+    def check(
+        self,
+        f: Path,
+        connector: Any = None,
+        record: Any = None,
+        defer: bool = False,
+        **kwargs,
+    ) -> Dict[str, Any]:
+        """Calculates checksum using method provided by the connector.
+
+        Local files also get their stat fingerprint in the returned dict. With
+        defer=True (stat and quick mode only), a local file whose stat fingerprint
+        differs from the record is not read: its checksum is returned as None, to be
+        taken from a `hash_sink` while the file is transferred. Files whose record
+        says they should not be copied (code 2) are never deferred, since they will
+        not be transferred.
+
+        Whenever the whole file is read, 'verified_date' is added to the checks.
+        """
+        if connector is not None and not connector.is_local:
+            checksum = connector.calculate_checksum(f, algo=self.algo)
+            return {"checksum": checksum, "hash_algo": self.algo}
+
+        stat = stat_fingerprint(f)
+        trust_stat = self.mode != "full" and not self._verification_due(record)
+        if trust_stat and self._stat_matches(record, stat):
+            log.debug(f"{f} unchanged since last run (stat) - skipping checksum")
+            record_algo = record.hash_algo or LEGACY_HASH_ALGO
+            return {"checksum": record.checksum, "hash_algo": record_algo, **stat}
+
+        record_algo = self._record_algo(record)
+        if trust_stat:
+            cached = self._cached_checks(f, stat, record_algo)
+            if cached is not None:
+                log.debug(f"{f} found in the checksum cache - skipping checksum")
+                return cached
+
+        checks = {"hash_algo": self.algo, **stat}
+        if self._uses_quick_hash(stat["size"]):
+            checks["quick_hash"] = calculate_quick_hash(f, self.algo, self.quick_size)
+            if trust_stat and self._quick_hash_matches(record, checks):
+                log.debug(f"{f} has the same quick hash as last run - skipping checksum")
+                return {**checks, "checksum": record.checksum}
+
+        checks["verified_date"] = datetime.datetime.now()
+        if self.mode != "full" and defer and getattr(record, "code", 0) < 2:
+            return {**checks, "checksum": None}
+
+        if record_algo is not None and record_algo != self.algo:
+            checksums = calculate_checksums(f, (self.algo, record_algo))
+            checks["legacy_checksum"] = checksums[record_algo]
+            checks["checksum"] = checksums[self.algo]
+        elif connector is not None:
+            checks["checksum"] = connector.calculate_checksum(f, algo=self.algo)
         else:
-            connector_calculate_checksum = calculate_checksum
+            checks["checksum"] = calculate_checksum(f, self.algo)
+
+        if self.cache is not None:
+            self.cache.put(f, stat, self.algo, checks["checksum"])
+            if "legacy_checksum" in checks:
+                self.cache.put(f, stat, record_algo, checks["legacy_checksum"])
+        return checks
+
+    @staticmethod
+    def _record_algo(record: Any) -> Union[str, None]:
+        """The algorithm of the checksum stored in record (None if there is none)."""
+        if record is None or not getattr(record, "checksum", None):
+            return None
+        return getattr(record, "hash_algo", None) or LEGACY_HASH_ALGO
+
+    def check_many(
+        self,
+        files: Iterable[Path],
+        connector: Any = None,
+        quick_hashes: Dict[Path, str] = None,
+        **kwargs,
+    ) -> Dict[Path, Dict[str, Any]]:
+        """Check several files, using the bulk checksum method of remote connectors.
+
+        In 'quick' mode, quick_hashes holds the quick hashes of the local copies of
+        files. Remote files whose quick hash the connector can calculate are only
+        checked by their 'quick_hash'; the others get their full checksum.
+        """
+        if connector is None or connector.is_local:
+            return super().check_many(files, connector=connector, **kwargs)
+
+        files = list(files)
+        results = {}
+        if self.mode == "quick" and quick_hashes:
+            quick_files = [f for f in files if quick_hashes.get(f)]
+            remote_quick_hashes = self._remote_quick_hashes(quick_files, connector)
+            for f, quick_hash in remote_quick_hashes.items():
+                results[f] = {"quick_hash": quick_hash, "hash_algo": self.algo}
+            files = [f for f in files if f not in results]
+
+        if files:
+            checksums = connector.calculate_checksums(files, algo=self.algo)
+            for f, checksum in checksums.items():
+                results[f] = {"checksum": checksum, "hash_algo": self.algo}
+        return results
 
-        return {"checksum": connector_calculate_checksum(f)}
+    def _remote_quick_hashes(self, files: list, connector: Any) -> Dict[Path, str]:
+        if not files:
+            return {}
+        try:
+            return connector.calculate_quick_hashes(
+                files, algo=self.algo, sample_size=self.quick_size
+            )
+        except Exception as e:
+            # the quick tier is only a shortcut - fall back to full checksums
+            log.debug(f"Could not calculate remote quick hashes: {e}")
+            return {}
@@ -0,0 +1,187 @@
+"""Compression of files on their way to an SSH remote.
+
+`SSHConnector(compression=...)` (env var OELEO_COMPRESSION) takes one of
+COMPRESSION_MODES:
+    off: send files as they are (default).
+    ssh: let the SSH transport compress everything (paramiko ``compress=True``).
+    gzip / zstd: compress the files that are worth it (see `should_compress`) and
+        stream them into ``gzip -dc`` / ``zstd -dcq`` on the remote. zstd needs
+        the zstandard package (``pip install oeleo[compression]``) and the zstd
+        command on the remote.
+"""
+
+import threading
+import time
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, BinaryIO, Optional, Union
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from oeleo.utils import quick_hash_ranges
+
+COMPRESSION_MODES = ("off", "ssh", "gzip", "zstd")
+# modes where oeleo compresses the files itself -> command unpacking them remotely
+REMOTE_DECOMPRESS_COMMANDS = {"gzip": "gzip -dc", "zstd": "zstd -dcq"}
+COMPRESSION_LEVELS = {"gzip": 1, "zstd": 3}
+# smaller files are sent as they are
+COMPRESSION_MIN_FILE_SIZE = 65_536
+# bytes in each of the (start, middle, end) samples used to estimate the ratio
+COMPRESSION_SAMPLE_SIZE = 65_536
+# files whose samples do not shrink below this fraction are sent as they are
+COMPRESSION_MAX_RATIO = 0.8
+
+COMPRESSIBLE_EXTENSIONS = {".csv", ".txt", ".xyz", ".json", ".xml", ".log", ".dat"}
+INCOMPRESSIBLE_EXTENSIONS = {
+    ".7z",
+    ".bz2",
+    ".gz",
+    ".jpeg",
+    ".jpg",
+    ".mp4",
+    ".png",
+    ".xlsx",
+    ".xz",
+    ".zip",
+    ".zst",
+}
+
+
+def resolve_compression(mode: Union[str, None]) -> str:
+    """Check a compression mode (None means off)."""
+    mode = (mode or "off").strip().lower()
+    if mode not in COMPRESSION_MODES:
+        raise ValueError(
+            f"Unknown compression mode {mode!r} (use one of {COMPRESSION_MODES})"
+        )
+    if mode == "zstd" and zstandard is None:
+        raise ValueError("compression mode 'zstd' needs the zstandard package")
+    return mode
+
+
+def new_compressor(method: str) -> Any:
+    """A streaming compressor with compress(data) and flush() for gzip or zstd."""
+    level = COMPRESSION_LEVELS[method]
+    if method == "gzip":
+        return zlib.compressobj(level, zlib.DEFLATED, 31)
+    # with the content checksum, zstd -d verifies the data like gzip -d does
+    return zstandard.ZstdCompressor(level=level, write_checksum=True).compressobj()
+
+
+def estimate_ratio(
+    path: Path, size: int, sample_size: int = COMPRESSION_SAMPLE_SIZE
+) -> float:
+    """Compressed / raw size of samples from the start, middle and end of a file."""
+    raw = packed = 0
+    with open(path, "rb") as f:
+        for offset, length in quick_hash_ranges(size, sample_size):
+            f.seek(offset)
+            sample = f.read(length)
+            raw += len(sample)
+            packed += len(zlib.compress(sample, 1))
+    return packed / raw if raw else 1.0
+
+
+def should_compress(path: Path, size: int) -> bool:
+    """Decide by size and extension, and else by a sampled compression ratio."""
+    if size < COMPRESSION_MIN_FILE_SIZE:
+        return False
+    suffix = path.suffix.lower()
+    if suffix in INCOMPRESSIBLE_EXTENSIONS:
+        return False
+    if suffix in COMPRESSIBLE_EXTENSIONS:
+        return True
+    return estimate_ratio(path, size) <= COMPRESSION_MAX_RATIO
+
+
+class CompressingWriter:
+    """Writes everything written to it to out, compressed with method (if any).
+
+    Counts the bytes written to it and to out and the cpu time spent compressing.
+    Call `finish` after the last write.
+    """
+
+    def __init__(self, out: BinaryIO, method: Union[str, None] = None):
+        self.out = out
+        self.method = method
+        self.compressor = new_compressor(method) if method else None
+        self.raw_bytes = 0
+        self.wire_bytes = 0
+        self.cpu_seconds = 0.0
+
+    def write(self, data: bytes) -> int:
+        n = len(data)
+        self.raw_bytes += n
+        if self.compressor is not None:
+            start = time.thread_time()
+            data = self.compressor.compress(data)
+            self.cpu_seconds += time.thread_time() - start
+        self._send(data)
+        return n
+
+    def finish(self) -> None:
+        if self.compressor is not None:
+            self._send(self.compressor.flush())
+
+    def _send(self, data: bytes) -> None:
+        if data:
+            self.out.write(data)
+            self.wire_bytes += len(data)
+
+
+@dataclass
+class TransferStats:
+    """Bytes of the files sent and of what was sent for them (thread safe).
+
+    The bytes that went through the compression of the SSH transport are counted
+    in unmeasured_bytes instead: how much of them went over the wire is unknown.
+    """
+
+    files: int = 0
+    compressed_files: int = 0
+    raw_bytes: int = 0
+    wire_bytes: int = 0
+    unmeasured_bytes: int = 0
+    cpu_seconds: float = 0.0
+    _lock: Any = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def add(
+        self,
+        raw_bytes: int,
+        wire_bytes: Optional[int],
+        files: int = 1,
+        compressed: bool = False,
+        cpu_seconds: float = 0.0,
+    ) -> None:
+        """Count files of raw_bytes sent as wire_bytes (None if unknown)."""
+        with self._lock:
+            self.files += files
+            self.compressed_files += files if compressed else 0
+            self.raw_bytes += raw_bytes
+            if wire_bytes is None:
+                self.unmeasured_bytes += raw_bytes
+            else:
+                self.wire_bytes += wire_bytes
+            self.cpu_seconds += cpu_seconds
+
+    def __str__(self):
+        measured = self.raw_bytes - self.unmeasured_bytes
+        parts = []
+        if measured or not self.unmeasured_bytes:
+            ratio = measured / self.wire_bytes if self.wire_bytes else 1.0
+            parts.append(f"{self.wire_bytes / 1e6:.1f} MB sent, {ratio:.1f}x")
+        if self.unmeasured_bytes:
+            parts.append(
+                f"{self.unmeasured_bytes / 1e6:.1f} MB through ssh compression, "
+                "size sent unknown"
+            )
+        parts.append(
+            f"{self.compressed_files} compressed in {self.cpu_seconds:.1f} s cpu"
+        )
+        return (
+            f"{self.files} files, {self.raw_bytes / 1e6:.1f} MB ({'; '.join(parts)})"
+        )
@@ -1,25 +1,103 @@
 import getpass
-import hashlib
 import logging
+import math
 import os
+import re
 import shlex
+import stat
 import sys
+import tarfile
+import threading
 import time
-from pathlib import Path, PurePosixPath, PureWindowsPath
-from typing import Any, Protocol, Iterator, List, Union
+from contextlib import contextmanager
+from pathlib import Path, PurePath, PurePosixPath, PureWindowsPath
+from datetime import datetime
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    NamedTuple,
+    Optional,
+    Protocol,
+    Iterator,
+    List,
+    Tuple,
+    Union,
+)
 
 from fabric import Connection
+from paramiko import SFTPClient
 
 from shareplum import Site
 from shareplum import Office365
 from shareplum.site import Version
 from shareplum.errors import ShareplumRequestError
 
-from oeleo.filters import base_filter, additional_filtering
-from oeleo.movers import simple_mover, simple_recursive_mover
-from oeleo.utils import calculate_checksum
+from oeleo.agent import AgentConnection, RemoteAgent, unwrap
+from oeleo.compression import (
+    REMOTE_DECOMPRESS_COMMANDS,
+    CompressingWriter,
+    TransferStats,
+    resolve_compression,
+    should_compress,
+)
+from oeleo.delta import (
+    DELTA_MIN_FILE_SIZE,
+    PATCH_SCRIPT,
+    SIGNATURE_SCRIPT,
+    delta_block_size,
+    generate_delta,
+    parse_signatures,
+)
+from oeleo.filters import FilterSpec, additional_filtering, path_stat, scan_files
+from oeleo.movers import append_file, hash_prefix, simple_mover, simple_recursive_mover
+from oeleo.utils import (
+    DEFAULT_HASH_ALGO,
+    QUICK_HASH_SAMPLE_SIZE,
+    ConnectionGuard,
+    HashSink,
+    calculate_checksum,
+    new_hash,
+    to_bool,
+)
 
 CONNECTION_RETRIES = 3
+# upper limit for the quoted paths passed to one remote command (well below ARG_MAX)
+REMOTE_ARGV_BYTES = 64_000
+# block size used when streaming a local file to the remote over sftp
+SFTP_BUFFER_SIZE = 1_048_576
+# find -printf format for SSHConnector.list_entries: "<size> <mtime> <path>\0"
+LIST_ENTRY_FORMAT = "%s %T@ %p\\0"
+# stat option -> format of the same fields, for remotes whose find has no -printf
+# (-c for BusyBox, -f for BSD / macOS); the mtime is then in whole seconds
+LIST_ENTRY_STAT_FORMATS = {"-c": "%s %Y %n", "-f": "%z %m %N"}
+# commands that only fail if the remote lacks the listing method (checked on "/")
+LIST_ENTRY_PROBES = {
+    "printf": "find / -maxdepth 0 -printf ''",
+    "-c": "stat -c %s /",
+    "-f": "stat -f %z /",
+}
+# last member of the tar streams of SSHConnector.move_many; without it (a stream cut
+# short) the unpacked files are not moved into place
+TAR_COMPLETE_MARKER = ".oeleo-complete"
+# moves the files unpacked below $0 (a staging directory) to the same names below $1
+MOVE_UNPACKED_SCRIPT = (
+    'dest=$1; shift; for f; do r=${f#"$0"/}; '
+    'case $r in */*) mkdir -p "$dest/${r%/*}" || exit 1;; esac; '
+    'mv -f "$f" "$dest/$r" || exit 1; done'
+)
+# number of ssh connections SSHConnector may keep open at the same time
+SSH_POOL_SIZE = 1
+# hash algorithm -> command computing it on the remote (all print md5sum style lines)
+REMOTE_HASH_COMMANDS = {
+    "md5": "md5sum",
+    "sha1": "sha1sum",
+    "sha256": "sha256sum",
+    "blake2b": "b2sum",
+    "xxh64": "xxh64sum",
+    "blake3": "b3sum",
+}
 
 
 log = logging.getLogger("oeleo")
@@ -40,6 +118,71 @@ class OeleoTransferError(Exception):
     pass
 
 
+def _env_setting(name: str, value: Any, convert=int) -> Any:
+    """Return value if given, else the converted env var `name`, else None."""
+    if value is not None:
+        return value
+    raw = os.environ.get(name)
+    if raw is None or raw == "":
+        return None
+    try:
+        return convert(raw)
+    except ValueError as e:
+        raise ValueError(f"Could not understand {name}={raw!r}") from e
+
+
+class RemoteEntry(NamedTuple):
+    """A listed file with the metadata the listing provided (None if unknown)."""
+
+    path: Union[Path, PurePath]
+    size: Optional[int] = None
+    mtime: Optional[float] = None  # seconds since the epoch
+
+
+class RemoteIndex:
+    """Hashed lookup table for a directory listing.
+
+    Paths are keyed on their location relative to ``directory`` as a "/"-joined
+    string, so ``Path``, ``PurePosixPath`` and ``PureWindowsPath`` versions of the same
+    file (and absolute vs. relative forms) find the same entry.
+    """
+
+    def __init__(self, directory: Union[PurePath, str], items: Iterable = ()):
+        self.directory = directory
+        self._directory_parts = self._parts(directory) if directory else ()
+        self._entries = {}
+        for item in items:
+            self.add(item)
+
+    @staticmethod
+    def _parts(path) -> tuple:
+        if not isinstance(path, PurePath):
+            path = PurePosixPath(path)
+        return path.parts
+
+    def key(self, path: Union[PurePath, str]) -> str:
+        parts = self._parts(path)
+        n = len(self._directory_parts)
+        if n and parts[:n] == self._directory_parts:
+            parts = parts[n:]
+        return "/".join(parts)
+
+    def add(self, path: Union[PurePath, str], value: Any = None) -> None:
+        self._entries[self.key(path)] = path if value is None else value
+
+    def get(self, path: Union[PurePath, str], default: Any = None) -> Any:
+        return self._entries.get(self.key(path), default)
+
+    def __contains__(self, path) -> bool:
+        return self.key(path) in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries.values())
+
+
 def register_password(pwd: str = None) -> None:
     """Helper function to export the password as an environmental variable"""
     log.debug(" -> Register password ")
@@ -76,16 +219,108 @@ class Connector(Protocol):
     ) -> Union[Iterator[Path], List[Path]]:
         ...
 
-    def calculate_checksum(self, f: Path, hide: bool = True) -> Hash:
+    def calculate_checksum(
+        self, f: Path, hide: bool = True, algo: str = DEFAULT_HASH_ALGO
+    ) -> Hash:
+        ...
+
+    def calculate_checksums(
+        self, paths: Iterable[Path], hide: bool = True, algo: str = DEFAULT_HASH_ALGO
+    ) -> Dict[Path, Hash]:
+        """Calculate checksums for several files.
+
+        Files that fail are left out of the returned dict. This default calls
+        `calculate_checksum` once per file; connectors with a cheaper bulk method
+        override it.
+        """
+        checksums = {}
+        for f in paths:
+            try:
+                checksums[f] = self.calculate_checksum(f, hide=hide, algo=algo)
+            except OeleoTransferError as e:
+                log.debug(f"Could not calculate checksum for {f}: {e}")
+        return checksums
+
+    def calculate_quick_hashes(
+        self,
+        paths: Iterable[Path],
+        hide: bool = True,
+        algo: str = DEFAULT_HASH_ALGO,
+        sample_size: int = QUICK_HASH_SAMPLE_SIZE,
+    ) -> Dict[Path, Hash]:
+        """Calculate quick hashes (see `oeleo.utils.calculate_quick_hash`).
+
+        Files that fail are left out of the returned dict. This default returns an
+        empty dict, so that the files are compared by their full checksums instead;
+        connectors that can read parts of remote files cheaply override it.
+        """
+        return {}
+
+    def list_entries(self, glob_pattern: str = "*", **kwargs) -> List[RemoteEntry]:
+        """List files like `base_filter_sub_method`, but with size and mtime.
+
+        This default has no metadata; connectors that get it cheaply override it.
+        """
+        return [
+            RemoteEntry(path)
+            for path in self.base_filter_sub_method(glob_pattern, **kwargs)
+        ]
+
+    def ensure_dirs(self, dirs: Iterable[Path]) -> None:
+        """Make sure the given destination directories exist (if the connector needs it)."""
         ...
 
     def move_func(self, path: Path, to: Path, *args, **kwargs) -> bool:
+        """Copy path to to and return True on success.
+
+        If a `hash_sink` keyword (see `oeleo.utils.HashSink`) is given, the mover
+        resets it before each attempt and updates it with every block it sends.
+        """
         ...
 
+    def move_many(self, items: List[Tuple[Path, Path, Any]]) -> List[bool]:
+        """Copy several (path, to, hash_sink) items; return whether each was copied.
+
+        Connectors that can send many small files in one go override this (see
+        SSHConnector.move_many); a False item should then be sent with `move_func`.
+        This default calls `move_func` for each item.
+        """
+        moved = []
+        for path, to, hash_sink in items:
+            kwargs = {"hash_sink": hash_sink} if hash_sink is not None else {}
+            moved.append(self.move_func(path, to, **kwargs))
+        return moved
+
+    def append_func(
+        self,
+        path: Path,
+        to: Path,
+        offset: int,
+        prefix_checksum: str,
+        algo: str = DEFAULT_HASH_ALGO,
+        hash_sink: Any = None,
+    ) -> bool:
+        """Send only the bytes of path after offset, appending them to to.
+
+        This is only done when to holds exactly offset bytes and the first offset
+        bytes of both files hash (with algo) to prefix_checksum; a given `hash_sink`
+        then ends up with the checksum of all of path. Otherwise False is returned
+        without changing to, and the file should be copied with `move_func`. This
+        default cannot append and always returns False.
+        """
+        return False
+
     def ensure_connection(self) -> None:
         """Raise OeleoConnectionError if the destination is unreachable."""
         ...
 
+    def pop_transfer_stats(self) -> Optional[TransferStats]:
+        """Return the TransferStats collected since the last call (and reset them).
+
+        None if the connector does not count what it sends.
+        """
+        return None
+
 
 class LocalConnector(Connector):
     def __init__(self, directory=None, **kwargs):
@@ -100,6 +335,8 @@ class LocalConnector(Connector):
 
         self.directory = Path(self.directory)
         self.include_subdirs = kwargs.pop("include_subdirs", False)
+        # oeleo.cache.DirectoryIndex for incremental scans (None: full scans)
+        self.directory_index = kwargs.pop("directory_index", None)
 
     def __str__(self):
         return f"LocalConnector\n{self.directory=}\n"
@@ -138,22 +375,32 @@ class LocalConnector(Connector):
         log.debug("base filter function for LocalConnector")
         log.debug(f"{self.directory}")
         log.debug(f"{self.include_subdirs=}")
-        if self.include_subdirs:
-            base_filter_func = self.directory.rglob
-        else:
-            base_filter_func = self.directory.glob
-
-        file_list = base_filter(
-            self.directory, extension=glob_pattern, base_filter_func=base_filter_func
+        file_list = scan_files(
+            self.directory,
+            extension=glob_pattern,
+            recursive=self.include_subdirs,
+            index=self.directory_index,
+            full=kwargs.get("full_scan", False),
         )
-        logging.debug(f"Got {file_list} files")
 
         if additional_filters := kwargs.get("additional_filters"):
             file_list = additional_filtering(file_list, additional_filters)
         return file_list
 
-    def calculate_checksum(self, f: Path, hide: bool = True) -> Hash:
-        return calculate_checksum(f)
+    def list_entries(self, glob_pattern: str = "*", **kwargs) -> List[RemoteEntry]:
+        entries = []
+        for path in self.base_filter_sub_method(glob_pattern, **kwargs):
+            try:
+                st = path_stat(path)
+            except OSError:
+                continue
+            entries.append(RemoteEntry(path, st.st_size, st.st_mtime))
+        return entries
+
+    def calculate_checksum(
+        self, f: Path, hide: bool = True, algo: str = DEFAULT_HASH_ALGO
+    ) -> Hash:
+        return calculate_checksum(f, algo)
 
     def move_func(self, path: Path, to: Path, *args, **kwargs) -> bool:
         log.debug("\nmove_func function for LocalConnector")
@@ -165,6 +412,124 @@ class LocalConnector(Connector):
             return simple_recursive_mover(path, to, *args, **kwargs)
         return simple_mover(path, to, *args, **kwargs)
 
+    def append_func(
+        self,
+        path: Path,
+        to: Path,
+        offset: int,
+        prefix_checksum: str,
+        algo: str = DEFAULT_HASH_ALGO,
+        hash_sink: Any = None,
+    ) -> bool:
+        hash_sink = hash_sink if hash_sink is not None else HashSink(algo)
+        try:
+            return append_file(path, to, offset, prefix_checksum, hash_sink)
+        except OSError as e:
+            log.debug(f"Could not append to {to}: {e}")
+            return False
+
+
+class SSHConnectionPool:
+    """A bounded pool of fabric connections to one host.
+
+    Connections are created lazily by `factory` when a checkout finds no idle
+    connection, and are health checked both when handed out and when returned.
+    A connection whose `connection()` block raised is closed instead of being
+    reused. `close` closes the idle connections; connections that are checked out
+    at that moment are closed when they are checked in.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Connection],
+        size: int = SSH_POOL_SIZE,
+        on_discard: Optional[Callable[[Connection], None]] = None,
+    ):
+        if size < 1:
+            raise ValueError(f"The pool size must be at least 1 (got {size})")
+        self.factory = factory
+        self.size = size
+        self.on_discard = on_discard
+        self._idle: List[Connection] = []
+        self._in_use: Dict[int, int] = {}  # id(connection) -> generation
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._idle) + len(self._in_use)
+
+    @staticmethod
+    def is_healthy(c: Connection) -> bool:
+        # a connection that has never been opened connects on first use
+        return c.transport is None or bool(c.is_connected)
+
+    def checkout(self, timeout: Optional[float] = None) -> Connection:
+        """Return an idle, healthy connection (or a new one), waiting for a free slot."""
+        if not self._slots.acquire(timeout=timeout):
+            raise OeleoConnectionError(
+                f"No ssh connection available within {timeout} s"
+            )
+        try:
+            while True:
+                with self._lock:
+                    c = self._idle.pop() if self._idle else None
+                if c is None:
+                    c = self.factory()
+                    break
+                if self.is_healthy(c):
+                    break
+                log.debug("Dropping broken ssh connection from the pool")
+                self._discard(c)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._in_use[id(c)] = self._generation
+        return c
+
+    def checkin(self, c: Connection, broken: bool = False) -> None:
+        with self._lock:
+            generation = self._in_use.pop(id(c), None)
+            keep = (
+                not broken
+                and generation == self._generation
+                and self.is_healthy(c)
+            )
+            if keep:
+                self._idle.append(c)
+        if not keep:
+            self._discard(c)
+        self._slots.release()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None) -> Iterator[Connection]:
+        c = self.checkout(timeout=timeout)
+        broken = False
+        try:
+            yield c
+        except Exception:
+            broken = True
+            raise
+        finally:
+            self.checkin(c, broken=broken)
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._generation += 1
+        for c in idle:
+            self._discard(c)
+
+    def _discard(self, c: Connection) -> None:
+        try:
+            if self.on_discard is not None:
+                self.on_discard(c)
+            c.close()
+        except Exception as e:
+            log.debug(f"Got an exception during closing pooled connection: {e}")
+
 
 class SSHConnector(Connector):
     is_local = False
@@ -177,7 +542,46 @@ class SSHConnector(Connector):
         is_posix=True,
         use_password=False,
         include_subdirs=False,
+        sftp_window_size=None,
+        sftp_max_packet_size=None,
+        sftp_pipelined=None,
+        sftp_buffer_size=None,
+        pool_size=None,
+        delta_transfer=None,
+        remote_agent=None,
+        compression=None,
     ):
+        """Connector for copying files to a remote host over SSH/SFTP.
+
+        pool_size is the number of ssh connections that may be open at the same
+        time (env var OELEO_SSH_POOL_SIZE, default 1). With more than one, uploads,
+        checksums and listings running in different threads (see max_workers of the
+        Worker) each borrow their own connection from a pool.
+
+        The sftp_* arguments tune the SFTP session used for uploads; each falls back
+        to the env var of the same name in upper case with an OELEO_ prefix (e.g.
+        OELEO_SFTP_WINDOW_SIZE) and then to the defaults:
+            sftp_window_size: SSH channel window in bytes (paramiko default, 2 MiB).
+            sftp_max_packet_size: max SSH packet size in bytes (paramiko default, 32 KiB).
+            sftp_pipelined: send writes without waiting for each ack (default True).
+            sftp_buffer_size: block size read from the local file per write (1 MiB).
+
+        delta_transfer (env var OELEO_DELTA_TRANSFER, default False) sends files of
+        at least 1 MiB that already exist on the remote as an rsync-style delta
+        (see `oeleo.delta`). This needs python3 on the remote; files are sent in
+        full whenever the delta cannot be used.
+
+        remote_agent (env var OELEO_REMOTE_AGENT, default False) starts a python3
+        helper once per connection and runs the small remote commands (mkdir,
+        md5sum, stat, ...) through it instead of opening an exec channel and a
+        shell for each (see `oeleo.agent`). Plain exec is used when the helper
+        cannot be started.
+
+        compression (env var OELEO_COMPRESSION, default "off") is "ssh" to turn on
+        the compression of the SSH transport, or "gzip" / "zstd" to compress the
+        files that are worth it before sending them (see `oeleo.compression`).
+        The bytes read and sent are counted in TransferStats (pop_transfer_stats).
+        """
         self.use_password = use_password
         if self.use_password:
             try:
@@ -202,7 +606,44 @@ class SSHConnector(Connector):
 
         self.is_posix = is_posix
         self.include_subdirs = include_subdirs
+        self.sftp_window_size = _env_setting("OELEO_SFTP_WINDOW_SIZE", sftp_window_size)
+        self.sftp_max_packet_size = _env_setting(
+            "OELEO_SFTP_MAX_PACKET_SIZE", sftp_max_packet_size
+        )
+        pipelined = _env_setting("OELEO_SFTP_PIPELINED", sftp_pipelined, to_bool)
+        self.sftp_pipelined = True if pipelined is None else pipelined
+        self.sftp_buffer_size = (
+            _env_setting("OELEO_SFTP_BUFFER_SIZE", sftp_buffer_size) or SFTP_BUFFER_SIZE
+        )
+        pool_size = _env_setting("OELEO_SSH_POOL_SIZE", pool_size)
+        self.pool_size = SSH_POOL_SIZE if pool_size is None else pool_size
+        if self.pool_size < 1:
+            raise ValueError(f"pool_size must be at least 1 (got {self.pool_size})")
+        self.delta_transfer = bool(
+            _env_setting("OELEO_DELTA_TRANSFER", delta_transfer, to_bool)
+        )
+        self.remote_agent = bool(
+            _env_setting("OELEO_REMOTE_AGENT", remote_agent, to_bool)
+        )
+        self.compression = resolve_compression(
+            _env_setting("OELEO_COMPRESSION", compression, str)
+        )
+        self.transfer_stats = TransferStats()
         self.c = None
+        self._pool = None
+        # AgentConnection (or None if the agent is unavailable) by id() of connection
+        self._agents = {}
+        self._agent_lock = threading.Lock()
+        # sftp sessions by id() of the connection they run on
+        self._sftp_clients = {}
+        self._sftp_lock = threading.Lock()
+        # remote directories known to exist on the current connection
+        self._known_dirs = set()
+        # how list_entries gets the size and mtime ("printf" or a stat option),
+        # found by the first listing on the current connection
+        self._entry_listing = None
+        # keeps reconnect from closing connections other threads are using
+        self._connection_guard = ConnectionGuard()
         self._validate()
 
     def __str__(self):
@@ -213,6 +654,7 @@ class SSHConnector(Connector):
         text += f"{self.is_posix=}\n"
         text += f"{self.use_password=}\n"
         text += f"{self.include_subdirs=}\n"
+        text += f"{self.pool_size=}\n"
         text += f"{self.c=}\n"
 
         return text
@@ -241,6 +683,13 @@ class SSHConnector(Connector):
         return '"' + text.replace('"', '""') + '"'
 
     def connect(self, **kwargs) -> None:
+        self.c = self._new_connection()
+        if self.pool_size > 1:
+            self._pool = SSHConnectionPool(
+                self._new_connection, self.pool_size, on_discard=self._discard
+            )
+
+    def _new_connection(self) -> Connection:
         if self.use_password:
             password = self.session_password
             if password is None:
@@ -255,11 +704,82 @@ class SSHConnector(Connector):
             connect_kwargs = {
                 "key_filename": [os.environ["OELEO_KEY_FILENAME"]],
             }
-        self.c = Connection(
+        if self.compression == "ssh":
+            connect_kwargs["compress"] = True
+        return Connection(
             host=self.host, user=self.username, connect_kwargs=connect_kwargs
         )
 
+    @contextmanager
+    def _borrow(self) -> Iterator[Connection]:
+        """Yield a connection to run remote commands on.
+
+        This is self.c, or a connection checked out of the pool if pool_size > 1.
+        """
+        with self._connection_guard.use():
+            if self.c is None:  # make this as a decorator ("@connected")
+                log.debug("Connecting ...")
+                self.connect()
+            if self._pool is None:
+                yield self._with_agent(self.c)
+            else:
+                with self._pool.connection() as c:
+                    yield self._with_agent(c)
+
+    def _with_agent(self, c: Connection):
+        """Return c wrapped in an AgentConnection if remote_agent is on and it runs."""
+        if not self.remote_agent or not self.is_posix:
+            return c
+        with self._agent_lock:
+            if id(c) in self._agents:
+                return self._agents[id(c)] or c
+            try:
+                agent = RemoteAgent.start(c)
+            except Exception as e:
+                log.debug(f"Got an exception during starting the remote agent: {e}")
+                agent = None
+            if agent is None:
+                log.info("Could not start the remote agent - using plain exec")
+            wrapped = AgentConnection(c, agent) if agent is not None else None
+            self._agents[id(c)] = wrapped
+        return wrapped or c
+
+    def _close_agent(self, c: Connection) -> None:
+        with self._agent_lock:
+            wrapped = self._agents.pop(id(c), None)
+        if wrapped is not None:
+            wrapped.close_agent()
+
+    def pop_transfer_stats(self) -> Optional[TransferStats]:
+        stats, self.transfer_stats = self.transfer_stats, TransferStats()
+        return stats
+
+    def _discard(self, c: Connection) -> None:
+        self._close_agent(c)
+        self._close_sftp(c)
+
+    @staticmethod
+    def _run_many(c, cmds: List[str], **kwargs) -> list:
+        """Run commands on c, pipelined when c goes through a remote agent."""
+        if isinstance(c, AgentConnection):
+            return c.run_many(cmds, **kwargs)
+        return [c.run(cmd, **kwargs) for cmd in cmds]
+
+    def _remember_dirs(self, paths: Iterable[Any], parents: bool = False) -> None:
+        """Add remote directories (or the parents of listed files) to the cache."""
+        for path in paths:
+            path = PurePosixPath(path) if self.is_posix else PureWindowsPath(path)
+            if parents:
+                path = path.parent
+            self._known_dirs.add(str(path))
+
     def reconnect(self, **kwargs) -> None:
+        """Close and reopen the connections, once no thread is using them."""
+        self._connection_guard.reconnect(self._reconnect)
+
+    def _reconnect(self) -> None:
+        self._known_dirs.clear()
+        self._entry_listing = None
         try:
             self.close()
         except Exception as e:
@@ -283,7 +803,8 @@ class SSHConnector(Connector):
                 cmd = f"test -d {remote_q}"
             else:
                 cmd = f"if not exist {remote_q} exit /b 1"
-            result = self.c.run(cmd, hide=True, in_stream=False, warn=True)
+            with self._borrow() as c:
+                result = c.run(cmd, hide=True, in_stream=False, warn=True)
             if not result.ok:
                 raise OeleoConnectionError(
                     f"Remote destination not available: {self.directory}"
@@ -327,32 +848,216 @@ class SSHConnector(Connector):
         sys.exit()
 
     def close(self):
+        if self._pool is not None:
+            self._pool.close()
+        self._discard(self.c)
         self.c.close()
 
+    def _get_sftp(self, c: Connection) -> SFTPClient:
+        """Return the SFTP client of connection c, opening it if needed."""
+        c = unwrap(c)
+        with self._sftp_lock:
+            sftp = self._sftp_clients.get(id(c))
+            if sftp is None:
+                c.open()
+                sftp = SFTPClient.from_transport(
+                    c.transport,
+                    window_size=self.sftp_window_size,
+                    max_packet_size=self.sftp_max_packet_size,
+                )
+                self._sftp_clients[id(c)] = sftp
+        return sftp
+
+    def _close_sftp(self, c: Connection) -> None:
+        c = unwrap(c)
+        with self._sftp_lock:
+            sftp = self._sftp_clients.pop(id(c), None)
+        if sftp is not None:
+            try:
+                sftp.close()
+            except Exception as e:
+                log.debug(f"Got an exception during closing sftp session: {e}")
+
+    def _put_file(
+        self, path: Path, to: Path, c: Optional[Connection] = None, hash_sink=None
+    ) -> None:
+        """Stream a local file to the remote in large blocks over an SFTP session.
+
+        Every block sent is also fed to hash_sink (if given).
+        """
+        if c is None:
+            with self._borrow() as c:
+                return self._put_file(path, to, c, hash_sink=hash_sink)
+        sftp = self._get_sftp(c)
+        remote = str(to)
+        if hash_sink is not None:
+            hash_sink.reset()
+        sent = 0
+        with open(path, "rb") as src:
+            with sftp.open(remote, "wb", bufsize=self.sftp_buffer_size) as dst:
+                dst.set_pipelined(self.sftp_pipelined)
+                while block := src.read(self.sftp_buffer_size):
+                    if hash_sink is not None:
+                        hash_sink.update(block)
+                    dst.write(block)
+                    sent += len(block)
+        # keep the permissions of the local file, like Fabric's put does
+        sftp.chmod(remote, stat.S_IMODE(os.stat(path).st_mode))
+        self.transfer_stats.add(sent, self._wire_bytes(sent))
+
+    def _wire_bytes(self, sent: int) -> Optional[int]:
+        # the SSH transport compresses what is sent without telling by how much
+        return None if self.compression == "ssh" else sent
+
+    def _compressed_put(
+        self, path: Path, to: Path, c: Connection, hash_sink=None
+    ) -> None:
+        """Stream a local file compressed into the decompressing command on the remote.
+
+        The decompressor checks the integrity of the stream (the CRC of gzip, the
+        content checksum of zstd), so a non-zero exit status (OeleoTransferError)
+        also covers corrupted transfers. The file is decompressed next to the
+        remote copy and only moved over it when the decompressor succeeded, so a
+        failed transfer leaves the previous copy as it was.
+        """
+        remote_q = self._remote_shell_token(to)
+        new_q = self._remote_shell_token(f"{to}.oeleo-new")
+        c.open()
+        stdin, stdout, stderr = c.client.exec_command(
+            f"{REMOTE_DECOMPRESS_COMMANDS[self.compression]} > {new_q} "
+            f"&& mv -f {new_q} {remote_q}; status=$?; "
+            f"[ $status -eq 0 ] || rm -f {new_q}; exit $status"
+        )
+        writer = CompressingWriter(stdin, self.compression)
+        if hash_sink is not None:
+            hash_sink.reset()
+        try:
+            with open(path, "rb") as src:
+                while block := src.read(self.sftp_buffer_size):
+                    if hash_sink is not None:
+                        hash_sink.update(block)
+                    writer.write(block)
+            writer.finish()
+        finally:
+            stdin.close()
+        errors = stderr.read()
+        status = stdout.channel.recv_exit_status()
+        if status != 0:
+            raise OeleoTransferError(f"Decompressing {to} failed: {errors!r}")
+        self._get_sftp(c).chmod(str(to), stat.S_IMODE(os.stat(path).st_mode))
+        self.transfer_stats.add(
+            writer.raw_bytes,
+            writer.wire_bytes,
+            compressed=True,
+            cpu_seconds=writer.cpu_seconds,
+        )
+
+    def _send_file(
+        self, path: Path, to: Path, c: Connection, hash_sink=None
+    ) -> None:
+        """Send path as a delta or compressed when that is turned on and possible."""
+        if self.delta_transfer:
+            try:
+                if self._delta_put(path, to, c, hash_sink=hash_sink):
+                    return
+            except Exception as e:
+                log.debug(f"Delta transfer of {path} failed - sending it in full: {e}")
+        if self._compresses(path):
+            try:
+                self._compressed_put(path, to, c, hash_sink=hash_sink)
+                return
+            except Exception as e:
+                log.debug(f"Compressed transfer of {path} failed - sending as is: {e}")
+        self._put_file(path, to, c, hash_sink=hash_sink)
+
+    def _compresses(self, path: Path) -> bool:
+        if self.compression not in REMOTE_DECOMPRESS_COMMANDS or not self.is_posix:
+            return False
+        return should_compress(path, os.stat(path).st_size)
+
+    def _delta_put(
+        self, path: Path, to: Path, c: Connection, hash_sink=None
+    ) -> bool:
+        """Update the remote copy of path with an rsync-style delta.
+
+        The block signatures of the remote file are calculated on the remote, the
+        delta is written to a file next to it over SFTP, and the remote rebuilds
+        the file from the two (checking the md5 of the result before replacing
+        the old copy). Returns False, leaving the remote file untouched, when the
+        file is small or the remote has no copy of it (or no python3).
+        """
+        size = os.stat(path).st_size
+        if size < DELTA_MIN_FILE_SIZE or not self.is_posix:
+            return False
+        block_size = delta_block_size(size)
+        remote = str(to)
+        remote_q = self._remote_shell_token(remote)
+        result = c.run(
+            f"test -f {remote_q} && "
+            f"python3 -c {shlex.quote(SIGNATURE_SCRIPT)} {remote_q} {block_size}",
+            hide=True,
+            in_stream=False,
+            warn=True,
+        )
+        if not result.ok:
+            log.debug(f"No block signatures for {to} - sending it in full")
+            return False
+        signatures = parse_signatures(result.stdout or "")
+        if not signatures:
+            return False
+
+        sftp = self._get_sftp(c)
+        delta_remote = remote + ".oeleo-delta"
+        delta_q = self._remote_shell_token(delta_remote)
+        new_q = self._remote_shell_token(remote + ".oeleo-new")
+        try:
+            with sftp.open(delta_remote, "wb", bufsize=self.sftp_buffer_size) as dst:
+                dst.set_pipelined(self.sftp_pipelined)
+                stats = generate_delta(
+                    path, signatures, block_size, dst, hash_sink=hash_sink
+                )
+        except Exception:
+            c.run(f"rm -f {delta_q}", hide=True, in_stream=False, warn=True)
+            raise
+        result = c.run(
+            f"python3 -c {shlex.quote(PATCH_SCRIPT)} {remote_q} {delta_q} {new_q} "
+            f"{block_size} {stats.md5}; status=$?; rm -f {delta_q}; exit $status",
+            hide=True,
+            in_stream=False,
+            warn=True,
+        )
+        if not result.ok:
+            log.debug(f"Rebuilding {to} from the delta failed: {result.stderr!r}")
+            return False
+        sftp.chmod(remote, stat.S_IMODE(os.stat(path).st_mode))
+        self.transfer_stats.add(size, self._wire_bytes(stats.literal_bytes))
+        log.debug(
+            f"Sent {to} as a delta: {stats.literal_bytes} literal bytes, "
+            f"{stats.copied_bytes} bytes re-used"
+        )
+        return True
+
     def base_filter_sub_method(self, glob_pattern: str = "", **kwargs: Any) -> list:
         log.debug("base filter function for SSHConnector")
         log.debug("got this glob pattern:")
         log.debug(f"{glob_pattern}")
 
-        if self.c is None:  # make this as a decorator ("@connected")
-            log.debug("Connecting ...")
-            self.connect()
+        spec = FilterSpec.of(kwargs.get("additional_filters"))
+        if spec.needs_stat:
+            if self.is_posix:
+                # the mtime comes with the listing of list_entries
+                entries = self.list_entries(glob_pattern, additional_filters=spec)
+                return [entry.path for entry in entries]
+            log.debug("not_before / not_after are ignored for non-posix remotes")
 
         max_depth = None if self.include_subdirs else 1
         file_list = self._list_content(
-            f"*{glob_pattern}",
+            _globs(glob_pattern),
             hide=True,
             max_depth=max_depth,
+            predicates=self._find_predicates(spec) if self.is_posix else "",
         )
 
-        # experimental feature:
-        if additional_filters := kwargs.get("additional_filters"):
-            logging.debug(
-                f"Got additional_filters for SSHConnector. This is not implemented yet! {additional_filters}"
-            )
-
-            # file_list = additional_filtering(file_list, additional_filters)
-
         if self.is_posix:
             file_list = [PurePosixPath(f) for f in file_list]
         else:
@@ -360,23 +1065,59 @@ class SSHConnector(Connector):
                 Path(f) for f in file_list
             ]  # OBS Linux -> Win not supported yet!
 
+        if spec:
+            file_list = [f for f in file_list if spec.match_name(f.name)]
         return file_list
 
-    def _list_content(self, glob_pattern="*", max_depth=1, hide=False):
-        if self.c is None:  # make this as a decorator ("@connected")
-            log.debug("Connecting ...")
-            self.connect()
+    def _find_names(self, glob_pattern: Union[str, List[str]]) -> str:
+        """``-name`` test(s) for find: one glob, or several joined with -o."""
+        globs = glob_pattern if isinstance(glob_pattern, list) else [glob_pattern]
+        names = " -o ".join(f"-name {self._remote_shell_token(g)}" for g in globs)
+        return names if len(globs) == 1 else f"\\( {names} \\)"
 
+    def _find_predicates(self, spec: FilterSpec, gnu_find: bool = False) -> str:
+        """The additional_filters that find can evaluate, as find tests.
+
+        The listing is still filtered with the spec afterwards: callables are left
+        to that, and the mtime bounds are rounded outwards to whole seconds here.
+        The mtime bounds use ``-newermt``, so they are only passed to GNU find.
+        """
+        tests = []
+        for filter_name, filter_values in spec.values():
+            values = [_find_glob_escape(v) for v in filter_values]
+            if filter_name == "startswith":
+                tests.append(self._find_any([f"{v}*" for v in values]))
+            elif filter_name == "contains":
+                tests.append(self._find_any([f"*{v}*" for v in values]))
+            elif filter_name == "not_contains":
+                tests.extend(self._find_not(f"*{v}*") for v in values)
+            elif filter_name == "excluded":
+                tests.extend(self._find_not(v) for v in values)
+        if gnu_find and spec.not_before is not None:
+            tests.append(f"-newermt @{math.floor(spec.not_before) - 1}")
+        if gnu_find and spec.not_after is not None:
+            tests.append(f"! -newermt @{math.ceil(spec.not_after)}")
+        return "".join(f" {test}" for test in tests)
+
+    def _find_any(self, globs: List[str]) -> str:
+        # "! -name '*'" matches nothing, like -false (which POSIX find lacks)
+        return self._find_names(globs) if globs else self._find_not("*")
+
+    def _find_not(self, glob: str) -> str:
+        return f"! -name {self._remote_shell_token(glob)}"
+
+    def _list_content(self, glob_pattern="*", max_depth=1, hide=False, predicates=""):
         directory_q = self._remote_shell_token(self.directory)
-        pattern_q = self._remote_shell_token(glob_pattern)
+        names = self._find_names(glob_pattern)
         if max_depth is None:
-            cmd = f"find {directory_q} -name {pattern_q}"
+            cmd = f"find {directory_q} {names}{predicates}"
         else:
             depth = int(max_depth)
-            cmd = f"find {directory_q} -maxdepth {depth} -name {pattern_q}"
+            cmd = f"find {directory_q} -maxdepth {depth} {names}{predicates}"
         log.debug(cmd)
         try:
-            result = self.c.run(cmd, hide=hide, in_stream=False)
+            with self._borrow() as c:
+                result = c.run(cmd, hide=hide, in_stream=False)
         except OeleoConnectionError:
             raise
         except Exception as e:
@@ -394,16 +1135,153 @@ class SSHConnector(Connector):
         stdout = (result.stdout or "").strip()
         if not stdout:
             return []
-        return [line for line in stdout.split("\n") if line]
+        lines = [line for line in stdout.split("\n") if line]
+        self._remember_dirs(lines, parents=True)
+        return lines
 
-    def calculate_checksum(self, f, hide=True):
-        if self.c is None:  # make this as a decorator ("@connected")
-            log.debug("Connecting ...")
-            self.connect()
+    def list_entries(self, glob_pattern: str = "", **kwargs: Any) -> List[RemoteEntry]:
+        """List remote files with size and mtime using a single ``find -printf``.
+
+        The output is read from the channel and parsed while it arrives instead of
+        being collected into one string first.
+
+        ``-printf`` is a GNU extension. When it fails and a probe on "/" shows
+        that the remote find lacks it (BusyBox, BSD), the files found are passed
+        to ``stat`` instead (see LIST_ENTRY_STAT_FORMATS). Other failures, like an
+        unreadable subdirectory or a dropped channel, are raised. The first
+        method that works is used until the next reconnect.
+        """
+        if not self.is_posix:
+            return super().list_entries(glob_pattern, **kwargs)
+
+        spec = FilterSpec.of(kwargs.get("additional_filters"))
+        methods = ["printf", *LIST_ENTRY_STAT_FORMATS]
+        if self._entry_listing is not None:
+            methods = [self._entry_listing]
+        for i, method in enumerate(methods):
+            try:
+                entries = self._list_entries(glob_pattern, spec, method)
+            except OeleoConnectionError:
+                if i == len(methods) - 1 or self._remote_supports(method):
+                    raise
+                log.debug(f"The remote cannot list entries with {method}")
+                continue
+            if self._entry_listing != method:
+                if method != "printf":
+                    log.info(f"The remote find has no -printf; using stat {method}")
+                self._entry_listing = method
+            break
+
+        self._remember_dirs((entry.path for entry in entries), parents=True)
+        if spec:
+            entries = [
+                entry
+                for entry in entries
+                if spec.match_name(entry.path.name) and spec.match_mtime(entry.mtime)
+            ]
+        return entries
+
+    def _list_entries(
+        self, glob_pattern: Any, spec: FilterSpec, method: str
+    ) -> List[RemoteEntry]:
+        max_depth = None if self.include_subdirs else 1
+        directory_q = self._remote_shell_token(self.directory)
+        names = self._find_names(_globs(glob_pattern))
+        depth = "" if max_depth is None else f" -maxdepth {int(max_depth)}"
+        if method == "printf":
+            separator = b"\0"
+            action = f"-printf {self._remote_shell_token(LIST_ENTRY_FORMAT)}"
+        else:
+            separator = b"\n"
+            stat_format = self._remote_shell_token(LIST_ENTRY_STAT_FORMATS[method])
+            action = f"-exec stat {method} {stat_format} {{}} +"
+        predicates = self._find_predicates(spec, gnu_find=method == "printf")
+        cmd = f"find {directory_q}{depth} {names}{predicates} -type f {action}"
+        log.debug(cmd)
 
-        cmd = f"md5sum {self._remote_shell_token(self.directory / f)}"
+        entries = []
+        pending = b""
+        for chunk in self._stream_command(cmd):
+            pending += chunk
+            *records, pending = pending.split(separator)
+            entries.extend(self._parse_entry(record) for record in records if record)
+        if pending:
+            entries.append(self._parse_entry(pending))
+        return [entry for entry in entries if entry is not None]
+
+    def _parse_entry(self, record: bytes) -> Optional[RemoteEntry]:
+        """Parse one listed record.
+
+        Malformed records (e.g. the parts of a file name with a newline, when
+        listing with stat) are logged and give None.
+        """
+        text = record.decode("utf-8", "surrogateescape")
         try:
-            result = self.c.run(cmd, hide=hide, in_stream=False)
+            size, mtime, name = text.split(" ", 2)
+            return RemoteEntry(PurePosixPath(name), int(size), float(mtime))
+        except ValueError:
+            log.warning(f"Skipping a malformed remote listing record: {text!r}")
+            return None
+
+    def _remote_supports(self, method: str) -> bool:
+        """Tell if the remote has the given listing method (see LIST_ENTRY_PROBES).
+
+        If the probe itself cannot be run, the method is assumed to work, so that
+        a connection problem never switches the listing method.
+        """
+        try:
+            with self._borrow() as c:
+                c.open()
+                stdin, stdout, stderr = c.client.exec_command(LIST_ENTRY_PROBES[method])
+                stdin.close()
+                stdout.read()
+                errors = stderr.read()
+                status = stdout.channel.recv_exit_status()
+        except Exception as e:
+            log.debug(f"Could not probe the remote for {method}: {e}")
+            return True
+        if status != 0:
+            log.debug(f"The remote has no {method} ({status}): {errors!r}")
+        return status == 0
+
+    def _stream_command(self, cmd: str, chunk_size: int = 65_536) -> Iterator[bytes]:
+        """Run a remote command and yield its stdout in chunks as they arrive.
+
+        Raises OeleoConnectionError if the command cannot be run or exits non-zero.
+        """
+        try:
+            with self._borrow() as c:
+                c.open()
+                stdin, stdout, stderr = c.client.exec_command(cmd)
+                stdin.close()
+                while data := stdout.read(chunk_size):
+                    yield data
+                errors = stderr.read()
+                status = stdout.channel.recv_exit_status()
+        except Exception as e:
+            log.debug(f"Encountered an exception from paramiko: {e}")
+            raise OeleoConnectionError(
+                f"Failed to list remote content: {self.directory}"
+            ) from e
+        if status != 0:
+            log.debug(f"Remote command failed ({status}): {errors!r}")
+            raise OeleoConnectionError(
+                f"Failed to list remote content: {self.directory}"
+            )
+
+    def _hash_command(self, algo: str) -> str:
+        try:
+            return REMOTE_HASH_COMMANDS[algo]
+        except KeyError as e:
+            raise OeleoTransferError(
+                f"No remote command known for hash algorithm {algo!r}"
+            ) from e
+
+    def calculate_checksum(self, f, hide=True, algo=DEFAULT_HASH_ALGO):
+        cmd = f"{self._hash_command(algo)} {self._remote_shell_token(self.directory / f)}"
+        try:
+            with self._borrow() as c:
+                result = c.run(cmd, hide=hide, in_stream=False)
         except OeleoTransferError:
             raise
         except Exception as e:
@@ -422,10 +1300,116 @@ class SSHConnector(Connector):
             )
         return parts[0]
 
-    def _ensure_remote_dir(self, remote_dir: Path) -> None:
-        if self.c is None:
-            log.debug("Connecting ...")
-            self.connect()
+    def calculate_checksums(
+        self, paths: Iterable[Path], hide: bool = True, algo: str = DEFAULT_HASH_ALGO
+    ) -> Dict[Path, Hash]:
+        """Calculate checksums for many files with as few remote commands as possible.
+
+        On POSIX remotes the paths are split into batches that fit on one command line
+        and each batch is run as a single ``md5sum`` (or ``sha256sum``, ``b2sum``, ...,
+        see REMOTE_HASH_COMMANDS) call. Files that cannot be read are left out of the
+        returned dict.
+        """
+        paths = list(paths)
+        if not self.is_posix:
+            return super().calculate_checksums(paths, hide=hide, algo=algo)
+
+        hash_cmd = self._hash_command(algo)
+        checksums = {}
+        tokens = [(f, self._remote_shell_token(self.directory / f)) for f in paths]
+        with self._borrow() as c:
+            for batch in _argv_batches(tokens):
+                checksums.update(
+                    self._calculate_checksum_batch(batch, c, hide=hide, cmd=hash_cmd)
+                )
+        return checksums
+
+    def _calculate_checksum_batch(
+        self, batch, c, hide=True, cmd="md5sum"
+    ) -> Dict[Path, Hash]:
+        log.debug(f"{cmd} for {len(batch)} remote files")
+        cmd = f"{cmd} -- " + " ".join(token for _, token in batch)
+        try:
+            # warn=True: md5sum exits non-zero if only some of the files are missing
+            result = c.run(cmd, hide=hide, in_stream=False, warn=True)
+        except Exception as e:
+            log.debug(f"Encountered an exception from fabric during checksum: {e}")
+            raise OeleoTransferError(
+                f"Failed to calculate checksums for {len(batch)} files"
+            ) from e
+
+        by_remote_name = {str(self.directory / f): f for f, _ in batch}
+        checksums = {}
+        for line in (result.stdout or "").splitlines():
+            parsed = _parse_md5sum_line(line)
+            if parsed is None:
+                continue
+            checksum, remote_name = parsed
+            if remote_name in by_remote_name:
+                checksums[by_remote_name[remote_name]] = checksum
+
+        if not checksums and not result.ok:
+            raise OeleoTransferError(
+                f"Failed to calculate checksums for {len(batch)} files"
+            )
+        return checksums
+
+    def calculate_quick_hashes(
+        self,
+        paths: Iterable[Path],
+        hide: bool = True,
+        algo: str = DEFAULT_HASH_ALGO,
+        sample_size: int = QUICK_HASH_SAMPLE_SIZE,
+    ) -> Dict[Path, Hash]:
+        """Calculate quick hashes of remote files without reading them in full.
+
+        On POSIX remotes each batch of files is handled by one shell loop that pipes
+        the size (from ``stat``) and the start, middle and end samples (from ``head``
+        and ``tail``) into the hash command, giving the same value as
+        `oeleo.utils.calculate_quick_hash` on a local copy. Other remotes get no
+        quick hashes.
+        """
+        if not self.is_posix:
+            return {}
+
+        hash_cmd = self._hash_command(algo)
+        quick_hashes = {}
+        tokens = [(f, self._remote_shell_token(self.directory / f)) for f in paths]
+        with self._borrow() as c:
+            for batch in _argv_batches(tokens):
+                quick_hashes.update(
+                    self._calculate_quick_hash_batch(
+                        batch, c, hide=hide, cmd=hash_cmd, sample_size=sample_size
+                    )
+                )
+        return quick_hashes
+
+    def _calculate_quick_hash_batch(
+        self, batch, c, hide=True, cmd="md5sum", sample_size=QUICK_HASH_SAMPLE_SIZE
+    ) -> Dict[Path, Hash]:
+        log.debug(f"quick {cmd} for {len(batch)} remote files")
+        script = _quick_hash_script([token for _, token in batch], cmd, sample_size)
+        try:
+            result = c.run(script, hide=hide, in_stream=False, warn=True)
+        except Exception as e:
+            log.debug(f"Encountered an exception from fabric during quick hash: {e}")
+            raise OeleoTransferError(
+                f"Failed to calculate quick hashes for {len(batch)} files"
+            ) from e
+
+        # the script prints "<position in batch> <hash>" for every file it could read
+        quick_hashes = {}
+        for line in (result.stdout or "").splitlines():
+            position, _, quick_hash = line.strip().partition(" ")
+            if position.isdigit() and 0 < int(position) <= len(batch) and quick_hash:
+                quick_hashes[batch[int(position) - 1][0]] = quick_hash
+        return quick_hashes
+
+    def _ensure_remote_dir(
+        self, remote_dir: Path, c: Optional[Connection] = None
+    ) -> None:
+        if str(remote_dir) in self._known_dirs:
+            return
 
         remote_q = self._remote_shell_token(remote_dir)
         if self.is_posix:
@@ -435,26 +1419,59 @@ class SSHConnector(Connector):
             cmd = f"if not exist {remote_q} mkdir {remote_q}"
 
         log.debug(f"Ensuring remote dir exists: {remote_dir}")
-        self.c.run(cmd, hide=True, in_stream=False)
+        if c is None:
+            with self._borrow() as c:
+                c.run(cmd, hide=True, in_stream=False)
+        else:
+            c.run(cmd, hide=True, in_stream=False)
+        self._remember_dirs([remote_dir])
 
-    def move_func(self, path: Path, to: Path, *args, **kwargs) -> bool:
-        exceptions = []
-        if self.c is None:  # make this as a decorator ("@connected")
-            log.debug("Connecting ...")
-            self.connect()
+    def ensure_dirs(self, dirs: Iterable[Path]) -> None:
+        """Create the remote directories that are not known to exist.
+
+        On POSIX remotes all missing directories are created with one ``mkdir -p``
+        (split into batches that fit on one command line).
+        """
+        missing = sorted({str(d) for d in dirs} - self._known_dirs)
+        if not missing:
+            return
+        if not self.is_posix:
+            for d in missing:
+                self._ensure_remote_dir(PureWindowsPath(d))
+            return
+
+        tokens = [(d, self._remote_shell_token(d)) for d in missing]
+        batches = list(_argv_batches(tokens))
+        log.debug(f"Ensuring {len(missing)} remote dirs exist")
+        with self._borrow() as c:
+            self._run_many(
+                c,
+                ["mkdir -p " + " ".join(token for _, token in b) for b in batches],
+                hide=True,
+                in_stream=False,
+            )
+        self._remember_dirs(missing)
 
+    def move_func(
+        self, path: Path, to: Path, *args, hash_sink=None, **kwargs
+    ) -> bool:
+        exceptions = []
         for i in range(CONNECTION_RETRIES):
             try:
-                self._ensure_remote_dir(to.parent)
-                log.debug(f"Copying {path} to {to}")
-                self.c.put(str(path), remote=str(to))
+                with self._borrow() as c:
+                    self._ensure_remote_dir(to.parent, c)
+                    log.debug(f"Copying {path} to {to}")
+                    self._send_file(path, to, c, hash_sink=hash_sink)
                 return True
             except Exception as e:
                 log.debug(f"Got an exception during moving file: {e}")
                 log.debug(f"Retrying {i+1}/{CONNECTION_RETRIES}")
+                self._known_dirs.clear()
                 exceptions.append(str(e))
                 time.sleep(1)
-                self.reconnect()
+                if self._pool is None:
+                    self.reconnect()
+                # with a pool, only the failing connection has been discarded
 
         log.debug("GOT A CRITICAL EXCEPTIONS DURING COPYING FILE")
         log.debug(f"FROM     : {path}")
@@ -462,6 +1479,276 @@ class SSHConnector(Connector):
         log.debug(f"EXCEPTIONS: {exceptions}")
         return False
 
+    def move_many(self, items: List[Tuple[Path, Path, Any]]) -> List[bool]:
+        """Send files as one tar stream that is unpacked by ``tar -x`` on the remote.
+
+        The archive is written to the stdin of a single remote command, with the
+        member names relative to the connector's directory (so ``tar`` also creates
+        the sub-directories). The sizes of the unpacked files are then listed with
+        ``stat``, and only the files found with the size that was sent count as
+        copied. Only POSIX remotes; items outside the directory are left for
+        `move_func`.
+        """
+        if not self.is_posix:
+            return super().move_many(items)
+        base = PurePosixPath(self.directory)
+        moved = [False] * len(items)
+        members = []
+        for i, (path, to, hash_sink) in enumerate(items):
+            try:
+                name = PurePosixPath(to).relative_to(base)
+            except ValueError:
+                continue
+            members.append((i, path, name, hash_sink))
+        if not members:
+            return moved
+
+        remote_names = [base / name for _, _, name, _ in members]
+        try:
+            with self._borrow() as c:
+                sizes = self._put_tar(members, c)
+                remote_sizes = self._remote_sizes(remote_names, c)
+        except Exception as e:
+            log.debug(f"Got an exception during sending {len(members)} files: {e}")
+            return moved
+        for (i, _, _, _), remote_name in zip(members, remote_names):
+            moved[i] = remote_sizes.get(str(remote_name)) == sizes[i]
+        self._remember_dirs(remote_names, parents=True)
+        log.debug(f"Sent {sum(moved)} of {len(members)} files in one tar stream")
+        return moved
+
+    def _put_tar(self, members: List[tuple], c: Connection) -> Dict[int, int]:
+        """Stream (index, path, name, hash_sink) members into ``tar -x`` on the remote.
+
+        The archive is unpacked into a staging directory next to the files, and the
+        files are only moved to their names (MOVE_UNPACKED_SCRIPT) when ``tar`` and
+        the decompressor succeeded and the stream ended with TAR_COMPLETE_MARKER,
+        so a failed transfer leaves the previous copies as they were. Returns the
+        number of bytes sent for each index.
+        """
+        directory = self._remote_shell_token(self.directory)
+        method = REMOTE_DECOMPRESS_COMMANDS.get(self.compression)
+        unpack = 'tar -x -f - -C "$staging"'
+        if method is not None:
+            # the pipe into tar would hide the exit status of the decompressor
+            unpack = (
+                f'{{ {method}; echo $? > "$staging.rc"; }} | {unpack} '
+                '&& [ "$(cat "$staging.rc")" = 0 ]'
+            )
+        c.open()
+        stdin, stdout, stderr = c.client.exec_command(
+            f"mkdir -p {directory} "
+            f"&& staging=$(mktemp -d {directory}/.oeleo-tar.XXXXXX) && {unpack} "
+            f'&& rm "$staging/{TAR_COMPLETE_MARKER}" '
+            f'&& find "$staging" ! -type d -exec sh -c '
+            f'{shlex.quote(MOVE_UNPACKED_SCRIPT)} "$staging" {directory} {{}} +; '
+            'status=$?; [ -z "$staging" ] || rm -rf "$staging" "$staging.rc"; '
+            "exit $status"
+        )
+        writer = CompressingWriter(stdin, self.compression if method else None)
+        sizes = {}
+        try:
+            with tarfile.open(
+                fileobj=writer, mode="w|", bufsize=self.sftp_buffer_size
+            ) as tar:
+                for i, path, name, hash_sink in members:
+                    with open(path, "rb") as src:
+                        info = tar.gettarinfo(arcname=str(name), fileobj=src)
+                        info.uid = info.gid = 0
+                        info.uname = info.gname = ""
+                        if hash_sink is not None:
+                            hash_sink.reset()
+                        tar.addfile(info, _HashingReader(src, hash_sink))
+                    sizes[i] = info.size
+                tar.addfile(tarfile.TarInfo(TAR_COMPLETE_MARKER))
+            writer.finish()
+        finally:
+            stdin.close()
+        errors = stderr.read()
+        status = stdout.channel.recv_exit_status()
+        if status != 0:
+            raise OeleoTransferError(f"tar -x failed ({status}): {errors!r}")
+        self.transfer_stats.add(
+            sum(sizes.values()),
+            self._wire_bytes(writer.wire_bytes),
+            files=len(sizes),
+            compressed=method is not None,
+            cpu_seconds=writer.cpu_seconds,
+        )
+        return sizes
+
+    def _remote_sizes(self, paths: List[PurePath], c: Connection) -> Dict[str, int]:
+        """Sizes of the remote files that exist, with one ``stat`` per command line."""
+        tokens = [(str(p), self._remote_shell_token(p)) for p in paths]
+        cmds = [
+            "stat -c '%s %n' -- " + " ".join(token for _, token in batch)
+            for batch in _argv_batches(tokens)
+        ]
+        sizes = {}
+        for result in self._run_many(c, cmds, hide=True, in_stream=False, warn=True):
+            for line in (result.stdout or "").splitlines():
+                size, _, name = line.partition(" ")
+                if size.isdigit():
+                    sizes[name] = int(size)
+        return sizes
+
+    def append_func(
+        self,
+        path: Path,
+        to: Path,
+        offset: int,
+        prefix_checksum: str,
+        algo: str = DEFAULT_HASH_ALGO,
+        hash_sink: Any = None,
+    ) -> bool:
+        """Send only the tail of a local file that has grown since its last copy.
+
+        The remote prefix is verified with one remote command (``stat`` and
+        ``head -c`` piped into the hash command), the local prefix is hashed
+        locally, and the new bytes are written to the remote file opened in append
+        mode over SFTP. Only POSIX remotes are supported.
+        """
+        if not self.is_posix or offset <= 0:
+            return False
+        hash_sink = hash_sink if hash_sink is not None else HashSink(algo)
+        try:
+            with self._borrow() as c:
+                if not self._remote_prefix_matches(
+                    to, offset, prefix_checksum, algo, c
+                ):
+                    log.debug(f"The remote prefix of {to} differs - not appending")
+                    return False
+                return self._append_file(
+                    path, to, offset, prefix_checksum, c, hash_sink
+                )
+        except Exception as e:
+            log.debug(f"Got an exception during appending to {to}: {e}")
+            return False
+
+    def _remote_prefix_matches(
+        self, to: Path, offset: int, prefix_checksum: str, algo: str, c: Connection
+    ) -> bool:
+        token = self._remote_shell_token(to)
+        offset = int(offset)
+        cmd = (
+            f's=$(stat -c %s -- {token}) && [ "$s" -eq {offset} ] && '
+            f"head -c {offset} -- {token} | {self._hash_command(algo)}"
+        )
+        result = c.run(cmd, hide=True, in_stream=False, warn=True)
+        parts = (result.stdout or "").split()
+        return bool(result.ok and parts and parts[0] == prefix_checksum)
+
+    def _append_file(
+        self,
+        path: Path,
+        to: Path,
+        offset: int,
+        prefix_checksum: str,
+        c: Connection,
+        hash_sink: Any,
+    ) -> bool:
+        remote = str(to)
+        with open(path, "rb") as src:
+            if not hash_prefix(src, offset, hash_sink):
+                return False
+            if hash_sink.hexdigest() != prefix_checksum:
+                log.debug(f"The local prefix of {path} differs - not appending")
+                return False
+            sftp = self._get_sftp(c)
+            # paramiko writes at the remote size, also on servers ignoring APPEND
+            with sftp.open(remote, "ab", bufsize=self.sftp_buffer_size) as dst:
+                dst.set_pipelined(self.sftp_pipelined)
+                while block := src.read(self.sftp_buffer_size):
+                    hash_sink.update(block)
+                    dst.write(block)
+        log.debug(f"Appended {hash_sink.size - offset} bytes to {to}")
+        return sftp.stat(remote).st_size == hash_sink.size
+
+
+def _globs(extension: Union[str, List[str]]) -> Union[str, List[str]]:
+    """The "*<extension>" glob(s) for find -name."""
+    if isinstance(extension, list):
+        return [f"*{ext}" for ext in extension]
+    return f"*{extension}"
+
+
+def _find_glob_escape(value: str) -> str:
+    """value with the glob characters of find -name escaped."""
+    return re.sub(r"([\\*?\[])", r"\\\1", str(value))
+
+
+class _HashingReader:
+    """Read-only file wrapper feeding the bytes read to a hash sink (if any)."""
+
+    def __init__(self, f, hash_sink=None):
+        self.f = f
+        self.hash_sink = hash_sink
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.f.read(size)
+        if self.hash_sink is not None:
+            self.hash_sink.update(data)
+        return data
+
+
+def _argv_batches(tokens: List[tuple]) -> Iterator[List[tuple]]:
+    """Split (item, quoted token) pairs into batches that fit on one command line."""
+    batch = []
+    batch_bytes = 0
+    for item, token in tokens:
+        if batch and batch_bytes + len(token) + 1 > REMOTE_ARGV_BYTES:
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append((item, token))
+        batch_bytes += len(token) + 1
+    if batch:
+        yield batch
+
+
+def _quick_hash_script(tokens: List[str], hash_cmd: str, sample_size: int) -> str:
+    """Shell loop printing "<n> <quick hash>" for the n-th of the quoted paths."""
+    n = int(sample_size)
+    return (
+        "i=0; for f in " + " ".join(tokens) + "; do "
+        "i=$((i + 1)); "
+        '[ -f "$f" ] && [ -r "$f" ] || continue; '
+        's=$(stat -c %s -- "$f") || continue; '
+        f'o=0; [ "$s" -gt {n} ] && o=$(( (s - {n}) / 2 )); '
+        "h=$({ printf '%s\\n' \"$s\"; "
+        f'head -c {n} -- "$f"; '
+        f'tail -c +$((o + 1)) -- "$f" | head -c {n}; '
+        f'tail -c {n} -- "$f"; }} | {hash_cmd}) || continue; '
+        'echo "$i ${h%% *}"; '
+        "done"
+    )
+
+
+def _parse_md5sum_line(line: str):
+    """Split a line of md5sum (or sha256sum, b2sum, ...) output into (checksum, name).
+
+    GNU md5sum prefixes the line with a backslash and escapes the name when the
+    file name contains a backslash or a newline.
+    """
+    escaped = line.startswith("\\")
+    if escaped:
+        line = line[1:]
+    checksum, sep, name = line.partition(" ")
+    if not sep or not name:
+        return None
+    name = name[1:]  # the second separator char is " " (text) or "*" (binary)
+    if escaped:
+        out = []
+        chars = iter(name)
+        for ch in chars:
+            if ch == "\\":
+                nxt = next(chars, "")
+                out.append("\n" if nxt == "n" else nxt)
+            else:
+                out.append(ch)
+        name = "".join(out)
+    return checksum, name
+
 
 class SharePointConnection:
     def __init__(self, url, site_name, username, password, doc_library):
@@ -480,6 +1767,8 @@ class SharePointConnection:
 
 
 class SharePointConnector(Connector):
+    is_local = False
+
     def __init__(
         self,
         username=None,
@@ -541,7 +1830,30 @@ class SharePointConnector(Connector):
                 file_list.append(Path(filename))
         return file_list
 
-    def calculate_checksum(self, f: Path, hide=True):
+    def list_entries(self, glob_pattern: str = "", **kwargs: Any) -> List[RemoteEntry]:
+        entries = []
+        for f in self.connection.folder.files:
+            filename = f.get("Name", "")
+            if not filename or glob_pattern not in filename:
+                continue
+            size = f.get("Length")
+            modified = f.get("TimeLastModified")
+            try:
+                size = int(size) if size is not None else None
+            except (TypeError, ValueError):
+                size = None
+            try:
+                mtime = (
+                    datetime.fromisoformat(modified.replace("Z", "+00:00")).timestamp()
+                    if modified
+                    else None
+                )
+            except (AttributeError, ValueError):
+                mtime = None
+            entries.append(RemoteEntry(Path(filename), size, mtime))
+        return entries
+
+    def calculate_checksum(self, f: Path, hide=True, algo=DEFAULT_HASH_ALGO):
         try:
             b = self.connection.folder.get_file(f.name)
         except ShareplumRequestError as e:
@@ -553,13 +1865,19 @@ class SharePointConnector(Connector):
                 f"Failed to calculate checksum for {f}"
             ) from e
 
-        file_hash = hashlib.md5(b)
+        file_hash = new_hash(algo)
+        file_hash.update(b)
         return file_hash.hexdigest()
 
-    def move_func(self, path: Path, to: Path, *args, **kwargs) -> bool:
+    def move_func(
+        self, path: Path, to: Path, *args, hash_sink=None, **kwargs
+    ) -> bool:
         try:
             log.debug(f"Copying {path} to {to}")
             file_content = path.read_bytes()
+            if hash_sink is not None:
+                hash_sink.reset()
+                hash_sink.update(file_content)
             self.connection.folder.upload_file(file_content, path.name)
 
         except ShareplumRequestError as e:
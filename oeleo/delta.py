@@ -0,0 +1,277 @@
+"""rsync-style delta transfers.
+
+The receiver splits its old copy of a file into blocks and sends a weak (adler32)
+and a strong (md5) checksum per block. The sender scans the new file for blocks
+with the same checksums and writes a delta: copy instructions for the blocks the
+receiver already has, and the literal bytes of everything else. The receiver then
+rebuilds the file from its old copy and the delta.
+
+The receiving side is run on the remote by `SSHConnector` as two small python3
+scripts (SIGNATURE_SCRIPT and PATCH_SCRIPT) passed to ``python3 -c``; the sending
+side is `generate_delta`.
+
+Delta format: a sequence of records, each starting with one byte:
+    b"C" + index (8 bytes) + count (4 bytes): copy count blocks of the old file,
+        starting with block index
+    b"D" + length (4 bytes) + data: literal bytes
+    b"E": end of the delta
+(all integers big-endian and unsigned).
+"""
+
+import hashlib
+import logging
+import math
+import struct
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, List, Tuple, Union
+
+log = logging.getLogger("oeleo")
+
+DELTA_BLOCK_SIZE_MIN = 2_048
+DELTA_BLOCK_SIZE_MAX = 131_072
+# files smaller than this are always sent in full
+DELTA_MIN_FILE_SIZE = 1_048_576
+# literal data is written in records of at most this size
+DELTA_MAX_LITERAL = 1_048_576
+# bytes of the new file read at a time while it is scanned
+DELTA_READ_SIZE = 1_048_576
+ADLER_MOD = 65_521
+
+# weak checksum -> [(block index, strong checksum), ...]
+Signatures = Dict[int, List[Tuple[int, str]]]
+
+SIGNATURE_SCRIPT = """
+import hashlib, sys, zlib
+path, size = sys.argv[1], int(sys.argv[2])
+out = []
+with open(path, "rb") as f:
+    while True:
+        block = f.read(size)
+        if len(block) < size:
+            break
+        out.append("%d %s" % (zlib.adler32(block), hashlib.md5(block).hexdigest()))
+sys.stdout.write("\\n".join(out) + "\\n")
+"""
+
+PATCH_SCRIPT = """
+import hashlib, os, struct, sys
+old, delta, new, size, expected = sys.argv[1:6]
+size = int(size)
+md5 = hashlib.md5()
+with open(old, "rb") as src, open(delta, "rb") as ops, open(new, "wb") as dst:
+    while True:
+        op = ops.read(1)
+        if op == b"C":
+            index, count = struct.unpack(">QI", ops.read(12))
+            src.seek(index * size)
+            data = src.read(count * size)
+            if len(data) != count * size:
+                sys.exit("delta refers to missing blocks")
+        elif op == b"D":
+            (length,) = struct.unpack(">I", ops.read(4))
+            data = ops.read(length)
+        elif op == b"E":
+            break
+        else:
+            sys.exit("corrupt delta")
+        md5.update(data)
+        dst.write(data)
+if md5.hexdigest() != expected:
+    os.remove(new)
+    sys.exit("checksum mismatch after patching")
+os.replace(new, old)
+print("ok")
+"""
+
+
+@dataclass
+class DeltaStats:
+    """What a delta consists of."""
+
+    literal_bytes: int = 0
+    copied_bytes: int = 0
+    md5: str = ""
+
+    @property
+    def total_bytes(self) -> int:
+        return self.literal_bytes + self.copied_bytes
+
+
+def delta_block_size(size: int) -> int:
+    """Block size for a file of size bytes: about its square root, within bounds."""
+    block_size = 1 << max(0, math.isqrt(max(size, 1)).bit_length() - 1)
+    return min(max(block_size, DELTA_BLOCK_SIZE_MIN), DELTA_BLOCK_SIZE_MAX)
+
+
+def parse_signatures(text: str) -> Signatures:
+    """Read the output of SIGNATURE_SCRIPT (one "<weak> <strong>" line per block)."""
+    signatures: Signatures = {}
+    for index, line in enumerate(text.splitlines()):
+        weak, _, strong = line.partition(" ")
+        signatures.setdefault(int(weak), []).append((index, strong))
+    return signatures
+
+
+def block_signatures(path: Path, block_size: int) -> Signatures:
+    """The signatures of the full blocks of a local file (like SIGNATURE_SCRIPT)."""
+    signatures: Signatures = {}
+    with open(path, "rb") as f:
+        index = 0
+        while len(block := f.read(block_size)) == block_size:
+            weak = zlib.adler32(block)
+            signatures.setdefault(weak, []).append(
+                (index, hashlib.md5(block).hexdigest())
+            )
+            index += 1
+    return signatures
+
+
+class _DeltaWriter:
+    """Writes delta records, merging runs of consecutive copied blocks."""
+
+    def __init__(self, out: BinaryIO, block_size: int, stats: DeltaStats):
+        self.out = out
+        self.block_size = block_size
+        self.stats = stats
+        self._run_start = None
+        self._run_count = 0
+
+    def copy(self, index: int) -> None:
+        if self._run_start is not None and index == self._run_start + self._run_count:
+            self._run_count += 1
+            return
+        self._flush_run()
+        self._run_start, self._run_count = index, 1
+
+    def literal(self, data: Union[bytes, memoryview]) -> None:
+        if not data:
+            return
+        self._flush_run()
+        for i in range(0, len(data), DELTA_MAX_LITERAL):
+            chunk = data[i : i + DELTA_MAX_LITERAL]
+            self.out.write(b"D" + struct.pack(">I", len(chunk)))
+            self.out.write(chunk)
+            self.stats.literal_bytes += len(chunk)
+
+    def close(self) -> None:
+        self._flush_run()
+        self.out.write(b"E")
+
+    def _flush_run(self) -> None:
+        if self._run_start is None:
+            return
+        self.out.write(b"C" + struct.pack(">QI", self._run_start, self._run_count))
+        self.stats.copied_bytes += self._run_count * self.block_size
+        self._run_start = None
+
+
+def _find_block(
+    signatures: Signatures, weak: int, data, pos: int, length: int
+) -> Union[int, None]:
+    candidates = signatures.get(weak)
+    if not candidates:
+        return None
+    strong = hashlib.md5(data[pos : pos + length]).hexdigest()
+    for index, candidate in candidates:
+        if candidate == strong:
+            return index
+    return None
+
+
+def _scan(
+    f: BinaryIO,
+    signatures: Signatures,
+    block_size: int,
+    writer: _DeltaWriter,
+    feed: Callable[[bytes], None],
+):
+    """Find the blocks of the file f that the receiver has.
+
+    The file is read DELTA_READ_SIZE bytes at a time (each read is passed to feed)
+    into a buffer that only keeps the bytes not written to the delta yet.
+
+    After a mismatch, the window rolls one byte at a time for up to two blocks
+    (this finds the blocks after an insertion of up to one block), and then moves
+    on a block at a time until a block matches again, so that the pure Python
+    rolling never covers more than two blocks per changed region.
+    """
+    length = block_size
+    data = bytearray()
+    eof = False
+    literal_start = 0
+    pos = 0
+    roll_budget = 2 * length
+    a = b = None
+    while True:
+        # the window and the byte rolled in next must be in the buffer
+        if not eof and len(data) < pos + length + 1:
+            if pos - literal_start >= DELTA_MAX_LITERAL:
+                writer.literal(data[literal_start:pos])
+                literal_start = pos
+            del data[:literal_start]
+            pos -= literal_start
+            literal_start = 0
+            chunk = f.read(DELTA_READ_SIZE)
+            if chunk:
+                feed(chunk)
+                data += chunk
+            else:
+                eof = True
+            continue
+        n = len(data)
+        if pos + length > n:
+            break
+        if a is None:
+            weak = zlib.adler32(data[pos : pos + length])
+            a, b = weak & 0xFFFF, weak >> 16
+        index = _find_block(signatures, (b << 16) | a, data, pos, length)
+        if index is not None:
+            writer.literal(data[literal_start:pos])
+            writer.copy(index)
+            pos += length
+            literal_start = pos
+            roll_budget = 2 * length
+            a = None
+            continue
+        if roll_budget > 0 and pos + length < n:
+            out_byte, in_byte = data[pos], data[pos + length]
+            a = (a - out_byte + in_byte) % ADLER_MOD
+            b = (b - length * out_byte + a - 1) % ADLER_MOD
+            roll_budget -= 1
+            pos += 1
+        else:
+            pos += length
+            a = None
+    writer.literal(data[literal_start:])
+
+
+def generate_delta(
+    path: Path,
+    signatures: Signatures,
+    block_size: int,
+    out: BinaryIO,
+    hash_sink=None,
+) -> DeltaStats:
+    """Write the delta that turns the receiver's old file into path to out.
+
+    Every byte of path is fed to hash_sink (if given), and the md5 of path is
+    returned in the stats for the receiver to check the rebuilt file against.
+    """
+    stats = DeltaStats()
+    writer = _DeltaWriter(out, block_size, stats)
+    md5 = hashlib.md5()
+    if hash_sink is not None:
+        hash_sink.reset()
+
+    def feed(chunk: bytes) -> None:
+        md5.update(chunk)
+        if hash_sink is not None:
+            hash_sink.update(chunk)
+
+    with open(path, "rb") as f:
+        _scan(f, signatures, block_size, writer, feed)
+    writer.close()
+    stats.md5 = md5.hexdigest()
+    return stats
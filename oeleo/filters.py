@@ -1,13 +1,106 @@
+import fnmatch
 import logging
+import re
 from datetime import datetime
-from functools import partial
 import os
-from pathlib import Path
-from typing import Any, Generator, Iterable, Union, Callable, List
+from pathlib import Path, PurePath
+from typing import Any, Generator, Iterable, Iterator, Union, Callable, List, Tuple
 
 log = logging.getLogger("oeleo")
 
 
+class ScannedPath(type(Path())):
+    """A Path found by `scan_files`, carrying the stat result of its scan.
+
+    The filters, `LocalConnector.list_entries` and the checker use stat_result
+    instead of calling os.stat again, so changes made after the scan are only
+    seen by the next scan. Paths derived from it (parent, joins) have stat_result
+    None.
+    """
+
+    stat_result: Union[os.stat_result, None] = None
+
+
+def path_stat(path: Union[Path, str]) -> os.stat_result:
+    """The stat result carried by a ScannedPath, else a fresh os.stat."""
+    st = getattr(path, "stat_result", None)
+    return st if st is not None else os.stat(path)
+
+
+def name_matcher(extension: Union[str, List[str], None]) -> Callable[[str], Any]:
+    """One compiled regex matching file names against "*<extension>" globs."""
+    extensions = extension if isinstance(extension, list) else [extension]
+    if any(ext in (None, "", "*") for ext in extensions):
+        return lambda name: True
+    pattern = "|".join(fnmatch.translate(f"*{ext}") for ext in extensions)
+    # glob is case-insensitive on windows
+    flags = re.IGNORECASE if os.name == "nt" else 0
+    return re.compile(pattern, flags).match
+
+
+def scan_files(
+    directory: Path,
+    extension: Union[str, List[str], None] = None,
+    recursive: bool = False,
+    index: Any = None,
+    full: bool = False,
+) -> Iterator[ScannedPath]:
+    """Yield the files in directory matching extension(s), in one os.scandir walk.
+
+    Like globbing "*<extension>" (for each extension of a list), but the tree is
+    only walked once and every file comes with the stat of its directory entry.
+    Symlinked directories are not followed; unreadable directories are skipped.
+
+    With an index (`oeleo.cache.DirectoryIndex`), the scan is incremental: the
+    directories the index finds unchanged are not listed, so their files are not
+    yielded (unless full is True). The index also gets the mtime of the newest
+    matching file of each directory listed.
+    """
+    match = name_matcher(extension)
+    pending = [os.fspath(directory)]
+    if index is not None:
+        index.start_scan(full)
+    while pending:
+        current = pending.pop()
+        if index is not None:
+            try:
+                mtime_ns = os.stat(current).st_mtime_ns
+            except OSError as e:
+                log.debug(f"Could not stat {current}: {e}")
+                index.forget(current)
+                continue
+            if index.skip(current, mtime_ns):
+                if recursive:
+                    pending.extend(reversed(index.subdirs(current)))
+                continue
+        try:
+            with os.scandir(current) as it:
+                entries = list(it)
+        except OSError as e:
+            log.debug(f"Could not scan {current}: {e}")
+            continue
+        subdirs = []
+        newest_ns = 0
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                    continue
+                if not match(entry.name) or not entry.is_file():
+                    continue
+                path = ScannedPath(entry.path)
+                path.stat_result = entry.stat()
+            except OSError as e:
+                log.debug(f"Could not stat {entry.path}: {e}")
+                continue
+            newest_ns = max(newest_ns, path.stat_result.st_mtime_ns)
+            yield path
+        if index is not None:
+            index.update(current, mtime_ns, len(entries), subdirs, newest_ns)
+        if recursive:
+            pending.extend(reversed(subdirs))
+
+
 def filter_on_startswith(path: Union[Path, str], value: Union[str, List[str]]):
     n = os.path.basename(path)
     v = value if isinstance(value, list) else [value]
@@ -36,7 +129,7 @@ def filter_on_callable(path: Union[Path, str], f: Callable):
 
 
 def filter_on_not_before(path: Union[Path, str], value: datetime):
-    st = os.stat(path)
+    st = path_stat(path)
     sdt = datetime.fromtimestamp(st.st_mtime)
     if sdt >= value:
         return True
@@ -45,7 +138,7 @@ def filter_on_not_before(path: Union[Path, str], value: datetime):
 
 
 def filter_on_not_after(path: Union[Path, str], value: datetime):
-    st = os.stat(path)
+    st = path_stat(path)
     sdt = datetime.fromtimestamp(st.st_mtime)
     if sdt <= value:
         return True
@@ -76,8 +169,8 @@ def base_filter(
     """Simple directory content filter - cannot be used for ssh"""
 
     if base_filter_func is None:
-        base_filter_func = path.glob
-    if isinstance(extension, list):
+        file_list = scan_files(path, extension)
+    elif isinstance(extension, list):
         file_list = []
         for ext in extension:
             file_list.extend(list(base_filter_func(f"*{ext}")))
@@ -90,14 +183,119 @@ def base_filter(
     return file_list
 
 
+def _as_list(value: Any) -> list:
+    return list(value) if isinstance(value, (list, tuple, set, frozenset)) else [value]
+
+
+def _any_of(values: List[str]) -> str:
+    # an empty alternation must match nothing (like any([]) in the filter functions)
+    return "(?:" + "|".join(map(re.escape, values)) + ")" if values else "(?!)"
+
+
+class FilterSpec:
+    """additional_filters compiled once into a single predicate on files.
+
+    The same result as chaining the FILTERS functions, but filters of one kind are
+    merged and the cheap checks run first: exact names (a frozenset), then one
+    regex for all startswith / contains filters and one for the not_contains
+    values, then the callables, and last the mtime window of the not_before /
+    not_after filters, for which a file is stat'ed (`path_stat`) at most once.
+
+    `match_name` and `match_mtime` can also be used on their own, e.g. for remote
+    listings that come with the mtime (`SSHConnector.list_entries`).
+    """
+
+    def __init__(self, additional_filters: Iterable[FilterTuple] = None):
+        self.filters = list(additional_filters or [])
+        self.excluded = set()
+        self.callables = []
+        self.not_before: Union[float, None] = None  # seconds since the epoch
+        self.not_after: Union[float, None] = None
+        required, forbidden = [], []
+        for filter_name, filter_val in self.filters:
+            if filter_name not in FILTERS:
+                raise KeyError(
+                    f"Unknown filter {filter_name!r} (use one of {list(FILTERS)})"
+                )
+            if filter_name == "startswith":
+                required.append(_any_of(_as_list(filter_val)))
+            elif filter_name == "contains":
+                required.append(".*?" + _any_of(_as_list(filter_val)))
+            elif filter_name == "not_contains":
+                forbidden.extend(_as_list(filter_val))
+            elif filter_name == "excluded":
+                self.excluded.update(_as_list(filter_val))
+            elif filter_name == "callable":
+                self.callables.append(filter_val)
+            elif filter_name == "not_before":
+                ts = filter_val.timestamp()
+                self.not_before = ts if self.not_before is None else max(
+                    self.not_before, ts
+                )
+            else:
+                ts = filter_val.timestamp()
+                self.not_after = ts if self.not_after is None else min(
+                    self.not_after, ts
+                )
+        self.excluded = frozenset(self.excluded)
+        # all startswith / contains filters as lookaheads anchored at the start
+        self._required = (
+            re.compile("".join(f"(?={p})" for p in required), re.DOTALL).match
+            if required
+            else None
+        )
+        self._forbidden = (
+            re.compile(_any_of(forbidden), re.DOTALL).search if forbidden else None
+        )
+
+    @classmethod
+    def of(cls, additional_filters: Any) -> "FilterSpec":
+        """additional_filters compiled (or as they are if already a FilterSpec)."""
+        if isinstance(additional_filters, cls):
+            return additional_filters
+        return cls(additional_filters)
+
+    def __bool__(self):
+        return bool(self.filters)
+
+    def __repr__(self):
+        return f"FilterSpec({self.filters!r})"
+
+    def values(self) -> Iterator[Tuple[str, list]]:
+        """(filter name, list of its values) for each of the filters."""
+        for filter_name, filter_val in self.filters:
+            yield filter_name, _as_list(filter_val)
+
+    @property
+    def needs_stat(self) -> bool:
+        return self.not_before is not None or self.not_after is not None
+
+    def match_name(self, name: str) -> bool:
+        if name in self.excluded:
+            return False
+        if self._required is not None and not self._required(name):
+            return False
+        if self._forbidden is not None and self._forbidden(name):
+            return False
+        return all(f(name) for f in self.callables)
+
+    def match_mtime(self, mtime: float) -> bool:
+        if self.not_before is not None and mtime < self.not_before:
+            return False
+        return self.not_after is None or mtime <= self.not_after
+
+    def __call__(self, path: Union[Path, str]) -> bool:
+        name = path.name if isinstance(path, PurePath) else os.path.basename(path)
+        if not self.match_name(name):
+            return False
+        return not self.needs_stat or self.match_mtime(path_stat(path).st_mtime)
+
+
 def additional_filtering(
     file_list: Iterable[Union[Path, str]],
-    additional_filters: Iterable[FilterTuple] = None,
+    additional_filters: Union[Iterable[FilterTuple], FilterSpec] = None,
 ) -> Iterable:
-    for filter_name, filter_val in additional_filters:
-        filter_func = FILTERS[filter_name]
-        file_list = filter(partial(filter_func, value=filter_val), file_list)
-    return file_list
+    return filter(FilterSpec.of(additional_filters), file_list)
 
 
 def main():
@@ -2,9 +2,10 @@ import datetime
 import logging
 import random
 from pathlib import Path
-from typing import Any, Protocol, Union
+from typing import Any, Dict, Protocol, Union
 
 import peewee
+from playhouse.migrate import SqliteMigrator, migrate
 
 DEFAULT_DB_NAME = "oeleo-file-list.db"
 
@@ -14,6 +15,15 @@ CODES = [
     (2, "should-not-be-copied"),
 ]
 
+# stat fingerprint stored next to the checksum; used to skip re-hashing unchanged files
+STAT_FIELDS = ("size", "mtime_ns", "inode")
+# checksums in rows without a hash_algo (written before it was stored) are md5
+LEGACY_HASH_ALGO = "md5"
+# keys in the checks that describe the checksum instead of being compared directly
+HASH_FIELDS = ("hash_algo", "legacy_checksum", "quick_hash", "verified_date")
+# size and checksum of the bytes sent in the last transfer (the prefix an append extends)
+TRANSFER_FIELDS = ("transferred_size", "transferred_checksum")
+
 database_proxy = peewee.DatabaseProxy()
 log = logging.getLogger("oeleo")
 
@@ -24,9 +34,49 @@ class FileList(peewee.Model):
     external_name = peewee.CharField(null=True)
     checksum = peewee.CharField(null=True)
     code = peewee.SmallIntegerField(choices=CODES, default=0)
+    size = peewee.BigIntegerField(null=True)
+    mtime_ns = peewee.BigIntegerField(null=True)
+    inode = peewee.BigIntegerField(null=True)
+    hash_algo = peewee.CharField(null=True)
+    quick_hash = peewee.CharField(null=True)
+    verified_date = peewee.DateTimeField(null=True)
+    transferred_size = peewee.BigIntegerField(null=True)
+    transferred_checksum = peewee.CharField(null=True)
+
+    class Meta:
+        database = database_proxy
+
+
+class ChecksumCacheEntry(peewee.Model):
+    """A checksum of a local file, valid while the file keeps its stat fingerprint."""
+
+    path = peewee.CharField()
+    hash_algo = peewee.CharField()
+    checksum = peewee.CharField()
+    size = peewee.BigIntegerField(null=True)
+    mtime_ns = peewee.BigIntegerField(null=True)
+    inode = peewee.BigIntegerField(null=True)
+    last_used = peewee.DateTimeField(default=datetime.datetime.now)
 
     class Meta:
         database = database_proxy
+        table_name = "checksumcache"
+        indexes = ((("path", "hash_algo"), True),)
+
+
+class DirectoryState(peewee.Model):
+    """A local directory as it was when it was last listed by an incremental scan."""
+
+    path = peewee.CharField(unique=True)
+    parent = peewee.CharField(null=True, index=True)
+    mtime_ns = peewee.BigIntegerField()
+    entries = peewee.IntegerField(default=0)
+    newest_ns = peewee.BigIntegerField(default=0)  # mtime of the newest file
+    scanned_date = peewee.DateTimeField(default=datetime.datetime.now)
+
+    class Meta:
+        database = database_proxy
+        table_name = "directorystate"
 
 
 class DbHandler(Protocol):
@@ -38,10 +88,24 @@ class DbHandler(Protocol):
     def register(self, f: Path):
         ...
 
-    def is_changed(self, **checks: Any) -> bool:
+    def is_changed(self, record: Any = None, **checks: Any) -> bool:
         ...
 
-    def update_record(self, external_name: Path, code: int = 1, **checks: Any):
+    def update_record(
+        self, external_name: Path, code: int = 1, record: Any = None, **checks: Any
+    ):
+        ...
+
+    def refresh_record(self, record: Any = None, **checks: Any):
+        ...
+
+    def load_index(self):
+        ...
+
+    def flush(self):
+        ...
+
+    def unload_index(self):
         ...
 
 
@@ -55,26 +119,47 @@ class MockDbHandler(DbHandler):
     def register(self, f: Path):
         print(f"REGISTERING {f}")
 
-    def is_changed(self, **checks) -> bool:
+    def is_changed(self, record: Any = None, **checks) -> bool:
         print("CHECKING IF IT HAS CHANGED")
         print(f"checks: {checks}")
         _is_changed = random.choice([True, False])
         print(f"is-changed: {_is_changed}")
         return _is_changed
 
-    def update_record(self, external_name: Path, code: int = 1, **checks: Any):
+    def update_record(
+        self, external_name: Path, code: int = 1, record: Any = None, **checks: Any
+    ):
         print("UPDATE RECORD IN DB")
         print(f"external name: {external_name}")
         print(f"additional checks: {checks}")
 
+    def refresh_record(self, record: Any = None, **checks: Any):
+        print("REFRESH RECORD IN DB")
+
+    def load_index(self):
+        pass
+
+    def flush(self):
+        pass
+
+    def unload_index(self):
+        pass
+
 
 class SimpleDbHandler(DbHandler):
-    """A simple db bookkeeper using sqlite3 that checks on checksum."""
+    """A simple db bookkeeper using sqlite3 that checks on checksum.
+
+    By default every change is saved right away. After `load_index` the whole table is
+    kept in memory (keyed by local_name): `register` is answered from the index and
+    changes are buffered until `flush` writes them in a single transaction.
+    """
 
     def __init__(self, db_name: str) -> None:
         self.db_name = db_name
         self.db_model: peewee.Model = FileList
         self._current_record = None
+        self._index = None
+        self._dirty = {}
         self.db_instance = database_proxy
         self._set_up_sqlite_db()
 
@@ -97,38 +182,154 @@ class SimpleDbHandler(DbHandler):
     def initialize_db(self):
         self.db_instance.init(self.db_name)
         self.db_instance.connect()
-        self.db_instance.create_tables([self.db_model])
+        self.db_instance.create_tables(
+            [self.db_model, ChecksumCacheEntry, DirectoryState]
+        )
+        self._migrate_schema()
+
+    def _migrate_schema(self):
+        """Add columns that are in the models but missing in an existing db file."""
+        for model in (self.db_model, ChecksumCacheEntry, DirectoryState):
+            self._migrate_table(model)
+
+    def _migrate_table(self, model):
+        table = model._meta.table_name
+        existing = {c.name for c in self.db_instance.get_columns(table)}
+        missing = [
+            field
+            for field in model._meta.sorted_fields
+            if field.column_name not in existing
+        ]
+        if not missing:
+            return
+        log.debug(f"Migrating '{table}': adding {[f.column_name for f in missing]}")
+        migrator = SqliteMigrator(self.db_instance.obj)
+        with self.db_instance.atomic():
+            migrate(
+                *[migrator.add_column(table, f.column_name, f) for f in missing]
+            )
 
     def register(self, f: Path):
-        """Get or create record of the file and check if it needs to be copied."""
-        self._current_record, new = self.db_model.get_or_create(local_name=f.name)
-        if new:
-            self.record.code = 0
-            self.record.save()
-
-    def is_changed(self, **checks) -> bool:
-        if self.record.code == 0:
+        """Get or create record of the file and check if it needs to be copied.
+
+        The record is both kept as the current record and returned, so that callers
+        processing several files at once can hold on to their own record.
+        """
+        if self._index is not None:
+            record = self._index.get(f.name)
+            if record is None:
+                record = self.db_model(local_name=f.name, code=0)
+                self._index[f.name] = record
+                self._save(record)
+        else:
+            record, new = self.db_model.get_or_create(local_name=f.name)
+            if new:
+                record.code = 0
+                record.save()
+        self._current_record = record
+        return record
+
+    def _save(self, record):
+        if self._index is not None:
+            self._dirty[record.local_name] = record
+        else:
+            record.save()
+
+    def load_index(self):
+        """Read all records into memory and start buffering changes."""
+        self.flush()
+        self._index = {r.local_name: r for r in self.db_model.select()}
+        log.debug(f"Loaded {len(self._index)} records into the bookkeeping index")
+
+    def flush(self):
+        """Write buffered changes to the db in one transaction."""
+        if not self._dirty:
+            return
+        log.debug(f"Flushing {len(self._dirty)} records to the db")
+        with self.db_instance.atomic():
+            for record in self._dirty.values():
+                record.save()
+        self._dirty.clear()
+
+    def unload_index(self):
+        """Flush buffered changes and go back to saving every change right away."""
+        self.flush()
+        self._index = None
+
+    def is_changed(self, record: Any = None, **checks) -> bool:
+        record = record if record is not None else self.record
+        if record.code == 0:
             return True
-        if self.record.code >= 2:
+        if record.code >= 2:
             return False
 
         _is_changed = False
         for k in checks:
+            if k in STAT_FIELDS or k in HASH_FIELDS or k in TRANSFER_FIELDS:
+                # the stat fingerprint is bookkeeping only - content decides
+                continue
+            if k == "checksum" and not self._same_hash_algo(record, checks):
+                # a row from before a change of algorithm: compare the checksum
+                # the checker calculated with the algorithm of the row instead
+                if record.checksum != checks.get("legacy_checksum"):
+                    _is_changed = True
+                continue
             try:
-                v = getattr(self.record, k)
+                v = getattr(record, k)
             except AttributeError as e:
                 raise AttributeError("oeleo-model-key mismatch") from e
             if v != checks[k]:
                 _is_changed = True
         return _is_changed
 
-    def update_record(self, external_name: Path, code: int = 1, **checks: Any):
+    def update_record(
+        self, external_name: Path, code: int = 1, record: Any = None, **checks: Any
+    ):
+        record = record if record is not None else self.record
         checksum = checks.get("checksum", None)
-        self.record.checksum = checksum
-        self.record.processed_date = datetime.datetime.now()
-        self.record.code = code
-        self.record.external_name = external_name
-        self.record.save()
+        record.checksum = checksum
+        record.processed_date = datetime.datetime.now()
+        record.code = code
+        record.external_name = external_name
+        record.hash_algo = checks.get("hash_algo", None)
+        record.quick_hash = checks.get("quick_hash", None)
+        if checks.get("verified_date"):
+            record.verified_date = checks["verified_date"]
+        for k in STAT_FIELDS + TRANSFER_FIELDS:
+            if k in checks:
+                setattr(record, k, checks[k])
+        self._save(record)
+
+    @staticmethod
+    def _same_hash_algo(record: Any, checks: Dict[str, Any]) -> bool:
+        algo = checks.get("hash_algo") or LEGACY_HASH_ALGO
+        return algo == (getattr(record, "hash_algo", None) or LEGACY_HASH_ALGO)
+
+    def refresh_record(self, record: Any = None, **checks: Any):
+        """Store a new stat fingerprint for a file whose content has not changed.
+
+        A checksum calculated with another algorithm than the one of the row replaces
+        the stored one, so rows move over to a new algorithm as their files are read.
+        A new quick hash or verification date in the checks is stored as well.
+        Nothing is written if the record is already up to date.
+        """
+        record = record if record is not None else self.record
+        stale = {
+            k: checks[k]
+            for k in STAT_FIELDS
+            if k in checks and getattr(record, k) != checks[k]
+        }
+        if checks.get("checksum") and not self._same_hash_algo(record, checks):
+            stale["checksum"] = checks["checksum"]
+            stale["hash_algo"] = checks["hash_algo"]
+        for k in ("quick_hash", "verified_date"):
+            if checks.get(k) and getattr(record, k, None) != checks[k]:
+                stale[k] = checks[k]
+        if not stale:
+            return
+        for k, v in stale.items():
+            setattr(record, k, v)
+        self._save(record)
 
     @property
     def code(self):
@@ -139,4 +340,4 @@ class SimpleDbHandler(DbHandler):
         if code not in (0, 1, 2):
             raise ValueError("code is not valid")
         self.record.code = code
-        self.record.save()
+        self._save(self.record)
@@ -4,8 +4,12 @@ import shutil
 import os
 from pathlib import Path
 
+from oeleo.utils import HashSink
+
 log = logging.getLogger("oeleo")
 
+COPY_BUFFER_SIZE = 1_048_576
+
 
 def mock_mover(path: Path, to: Path, *args, **kwargs):
     print(f"COPYING {path} -> {to}")
@@ -14,14 +18,73 @@ def mock_mover(path: Path, to: Path, *args, **kwargs):
     return success
 
 
-def simple_recursive_mover(path: Path, to: Path, *args, **kwargs) -> bool:
+def copy_file(path: Path, to: Path, hash_sink=None) -> None:
+    """Copy the content of a file, feeding every block to hash_sink if given."""
+    if hash_sink is None:
+        shutil.copyfile(path, to)
+        return
+    hash_sink.reset()
+    with open(path, "rb") as src, open(to, "wb") as dst:
+        while block := src.read(COPY_BUFFER_SIZE):
+            hash_sink.update(block)
+            dst.write(block)
+
+
+def hash_prefix(src, length: int, hash_sink) -> bool:
+    """Feed the first length bytes of the open file src to hash_sink (after a reset).
+
+    Returns False if src has fewer bytes. The file is left positioned after them.
+    """
+    hash_sink.reset()
+    remaining = length
+    while remaining > 0:
+        block = src.read(min(remaining, COPY_BUFFER_SIZE))
+        if not block:
+            return False
+        hash_sink.update(block)
+        remaining -= len(block)
+    return True
+
+
+def append_file(
+    path: Path, to: Path, offset: int, prefix_checksum: str, hash_sink
+) -> bool:
+    """Append the bytes of path after offset to the file to.
+
+    Nothing is written (and False is returned) unless to is exactly offset bytes
+    long and the first offset bytes of both files hash to prefix_checksum. The bytes
+    of path are fed to hash_sink, which ends up with the checksum of all of path.
+    """
+    if not to.is_file() or to.stat().st_size != offset:
+        return False
+    with open(to, "rb") as dst:
+        dst_sink = HashSink(hash_sink.factory)
+        if not hash_prefix(dst, offset, dst_sink):
+            return False
+        if dst_sink.hexdigest() != prefix_checksum:
+            return False
+    with open(path, "rb") as src:
+        if not hash_prefix(src, offset, hash_sink):
+            return False
+        if hash_sink.hexdigest() != prefix_checksum:
+            return False
+        with open(to, "ab") as dst:
+            while block := src.read(COPY_BUFFER_SIZE):
+                hash_sink.update(block)
+                dst.write(block)
+    return True
+
+
+def simple_recursive_mover(
+    path: Path, to: Path, *args, hash_sink=None, **kwargs
+) -> bool:
     try:
         if path.is_dir():
             raise IOError("DIRECTORY")
         f_dir = to.parent
         if not f_dir.exists():
             os.makedirs(f_dir)
-        shutil.copyfile(path, to)
+        copy_file(path, to, hash_sink)
         return True
     except OSError:
         log.debug(
@@ -30,9 +93,9 @@ def simple_recursive_mover(path: Path, to: Path, *args, **kwargs) -> bool:
         return False
 
 
-def simple_mover(path: Path, to: Path, *args, **kwargs) -> bool:
+def simple_mover(path: Path, to: Path, *args, hash_sink=None, **kwargs) -> bool:
     try:
-        shutil.copyfile(path, to)
+        copy_file(path, to, hash_sink)
         return True
     except OSError as e:
         print(f"Could not copy this file - {e}")
@@ -2,7 +2,8 @@ import atexit
 import logging
 import time
 from datetime import datetime, timedelta
-from typing import Protocol, Union, Any
+from pathlib import Path
+from typing import Any, List, Protocol, Union
 import warnings
 
 from rich import print
@@ -10,6 +11,8 @@ from rich.live import Live
 from rich.panel import Panel
 
 from oeleo.connectors import OeleoConnectionError
+from oeleo.filters import FilterSpec
+from oeleo.watchers import WATCH_DEBOUNCE, WATCH_MAX_DELAY, Debouncer, make_watcher
 from oeleo.workers import WorkerBase
 
 log = logging.getLogger("oeleo")
@@ -128,3 +131,158 @@ class SimpleScheduler(SchedulerBase):
 
     def _update_db(self):
         pass
+
+
+class WatchScheduler(SchedulerBase):
+    """Runs the worker on the local files the filesystem reports as changed.
+
+    An alternative to SimpleScheduler: instead of scanning everything every
+    `run_interval_time` seconds, the local directory is watched (see
+    `oeleo.watchers`), and created or modified files are handed to the worker
+    (`Worker.add_local` + `Worker.run`) once they have been left alone for
+    `debounce` seconds, or have kept changing for `max_delay` seconds. A burst of
+    events for a file ends up in one run, and files that are ready at the same
+    time are run together.
+
+    A full reconciliation (`Worker.filter_local(full_scan=True)` + `Worker.run`,
+    listing everything also with an incremental scan) is done at the start, every
+    `reconcile_interval` seconds, when a forced run is requested and when the
+    watcher may have missed events. The scheduler stops after `max_run_intervals`
+    runs of the worker (None: never).
+    """
+
+    def __init__(
+        self,
+        worker: WorkerBase,
+        reconcile_interval=43_200,
+        max_run_intervals=None,
+        update_db=True,
+        force=False,
+        add_check=False,
+        additional_filters=None,
+        debounce=WATCH_DEBOUNCE,
+        max_delay=WATCH_MAX_DELAY,
+        backend=None,
+        watcher=None,
+        poll_interval=1.0,
+    ):
+        self.worker = worker
+        self.state = {"iterations": 0, "reconciliations": 0}
+        self.reconcile_interval = reconcile_interval
+        self.max_run_intervals = max_run_intervals
+        self.update_db: bool = update_db
+        self.force: bool = force
+        self.additional_filters: Any = additional_filters
+        self.add_check: bool = add_check
+        self.poll_interval = poll_interval
+        self.debouncer = Debouncer(debounce, max_delay)
+        if watcher is None:
+            connector = worker.local_connector
+            watcher = make_watcher(
+                connector.directory,
+                extension=worker.extension,
+                recursive=connector.include_subdirs,
+                backend=backend,
+            )
+        self.watcher = watcher
+        self._filter = FilterSpec(additional_filters)
+        self._next_reconcile = 0.0
+        self._run_counter = 0
+
+    def _setup(self):
+        log.debug("setting up scheduler")
+        self.worker.connect_to_db()
+        if self.add_check:
+            self.worker.check(
+                update_db=self.update_db,
+                force=self.force,
+                additional_filters=self.additional_filters,
+            )
+        # watch before the first scan, so that nothing falls between the two
+        self.watcher.start()
+        atexit.register(self._cleanup)
+
+    def _cleanup(self):
+        self.watcher.close()
+        self.worker.close()
+
+    def _done(self) -> bool:
+        return (
+            self.max_run_intervals is not None
+            and self._run_counter >= self.max_run_intervals
+        )
+
+    def start(self):
+        log.debug("WatchScheduler *STARTED*")
+        self._setup()
+        self._reconcile()
+        while not self._done():
+            self.state["iterations"] += 1
+            self.debouncer.add(self.watcher.poll(self.poll_interval))
+            self.worker.die_if_necessary()
+            if (
+                self.worker.reporter.consume_force_run()
+                or self.watcher.needs_rescan
+                or time.monotonic() >= self._next_reconcile
+            ):
+                self._reconcile()
+                continue
+            files = self._ready_files()
+            if files:
+                log.debug(f"{len(files)} changed files are ready")
+                self._run(files)
+        atexit.unregister(self._cleanup)
+        self._cleanup()
+
+    def _ready_files(self) -> List[Path]:
+        files = []
+        for f in self.debouncer.pop_ready():
+            try:
+                if f.is_file() and self._filter(f):
+                    files.append(f)
+            except OSError as e:
+                log.debug(f"Skipping {f}: {e}")
+        return files
+
+    def _reconcile(self):
+        log.debug("Reconciling (full scan)")
+        self.state["reconciliations"] += 1
+        self.watcher.needs_rescan = False
+        self._next_reconcile = time.monotonic() + self.reconcile_interval
+        self._run()
+
+    def _listed_everything(self) -> bool:
+        index = getattr(self.worker, "directory_index", None)
+        return index is None or index.full
+
+    def _run(self, files: Union[List[Path], None] = None):
+        """Run the worker on files (None: on everything found by a full scan)."""
+        try:
+            if files is None:
+                self.worker.filter_local(
+                    full_scan=True, additional_filters=self.additional_filters
+                )
+                if self._listed_everything():
+                    # the files still waiting in the debouncer are in the listing
+                    self.debouncer.clear()
+            else:
+                self.worker.add_local(files)
+            self.worker.run()
+        except OeleoConnectionError as e:
+            log.error(
+                "Destination connection lost (%s); will retry with a full scan", e
+            )
+            self.worker.reporter.report(
+                f"Destination connection lost; retrying with a full scan ({e})"
+            )
+            self._next_reconcile = min(
+                self._next_reconcile, time.monotonic() + self.debouncer.max_delay
+            )
+        self._run_counter += 1
+        next_run_at = datetime.now() + timedelta(
+            seconds=max(self._next_reconcile - time.monotonic(), 0)
+        )
+        self.worker.reporter.update_metadata(
+            last_run_at=datetime.now(), next_run_at=next_run_at
+        )
+        self.worker.reporter.status("watch")
@@ -1,13 +1,26 @@
 import hashlib
 import logging
+import threading
+from contextlib import contextmanager
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
 import os
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Set, Tuple
 
 import dotenv
 import peewee
 from rich.logging import RichHandler
 
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+try:
+    import blake3
+except ImportError:
+    blake3 = None
+
 from oeleo.models import SimpleDbHandler
 
 STDOUT_LOG_MESSAGE_FORMAT = "%(message)s"
@@ -19,6 +32,8 @@ FILE_LOG_MESSAGE_FORMAT_ALL = (
 FILE_LOG_MAX_BYTES = 1_000_000
 FILE_LOG_BACKUP_COUNT = 3
 
+log = logging.getLogger("oeleo")
+
 
 def to_bool(value):
     """Convert a value to a boolean"""
@@ -35,14 +50,223 @@ def to_bool(value):
     raise ValueError(f"Could not convert {value} to a boolean")
 
 
-def calculate_checksum(file_path: Path) -> str:
+DEFAULT_HASH_ALGO = "md5"
+# read sizes used when hashing: larger files get larger blocks, within these bounds
+HASH_BLOCK_SIZE_MIN = 65_536
+HASH_BLOCK_SIZE_MAX = 4_194_304
+# bytes read from the start, middle and end of a file for its quick hash
+QUICK_HASH_SAMPLE_SIZE = 1_048_576
+
+# name -> constructor of a hashlib-like object (update/hexdigest)
+HASH_ALGORITHMS: Dict[str, Callable[[], Any]] = {
+    "md5": hashlib.md5,
+    "sha1": hashlib.sha1,
+    "sha256": hashlib.sha256,
+    "blake2b": hashlib.blake2b,
+}
+if xxhash is not None:
+    HASH_ALGORITHMS["xxh64"] = xxhash.xxh64
+if blake3 is not None:
+    HASH_ALGORITHMS["blake3"] = blake3.blake3
+
+
+def resolve_hash_algo(algo: str = None) -> str:
+    """Resolve the hash algorithm: explicit kwarg, else OELEO_HASH_ALGO, else md5."""
+    if algo is None:
+        algo = os.environ.get("OELEO_HASH_ALGO") or DEFAULT_HASH_ALGO
+    algo = algo.lower()
+    if algo not in HASH_ALGORITHMS:
+        raise ValueError(
+            f"hash algorithm must be one of {sorted(HASH_ALGORITHMS)}, got {algo!r} "
+            f"(xxh64 and blake3 need the xxhash and blake3 packages)"
+        )
+    return algo
+
+
+def new_hash(algo: str = DEFAULT_HASH_ALGO) -> Any:
+    return HASH_ALGORITHMS[algo]()
+
+
+def hash_block_size(size: int) -> int:
+    """Block size for hashing a file of `size` bytes (a power of two, about 1/16 of it)."""
+    block_size = HASH_BLOCK_SIZE_MIN
+    while block_size < HASH_BLOCK_SIZE_MAX and block_size * 16 < size:
+        block_size *= 2
+    return block_size
+
+
+def _advise_sequential(fd: int) -> None:
+    # lets the kernel read ahead more aggressively (not available on Windows)
+    if hasattr(os, "posix_fadvise"):
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except OSError:
+            pass
+
+
+def calculate_checksums(file_path: Path, algos: Iterable[str]) -> Dict[str, str]:
+    """Hash a file with several algorithms in a single read.
+
+    The file is read with `readinto` into one reused buffer sized by
+    `hash_block_size`, so no new bytes object is made per block. (Files are not
+    mapped with mmap: the acquisition software may truncate or rewrite a file while
+    it is hashed, which raises SIGBUS on a mapping, and a mapped file cannot be
+    truncated by its writer on Windows.)
+    """
+    hashes = {algo: new_hash(algo) for algo in algos}
+    with open(file_path, "rb", buffering=0) as f:
+        fd = f.fileno()
+        size = os.fstat(fd).st_size
+        _advise_sequential(fd)
+        buffer = bytearray(hash_block_size(size))
+        with memoryview(buffer) as view:
+            while n := f.readinto(buffer):
+                for file_hash in hashes.values():
+                    file_hash.update(view[:n])
+    return {algo: file_hash.hexdigest() for algo, file_hash in hashes.items()}
+
+
+def calculate_checksum(file_path: Path, algo: str = DEFAULT_HASH_ALGO) -> str:
+    return calculate_checksums(file_path, (algo,))[algo]
+
+
+def quick_hash_ranges(size: int, sample_size: int) -> List[Tuple[int, int]]:
+    """The (offset, length) of the start, middle and end samples of a quick hash.
+
+    The samples overlap for files smaller than three samples.
+    """
+    n = min(sample_size, size)
+    middle = (size - sample_size) // 2 if size > sample_size else 0
+    return [(0, n), (middle, min(sample_size, size - middle)), (size - n, n)]
+
+
+def calculate_quick_hash(
+    file_path: Path,
+    algo: str = DEFAULT_HASH_ALGO,
+    sample_size: int = QUICK_HASH_SAMPLE_SIZE,
+) -> str:
+    """Hash the size of file_path followed by its start, middle and end samples.
+
+    The bytes hashed are the size in decimal and a newline, then the samples given
+    by `quick_hash_ranges`, so that the same value can be produced remotely with
+    stat, head and tail (see `SSHConnector.calculate_quick_hashes`).
+    """
     with open(file_path, "rb") as f:
-        file_hash = hashlib.md5()
-        while chunk := f.read(8192):
-            file_hash.update(chunk)
+        size = os.fstat(f.fileno()).st_size
+        file_hash = new_hash(algo)
+        file_hash.update(f"{size}\n".encode())
+        for offset, length in quick_hash_ranges(size, sample_size):
+            f.seek(offset)
+            while length > 0:
+                chunk = f.read(min(length, HASH_BLOCK_SIZE_MAX))
+                if not chunk:
+                    break
+                file_hash.update(chunk)
+                length -= len(chunk)
     return file_hash.hexdigest()
 
 
+class HashSink:
+    """Hashes the bytes of a file while it is being transferred.
+
+    Movers call `reset` at the start of every attempt and `update` with each block
+    they send, so the digest always belongs to the bytes of the last attempt.
+    """
+
+    def __init__(self, factory: Callable[[], Any] = hashlib.md5):
+        if isinstance(factory, str):
+            factory = HASH_ALGORITHMS[factory]
+        self.factory = factory
+        self.reset()
+
+    def reset(self) -> None:
+        self._hash = self.factory()
+        self.size = 0
+
+    def update(self, data: bytes) -> None:
+        self._hash.update(data)
+        self.size += len(data)
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
+class ConnectionGuard:
+    """Keeps a connection from being reconnected while other threads are using it.
+
+    Threads hold `use` while they transfer (shared, and re-entrant per thread);
+    `reconnect` waits until no other thread is using the connection and holds new
+    users back until it is done. A thread may reconnect in the middle of its own
+    `use`. When several threads ask for a reconnect at the same time, the first
+    one reconnects and the others return once it has succeeded.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._users: Dict[int, int] = {}  # thread id -> depth of its `use` blocks
+        self._waiting: Set[int] = set()  # threads waiting to reconnect
+        self._reconnecting = False
+        self._generation = 0  # number of reconnects done
+
+    @contextmanager
+    def use(self) -> Iterator[None]:
+        me = threading.get_ident()
+        with self._cond:
+            if me not in self._users:
+                self._cond.wait_for(
+                    lambda: not self._reconnecting and not self._waiting
+                )
+            self._users[me] = self._users.get(me, 0) + 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._users[me] -= 1
+                if not self._users[me]:
+                    del self._users[me]
+                self._cond.notify_all()
+
+    def reconnect(self, func: Callable[[], Any]) -> None:
+        """Call func once no other thread is using the connection."""
+        me = threading.get_ident()
+        with self._cond:
+            generation = self._generation
+            self._waiting.add(me)
+            try:
+                self._cond.wait_for(
+                    lambda: generation != self._generation
+                    or not self._reconnecting
+                    and not (self._users.keys() - self._waiting - {me})
+                )
+            finally:
+                self._waiting.discard(me)
+                self._cond.notify_all()
+            if generation != self._generation:
+                log.debug("Reconnected by another thread meanwhile")
+                return
+            self._reconnecting = True
+        done = False
+        try:
+            func()
+            done = True
+        finally:
+            with self._cond:
+                self._reconnecting = False
+                self._generation += done
+                self._cond.notify_all()
+
+
+def stat_fingerprint(file_path: Path, stat_result: os.stat_result = None) -> Dict[str, Any]:
+    """Return the stat values oeleo uses to tell if a file might have changed.
+
+    Uses stat_result, else the stat result a ScannedPath (oeleo.filters) carries
+    from its directory scan, else os.stat.
+    """
+    st = stat_result or getattr(file_path, "stat_result", None) or os.stat(file_path)
+    inode = st.st_ino if 0 < st.st_ino < 2**63 else None
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "inode": inode}
+
+
 def get_log_path(logdir=None) -> Path:
     if logdir is None:
         logdir = os.environ.get("OELEO_LOG_DIR", os.getcwd())
@@ -132,6 +356,8 @@ def dump_bookkeeper(bookkeeper, code=None, verbose=False, output_format="human")
             logging.info(f"code:           {record.code}")
             logging.info(f"processed_date: {record.processed_date}")
             logging.info(f"checksum:       {record.checksum}")
+            logging.info(f"size:           {record.size}")
+            logging.info(f"mtime_ns:       {record.mtime_ns}")
 
         logging.info(80 * "=")
     else:
@@ -0,0 +1,463 @@
+"""Watching the local directory for created and modified files.
+
+Used by `oeleo.schedulers.WatchScheduler`. `make_watcher` picks one of the
+WATCH_BACKENDS (env var OELEO_WATCH_BACKEND):
+    auto: inotify on Linux, else watchdog if it is installed, else polling (default).
+    inotify: the Linux inotify API, called through ctypes (no dependencies).
+    watchdog: the watchdog package (``pip install oeleo[watch]``), which uses the
+        native API of each platform (ReadDirectoryChangesW on Windows, FSEvents on
+        macOS, ...).
+    polling: a scan every POLL_INTERVAL seconds, compared with the previous one
+        (incremental, see `PollingWatcher`). A warning is logged when auto falls
+        back to it.
+
+A watcher only reports files (matching its extension), never directories. When it
+may have missed events (the inotify queue overflowed, a backend stopped), it sets
+`needs_rescan`, and the scheduler does a full scan.
+"""
+
+import ctypes
+import ctypes.util
+import functools
+import logging
+import os
+import queue
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Protocol, Set, Tuple, Union
+
+try:
+    import watchdog.events
+    import watchdog.observers
+except ImportError:
+    watchdog = None
+
+from oeleo.cache import DirectoryIndex, resolve_full_scan_interval
+from oeleo.filters import ScannedPath, name_matcher, scan_files
+
+log = logging.getLogger("oeleo")
+
+WATCH_BACKENDS = ("auto", "inotify", "watchdog", "polling")
+# seconds a file must be left alone before it is handed to the worker
+WATCH_DEBOUNCE = 5.0
+# seconds a file that keeps changing waits at most before it is handed over anyway
+WATCH_MAX_DELAY = 300.0
+# seconds between the scans of the polling watcher
+POLL_INTERVAL = 60.0
+
+# from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+INOTIFY_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len (name follows)
+
+
+def resolve_watch_backend(backend: Union[str, None] = None) -> str:
+    """Resolve the watch backend: explicit kwarg, else OELEO_WATCH_BACKEND, else
+    auto (the best one available here)."""
+    backend = (backend or os.environ.get("OELEO_WATCH_BACKEND") or "auto").lower()
+    if backend not in WATCH_BACKENDS:
+        raise ValueError(
+            f"Unknown watch backend {backend!r} (use one of {WATCH_BACKENDS})"
+        )
+    if backend == "watchdog" and watchdog is None:
+        raise ValueError("watch backend 'watchdog' needs the watchdog package")
+    if backend == "inotify" and not inotify_available():
+        raise ValueError("watch backend 'inotify' needs Linux")
+    if backend == "auto":
+        if inotify_available():
+            return "inotify"
+        if watchdog is not None:
+            return "watchdog"
+        log.warning(
+            "No file system events available here (pip install oeleo[watch] for "
+            f"watchdog) - polling the directory every {POLL_INTERVAL} s instead"
+        )
+        return "polling"
+    return backend
+
+
+def inotify_available() -> bool:
+    return sys.platform.startswith("linux") and _libc() is not None
+
+
+@functools.lru_cache(maxsize=None)
+def _libc():
+    """The C library if it has the inotify functions (None if not)."""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    except OSError:
+        return None
+    return libc if hasattr(libc, "inotify_init1") else None
+
+
+def make_watcher(
+    directory: Union[Path, str],
+    extension: Union[str, List[str], None] = None,
+    recursive: bool = False,
+    backend: Union[str, None] = None,
+) -> "Watcher":
+    """Create a watcher for the files in directory (see the module docstring)."""
+    backend = resolve_watch_backend(backend)
+    log.debug(f"Watching {directory} with the {backend} backend")
+    watcher = {
+        "inotify": InotifyWatcher,
+        "watchdog": WatchdogWatcher,
+        "polling": PollingWatcher,
+    }[backend]
+    return watcher(directory, extension=extension, recursive=recursive)
+
+
+def _snapshot(files: Iterable[ScannedPath]) -> Dict[Path, Tuple[int, int]]:
+    """(mtime_ns, size) of scanned files."""
+    return {
+        Path(p): (p.stat_result.st_mtime_ns, p.stat_result.st_size) for p in files
+    }
+
+
+class Watcher(Protocol):
+    directory: Path
+    needs_rescan: bool = False
+
+    def start(self) -> None:
+        ...
+
+    def poll(self, timeout: float) -> Set[Path]:
+        """Wait up to timeout seconds and return the files changed meanwhile."""
+        ...
+
+    def close(self) -> None:
+        ...
+
+
+class InotifyWatcher(Watcher):
+    """Watches directory (and its subdirectories) with inotify.
+
+    Directories created later get a watch of their own as soon as their creation
+    is reported; the files already in them by then are reported too.
+
+    A directory that cannot be watched (the limit of watches is reached, or no
+    permission) is polled instead: its files are compared with the previous scan
+    every `interval` seconds, and the watch is tried again each time.
+    """
+
+    def __init__(
+        self,
+        directory: Union[Path, str],
+        extension: Union[str, List[str], None] = None,
+        recursive: bool = False,
+        interval: float = POLL_INTERVAL,
+    ):
+        self.directory = Path(directory)
+        self.recursive = recursive
+        self.interval = interval
+        self.needs_rescan = False
+        self._extension = extension
+        self._match = name_matcher(extension)
+        self._libc = None
+        self._fd = None
+        self._watches: Dict[int, str] = {}  # watch descriptor -> directory
+        # directories polled instead of watched -> their files at the last poll
+        self._unwatched: Dict[str, Dict[Path, Tuple[int, int]]] = {}
+        self._next_poll = 0.0
+
+    def start(self) -> None:
+        self._libc = _libc()
+        if self._libc is None:
+            raise OSError("inotify is not available")
+        fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._fd = fd
+        self._watch_tree(os.fspath(self.directory))
+
+    def _watch_tree(self, directory: str) -> None:
+        """Watch directory (and its subdirectories if recursive)."""
+        pending = [directory]
+        while pending:
+            current = pending.pop()
+            if not self._watch(current):
+                log.warning(
+                    f"Could not watch {current}: {os.strerror(ctypes.get_errno())}"
+                    f" - polling it every {self.interval} s instead"
+                )
+                files = scan_files(current, self._extension)
+                self._unwatched[current] = _snapshot(files)
+            if not self.recursive:
+                break
+            try:
+                with os.scandir(current) as it:
+                    pending.extend(
+                        e.path for e in it if e.is_dir(follow_symlinks=False)
+                    )
+            except OSError as e:
+                log.debug(f"Could not scan {current}: {e}")
+
+    def _watch(self, directory: str) -> bool:
+        wd = self._libc.inotify_add_watch(
+            self._fd, os.fsencode(directory), INOTIFY_MASK
+        )
+        if wd < 0:
+            return False
+        self._watches[wd] = directory
+        return True
+
+    def poll(self, timeout: float) -> Set[Path]:
+        changed = set()
+        if self._unwatched:
+            timeout = max(min(timeout, self._next_poll - time.monotonic()), 0)
+        if select.select([self._fd], [], [], timeout)[0]:
+            while True:
+                try:
+                    data = os.read(self._fd, 65_536)
+                except BlockingIOError:
+                    break
+                changed.update(self._parse(data))
+        if self._unwatched and time.monotonic() >= self._next_poll:
+            changed.update(self._poll_unwatched())
+        return changed
+
+    def _poll_unwatched(self) -> Set[Path]:
+        """Compare the files of the unwatched directories with their last poll."""
+        self._next_poll = time.monotonic() + self.interval
+        changed = set()
+        for directory, previous in list(self._unwatched.items()):
+            if not os.path.isdir(directory):
+                del self._unwatched[directory]
+                continue
+            # watch first, so that no write falls between the scan and the watch
+            if self._watch(directory):
+                log.info(f"Watching {directory} now")
+                del self._unwatched[directory]
+            snapshot = _snapshot(scan_files(directory, self._extension))
+            changed.update(p for p, st in snapshot.items() if previous.get(p) != st)
+            if directory in self._unwatched:
+                self._unwatched[directory] = snapshot
+            if self.recursive:
+                changed.update(self._new_subdirs(directory))
+        return changed
+
+    def _new_subdirs(self, directory: str) -> Iterable[Path]:
+        """Watch the subdirectories that appeared in an unwatched directory."""
+        known = set(self._watches.values()) | set(self._unwatched)
+        try:
+            with os.scandir(directory) as it:
+                subdirs = [e.path for e in it if e.is_dir(follow_symlinks=False)]
+        except OSError as e:
+            log.debug(f"Could not scan {directory}: {e}")
+            return
+        for path in subdirs:
+            if path not in known:
+                self._watch_tree(path)
+                yield from scan_files(path, self._extension, recursive=True)
+
+    def _parse(self, data: bytes) -> Iterable[Path]:
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                log.debug("The inotify queue overflowed")
+                self.needs_rescan = True
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            directory = self._watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if self.recursive and mask & (IN_CREATE | IN_MOVED_TO):
+                    # files may have been written before the watch was added
+                    self._watch_tree(path)
+                    yield from scan_files(path, self._extension, recursive=True)
+            elif self._match(name):
+                yield Path(path)
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+            self._watches.clear()
+            self._unwatched.clear()
+
+
+class _QueueWatcher(Watcher):
+    """A watcher whose backend reports the changed files on another thread."""
+
+    def __init__(
+        self,
+        directory: Union[Path, str],
+        extension: Union[str, List[str], None] = None,
+        recursive: bool = False,
+    ):
+        self.directory = Path(directory)
+        self.recursive = recursive
+        self.needs_rescan = False
+        self._match = name_matcher(extension)
+        self._queue: "queue.Queue[Path]" = queue.Queue()
+
+    def _put(self, path: Union[str, bytes]) -> None:
+        path = Path(os.fsdecode(path))
+        if self._match(path.name):
+            self._queue.put(path)
+
+    def poll(self, timeout: float) -> Set[Path]:
+        changed = set()
+        try:
+            changed.add(self._queue.get(timeout=timeout))
+            while True:
+                changed.add(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return changed
+
+
+class WatchdogWatcher(_QueueWatcher):
+    """Watches directory with the observer of the watchdog package."""
+
+    _observer = None
+
+    def start(self) -> None:
+        if watchdog is None:
+            raise OSError("the watchdog package is not installed")
+        watcher = self
+
+        class Handler(watchdog.events.FileSystemEventHandler):
+            def on_created(self, event):
+                if not event.is_directory:
+                    watcher._put(event.src_path)
+
+            on_modified = on_created
+            on_closed = on_created
+
+            def on_moved(self, event):
+                if not event.is_directory:
+                    watcher._put(event.dest_path)
+
+        self._observer = watchdog.observers.Observer()
+        self._observer.schedule(
+            Handler(), os.fspath(self.directory), recursive=self.recursive
+        )
+        self._observer.start()
+
+    def poll(self, timeout: float) -> Set[Path]:
+        if self._observer is not None and not self._observer.is_alive():
+            log.debug("The watchdog observer has stopped - restarting it")
+            self.needs_rescan = True
+            self.start()
+        return super().poll(timeout)
+
+    def close(self) -> None:
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+
+
+class PollingWatcher(Watcher):
+    """Finds changed files by comparing scans taken every `interval` seconds.
+
+    The scans are incremental (`oeleo.cache.DirectoryIndex`, kept in memory): a
+    directory that has not changed since the previous scan, and has not been
+    written to within the last `full_scan_interval` seconds (default
+    OELEO_FULL_SCAN_INTERVAL), is not listed again, and its files keep their
+    entries from the previous scan. So writes to files in such directories are
+    only seen by the next full scan, at most `full_scan_interval` seconds later.
+    """
+
+    def __init__(
+        self,
+        directory: Union[Path, str],
+        extension: Union[str, List[str], None] = None,
+        recursive: bool = False,
+        interval: float = POLL_INTERVAL,
+        full_scan_interval: Optional[float] = None,
+    ):
+        self.directory = Path(directory)
+        self.recursive = recursive
+        self.interval = interval
+        self.needs_rescan = False
+        self._extension = extension
+        self._index = DirectoryIndex(resolve_full_scan_interval(full_scan_interval))
+        self._snapshot: Dict[Path, Tuple[int, int]] = {}
+        self._last_scan: Optional[float] = None
+
+    def _scan(self) -> Dict[Path, Tuple[int, int]]:
+        self._last_scan = time.monotonic()
+        snapshot = _snapshot(
+            scan_files(self.directory, self._extension, self.recursive, self._index)
+        )
+        skipped = self._index.skipped_dirs
+        snapshot.update(
+            (p, st) for p, st in self._snapshot.items() if str(p.parent) in skipped
+        )
+        return snapshot
+
+    def start(self) -> None:
+        self._snapshot = self._scan()
+
+    def poll(self, timeout: float) -> Set[Path]:
+        remaining = self._last_scan + self.interval - time.monotonic()
+        if remaining > timeout:
+            time.sleep(timeout)
+            return set()
+        time.sleep(max(remaining, 0))
+        snapshot = self._scan()
+        changed = {p for p, st in snapshot.items() if self._snapshot.get(p) != st}
+        self._snapshot = snapshot
+        return changed
+
+    def close(self) -> None:
+        self._snapshot = {}
+
+
+class Debouncer:
+    """Collects changed files until they are ready to be handed to the worker.
+
+    A file is ready once it has had no events for `quiet` seconds, or once it has
+    been waiting for `max_delay` seconds (files that are written to all the time,
+    like the data file of a running experiment). Events for a file that is already
+    waiting are merged into its entry.
+    """
+
+    def __init__(
+        self, quiet: float = WATCH_DEBOUNCE, max_delay: float = WATCH_MAX_DELAY
+    ):
+        self.quiet = quiet
+        self.max_delay = max_delay
+        self._pending: Dict[Path, List[float]] = {}  # path -> [first, last] event
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, paths: Iterable[Path], now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        for path in paths:
+            times = self._pending.setdefault(path, [now, now])
+            times[1] = now
+
+    def pop_ready(self, now: Optional[float] = None) -> List[Path]:
+        now = time.monotonic() if now is None else now
+        ready = [
+            path
+            for path, (first, last) in self._pending.items()
+            if now - last >= self.quiet or now - first >= self.max_delay
+        ]
+        for path in ready:
+            del self._pending[path]
+        return sorted(ready)
+
+    def clear(self) -> None:
+        self._pending.clear()
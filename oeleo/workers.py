@@ -1,40 +1,136 @@
 from collections import deque
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ThreadPoolExecutor,
+    as_completed,
+    wait,
+)
 import logging
 import os
 import sys
+import threading
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Callable, Iterable, List, Protocol, TypeVar, Union
+from typing import (
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Protocol,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
+from oeleo.cache import make_checksum_cache, make_directory_index
 from oeleo.checkers import ChecksumChecker
 from oeleo.connectors import (
     Connector,
     LocalConnector,
     OeleoConnectionError,
     OeleoTransferError,
+    RemoteEntry,
+    RemoteIndex,
     SSHConnector,
     SharePointConnector,
 )
 from oeleo.console import console
-from oeleo.models import DbHandler, MockDbHandler, SimpleDbHandler
+from oeleo.models import (
+    LEGACY_HASH_ALGO,
+    STAT_FIELDS,
+    DbHandler,
+    MockDbHandler,
+    SimpleDbHandler,
+)
 from oeleo.reporters import Reporter, ReporterBase
-from oeleo.utils import to_bool
+from oeleo.utils import ConnectionGuard, to_bool
 
 T = TypeVar("T")
+R = TypeVar("R")
 
 log = logging.getLogger("oeleo")
 
+CHUNK_SIZE = 20
+CHECK_CHUNK_SIZE = 500
+# limits for one batch of small files (see Worker.batch_file_size)
+BATCH_MAX_FILES = 500
+BATCH_MAX_BYTES = 64 * 1_048_576
+# keys of the checks that do not describe the content of a file
+UNCOMPARED_FIELDS = STAT_FIELDS + ("verified_date",)
+
+
+def _resolve_bool(
+    value: Union[bool, None], env_var: str, default: bool = False
+) -> bool:
+    if value is not None:
+        return value
+    raw = os.environ.get(env_var)
+    if raw is None or raw == "":
+        return default
+    return to_bool(raw)
+
+
+def _resolve_workers(value: Union[int, None], env_var: str, name: str) -> int:
+    if value is None:
+        raw = os.environ.get(env_var)
+        if raw is None or raw == "":
+            return 1
+        try:
+            value = int(raw)
+        except ValueError as e:
+            raise ValueError(f"{env_var} must be an integer, got {raw!r}") from e
+    value = int(value)
+    if value < 1:
+        raise ValueError(f"{name} must be at least 1")
+    return value
+
 
 def resolve_reconnect(reconnect: Union[bool, None] = None) -> bool:
     """Resolve per-file reconnect: explicit kwarg, else OELEO_RECONNECT, else False."""
-    if reconnect is not None:
-        return reconnect
-    raw = os.environ.get("OELEO_RECONNECT")
-    if raw is None or raw == "":
-        return False
-    return to_bool(raw)
+    return _resolve_bool(reconnect, "OELEO_RECONNECT")
+
+
+def resolve_hash_while_copy(hash_while_copy: Union[bool, None] = None) -> bool:
+    """Resolve hash-while-copy: explicit kwarg, else OELEO_HASH_WHILE_COPY, else
+    False."""
+    return _resolve_bool(hash_while_copy, "OELEO_HASH_WHILE_COPY")
+
+
+def resolve_append_transfer(append_transfer: Union[bool, None] = None) -> bool:
+    """Resolve append-aware transfers: explicit kwarg, else OELEO_APPEND_TRANSFER,
+    else False."""
+    return _resolve_bool(append_transfer, "OELEO_APPEND_TRANSFER")
+
+
+def resolve_max_workers(max_workers: Union[int, None] = None) -> int:
+    """Resolve transfer parallelism: explicit kwarg, else OELEO_MAX_WORKERS, else 1."""
+    return _resolve_workers(max_workers, "OELEO_MAX_WORKERS", "max_workers")
+
+
+def resolve_hash_workers(hash_workers: Union[int, None] = None) -> int:
+    """Resolve hashing parallelism: explicit kwarg, else OELEO_HASH_WORKERS, else 1."""
+    return _resolve_workers(hash_workers, "OELEO_HASH_WORKERS", "hash_workers")
+
+
+def resolve_batch_file_size(batch_file_size: Union[int, None] = None) -> int:
+    """Resolve the batch threshold: explicit kwarg, else OELEO_BATCH_FILE_SIZE, else 0
+    (batching off)."""
+    if batch_file_size is None:
+        raw = os.environ.get("OELEO_BATCH_FILE_SIZE")
+        if raw is None or raw == "":
+            return 0
+        try:
+            batch_file_size = int(raw)
+        except ValueError as e:
+            raise ValueError(
+                f"OELEO_BATCH_FILE_SIZE must be an integer, got {raw!r}"
+            ) from e
+    batch_file_size = int(batch_file_size)
+    if batch_file_size < 0:
+        raise ValueError("batch_file_size must be 0 or more")
+    return batch_file_size
 
 
 def chunkify(file_list: Iterable[T], n: int = 10) -> Iterable[List[T]]:
@@ -54,6 +150,60 @@ def chunkify(file_list: Iterable[T], n: int = 10) -> Iterable[List[T]]:
         yield list(buffer)
 
 
+def map_completed(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    max_workers: int,
+    max_in_flight: int = None,
+    thread_name_prefix: str = "oeleo-hash",
+) -> Iterator[Tuple[T, R]]:
+    """Yield (item, func(item)) in the order the calls finish, using a thread pool.
+
+    At most max_in_flight calls (default 2 * max_workers) are queued or running at a
+    time; items are pulled from the iterable only as results are consumed. An
+    exception raised by func is re-raised when its result is reached, and the calls
+    that have not started yet are cancelled.
+    """
+    max_in_flight = max_in_flight or 2 * max_workers
+    items = iter(items)
+    in_flight = {}
+    executor = ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix=thread_name_prefix
+    )
+    try:
+        while True:
+            for item in items:
+                in_flight[executor.submit(func, item)] = item
+                if len(in_flight) >= max_in_flight:
+                    break
+            if not in_flight:
+                return
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield in_flight.pop(future), future.result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+@dataclass
+class FileContext:
+    """Per-file state for one pass through ``Worker.run``.
+
+    Each file carries its own external name, db record and outcome so that several
+    files can be in flight at the same time without sharing worker attributes.
+    """
+
+    path: Path
+    external_name: Union[Path, str] = None
+    record: Any = None
+    checks: dict = field(default_factory=dict)
+    checked: bool = False
+    hash_sink: Any = None
+    changed: bool = False
+    moved: bool = False
+    failed: bool = False
+
+
 class WorkerBase(Protocol):
     checker: Any
     bookkeeper: DbHandler
@@ -140,7 +290,59 @@ class Worker(WorkerBase):
         reconnect: Bool — when True, reconnect the external connector before each
             changed file (opt-in for flaky networks). Default False. A failed move
             always reconnects once and retries regardless of this flag.
+        max_workers: int — number of files checked and transferred concurrently by
+            `run`. Default 1 (serial). Database writes always happen on the calling
+            thread. A reconnect of the external connector waits until the transfers
+            running in the other threads have finished (see
+            `oeleo.utils.ConnectionGuard`).
+        hash_while_copy: Bool — when True (and the checker is not in 'full' mode), a file
+            whose stat fingerprint changed is transferred without hashing it first;
+            its checksum is computed from the bytes read for the transfer. This halves
+            the reads of changed files, at the cost of also transferring files that
+            were only touched. Default False.
+        hash_workers: int — number of local files hashed concurrently by `check`, and
+            by `run` when max_workers is 1 (files are then hashed ahead of the serial
+            transfers). Default 1. Keep it below the number of cores so that the
+            acquisition software still gets CPU time.
+        append_transfer: Bool — when True, a changed file that has only grown since
+            it was last copied gets its new bytes appended to the external copy
+            (see `Connector.append_func`) instead of being copied again. The
+            prefixes of both copies are verified first; a full copy is made if they
+            differ. Default False.
+        batch_file_size: int — when above 0 (and max_workers is 1), changed files
+            smaller than this many bytes are sent together with
+            `Connector.move_many` (up to BATCH_MAX_FILES files or BATCH_MAX_BYTES per
+            batch) and committed to the db once the connector has verified them.
+            Default 0 (off).
+        checksum_cache: ChecksumCache shared with the checker. The worker loads it
+            when connecting to the db and writes it back between chunks.
+        directory_index: DirectoryIndex shared with the local connector for
+            incremental scans (see `oeleo.cache.DirectoryIndex`). The worker loads it
+            when connecting to the db and writes it back after each `filter_local`.
+            A file that starts changing again after more than full_scan_interval
+            seconds without changes, in a directory that did not change either, is
+            only found by the next full scan, up to full_scan_interval later. The
+            directories of files that failed in `run` are listed again by every
+            scan until they have been transferred, and `check` always lists
+            everything.
         external_name_generator: Callable that accepts the class instance and a string
+
+    The worker factories (`simple_worker`, `ssh_worker` and `sharepoint_worker`)
+    take the options below as keyword arguments (worker_kwargs). Each one left as
+    None is read from its env var, and else has the default given above:
+        reconnect: OELEO_RECONNECT
+        max_workers: OELEO_MAX_WORKERS
+        hash_while_copy: OELEO_HASH_WHILE_COPY
+        hash_workers: OELEO_HASH_WORKERS
+        append_transfer: OELEO_APPEND_TRANSFER
+        batch_file_size: OELEO_BATCH_FILE_SIZE
+        checksum_cache_size: OELEO_CHECKSUM_CACHE_SIZE — number of checksums kept
+            in the checksum_cache. Default 100 000; 0 turns the cache off.
+        incremental_scan: OELEO_INCREMENTAL_SCAN — give the local connector a
+            directory_index. Default False.
+        full_scan_interval: OELEO_FULL_SCAN_INTERVAL — seconds between the full
+            scans of the directory_index, and so the longest a change to a file can
+            go unseen. Default 86 400.
     """
 
     checker: Any
@@ -152,16 +354,37 @@ class Worker(WorkerBase):
     reporter: ReporterBase = field(default_factory=Reporter)
     external_name_generator: Callable[[Any, Path], Path] = field(default=None)
     reconnect: bool = False
+    max_workers: int = 1
+    hash_while_copy: bool = False
+    hash_workers: int = 1
+    append_transfer: bool = False
+    batch_file_size: int = 0
+    checksum_cache: Any = None
+    directory_index: Any = None
     file_names: Iterable[Path] = field(init=False, default_factory=list)
     subdirs: bool = False
     external_subdirs: bool = False
     _external_name: Union[Path, str] = field(init=False, default="")
     _status: dict = field(init=False, default_factory=dict)
+    _partial_listing: bool = field(init=False, default=False)
+    _reporter_lock: Any = field(init=False, default_factory=threading.RLock, repr=False)
+    _connection_guard: Any = field(
+        init=False, default_factory=ConnectionGuard, repr=False
+    )
 
     def __post_init__(self):
+        if self.max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+        if self.hash_workers < 1:
+            raise ValueError("hash_workers must be at least 1")
+        if self.batch_file_size < 0:
+            raise ValueError("batch_file_size must be 0 or more")
         if self.dry_run:
             log.debug("DRY RUN")
             self.bookkeeper = MockDbHandler()
+            # nothing is written to the db, so the caches stay in memory
+            self.checksum_cache = None
+            self.directory_index = None
         self.external_connector.connect()
         self.reporter.notify("oeleo started", title="info")
         self.number_of_local_files = 0
@@ -176,6 +399,10 @@ class Worker(WorkerBase):
     def connect_to_db(self):
         self.status = ("state", "connect-to-db")
         self.bookkeeper.initialize_db()
+        if self.checksum_cache is not None:
+            self.checksum_cache.load()
+        if self.directory_index is not None:
+            self.directory_index.load()
         log.debug(f"Connecting to db -> '{self.bookkeeper.db_name}' DONE")
 
     def add_local(self, local_files: Iterable) -> List:
@@ -189,17 +416,27 @@ class Worker(WorkerBase):
             local_files = list(local_files)
         self.status = ("state", "filter-local")
         self.status = ("filtered_once", False)
+        self._partial_listing = False
         self.file_names = local_files
         log.debug(f"Adding {len(local_files)} files to the worker")
         return local_files
 
-    def filter_local(self, **kwargs):
-        """Selects the files that should be processed through filtering."""
+    def filter_local(self, full_scan: bool = False, **kwargs):
+        """Selects the files that should be processed through filtering.
+
+        With a directory_index, the listing is incremental unless full_scan is True.
+        """
         self.status = ("state", "filter-local")
         self.status = ("filtered_once", True)
+        if full_scan:
+            kwargs["full_scan"] = True
         local_files = list(
             self.local_connector.base_filter_sub_method(self.extension, **kwargs)
         )
+        if self.directory_index is not None:
+            self._partial_listing = not self.directory_index.full
+            self.directory_index.flush()
+            log.debug(f"directory index: {self.directory_index.stats}")
 
         self.file_names = local_files
         log.debug("Filtering files to the worker")
@@ -216,6 +453,13 @@ class Worker(WorkerBase):
         log.debug("Filtering external files to the worker")
         return external_files
 
+    def filter_external_entries(self, **kwargs) -> List[RemoteEntry]:
+        """Like `filter_external`, but with the size and mtime of each file."""
+        self.status = ("state", "filter-external")
+        entries = self.external_connector.list_entries(self.extension, **kwargs)
+        log.debug("Filtering external files (with metadata) to the worker")
+        return entries
+
     def _check_local(self, f: Path, sleep_time=1, max_check_counter=300):
         check_counter = 0
         while True:
@@ -236,6 +480,23 @@ class Worker(WorkerBase):
                     raise e
         return local_vals
 
+    def _until_stopped(self, files: Iterable[Path]) -> Iterator[Path]:
+        for f in files:
+            self.die_if_necessary()
+            yield f
+
+    def _checked_local_files(self, files: Iterable[Path]) -> Iterator[Tuple[Path, Any]]:
+        """Yield (f, local checks), hashing up to hash_workers files at a time.
+
+        With hash_workers > 1 the files come out in the order their hashing finished.
+        """
+        files = self._until_stopped(files)
+        if self.hash_workers <= 1:
+            for f in files:
+                yield f, self._check_local(f)
+            return
+        yield from map_completed(self._check_local, files, self.hash_workers)
+
     def check(self, update_db=False, force=True, **kwargs):
         """Check for differences between the two directories.
 
@@ -256,14 +517,19 @@ class Worker(WorkerBase):
         with self.reporter.progress() as progress:
             self.die_if_necessary()
             task = progress.add_task("Getting local files...", total=None)
-            local_files = self.file_names or self.filter_local(**kwargs)
+            local_files = self.file_names
+            if not local_files or self._partial_listing:
+                # an incremental listing leaves out the unchanged directories
+                local_files = self.filter_local(full_scan=True, **kwargs)
 
             progress.remove_task(task)
 
-            # cannot be a generator since we need to do a `if in` lookup:
+            # indexed on the relative path since we need to do a `if in` lookup:
             task = progress.add_task("Getting external files...", total=None)
             try:
-                external_files = list(self.filter_external(**kwargs))
+                external_files = RemoteIndex(self.external_connector.directory)
+                for entry in self.filter_external_entries(**kwargs):
+                    external_files.add(entry.path, entry)
             except OeleoConnectionError as e:
                 msg = f"Failed to list external files; aborting check ({e})"
                 self.reporter.report(msg)
@@ -275,58 +541,10 @@ class Worker(WorkerBase):
             self._reset_check_counter()
 
             task = progress.add_task("Checking...", total=None)
-            for f in local_files:
-                self.die_if_necessary()
-                self.number_of_local_files += 1
-                self.make_external_name(f)
-                local_vals = self._check_local(f)
-                if local_vals is None:
-                    continue
-
-                if self.external_name in external_files:
-                    log.info(f"{f.name} -> {self.external_name}")
-                    code = 1
-                    exists = True
-                    self.number_of_external_duplicates += 1
-                    try:
-                        external_vals = self.checker.check(
-                            self.external_name,
-                            connector=self.external_connector,
-                        )
-                    except OeleoTransferError as e:
-                        msg = (
-                            f"Checksum failed for {self.external_name}; "
-                            f"treating as out of sync ({e})"
-                        )
-                        self.reporter.report(msg)
-                        self.reporter.notify(msg, title="error")
-                        self.number_of_duplicates_out_of_sync += 1
-                        continue
-                    same = True
-                    for k in local_vals:
-                        if local_vals[k] != external_vals[k]:
-                            same = False
-                            self.number_of_duplicates_out_of_sync += 1
-                            code = 0
-                            break
-
-                    log.debug(f"in sync: {same}")
-
-                else:
-                    self.number_of_duplicates_out_of_sync += 1
-                    logging.debug(f"{f.name} -> {self.external_name}")
-                    exists = False
-                    code = 0
-
-                if update_db:
-                    log.debug("updating db")
-                    self.bookkeeper.register(f)
-                    if self.bookkeeper.code < 2:
-                        if not force and not exists:
-                            code = self.bookkeeper.code
-                        self.bookkeeper.update_record(
-                            self.external_name, code=code, **local_vals
-                        )
+            checked_files = self._checked_local_files(local_files)
+            for chunk in chunkify(checked_files, n=CHECK_CHUNK_SIZE):
+                self._check_chunk(chunk, external_files, update_db, force)
+                self._flush_checksum_cache()
             progress.remove_task(task)
 
         self.reporter.report("REPORT (CHECK):")
@@ -339,8 +557,108 @@ class Worker(WorkerBase):
         self.reporter.report(
             f"-Files out of sync:              {self.number_of_duplicates_out_of_sync}"
         )
+        if self.checksum_cache is not None:
+            stats = self.checksum_cache.stats
+            self.reporter.report(
+                f"-Checksum cache hits/misses:     {stats['hits']}/{stats['misses']}"
+            )
         log.debug("<CHECK FINISHED>")
 
+    def _check_chunk(self, chunk, external_files, update_db, force):
+        """Compare a chunk of (local file, local checks) with their external copies.
+
+        The checksums of all external copies in the chunk are requested in one go
+        (see `Checker.check_many`), so a remote connector can batch them.
+        """
+        pending = []
+        for f, local_vals in chunk:
+            self.number_of_local_files += 1
+            self.make_external_name(f)
+            external_name = self.external_name
+            if local_vals is None:
+                continue
+            entry = external_files.get(external_name)
+            pending.append((f, external_name, local_vals, entry))
+
+        # the size from the listing settles some files without a remote checksum
+        existing = [
+            name
+            for _, name, local_vals, entry in pending
+            if entry is not None and not self._size_differs(local_vals, entry)
+        ]
+        external_checks = {}
+        if existing:
+            quick_hashes = {
+                name: local_vals.get("quick_hash")
+                for _, name, local_vals, _ in pending
+            }
+            try:
+                external_checks = self.checker.check_many(
+                    existing,
+                    connector=self.external_connector,
+                    quick_hashes=quick_hashes,
+                )
+            except OeleoTransferError as e:
+                msg = (
+                    f"Checksum failed for {len(existing)} external files; "
+                    f"treating them as out of sync ({e})"
+                )
+                self.reporter.report(msg)
+                self.reporter.notify(msg, title="error")
+
+        for f, external_name, local_vals, entry in pending:
+            exists = entry is not None
+            if exists:
+                log.info(f"{f.name} -> {external_name}")
+                code = 1
+                self.number_of_external_duplicates += 1
+                if self._size_differs(local_vals, entry):
+                    same = False
+                else:
+                    external_vals = external_checks.get(external_name)
+                    if external_vals is None:
+                        self.reporter.report(
+                            f"Checksum failed for {external_name}; "
+                            f"treating as out of sync"
+                        )
+                        self.number_of_duplicates_out_of_sync += 1
+                        continue
+                    # compare what the checker found for the external copy (the
+                    # checksum, or only the quick hash); stat values differ anyway
+                    same = all(
+                        local_vals.get(k) == v
+                        for k, v in external_vals.items()
+                        if k not in UNCOMPARED_FIELDS
+                    )
+                if not same:
+                    self.number_of_duplicates_out_of_sync += 1
+                    code = 0
+
+                log.debug(f"in sync: {same}")
+
+            else:
+                self.number_of_duplicates_out_of_sync += 1
+                logging.debug(f"{f.name} -> {external_name}")
+                code = 0
+
+            if update_db:
+                log.debug("updating db")
+                self.bookkeeper.register(f)
+                if self.bookkeeper.code < 2:
+                    if not force and not exists:
+                        code = self.bookkeeper.code
+                    self.bookkeeper.update_record(
+                        external_name, code=code, **local_vals
+                    )
+
+    @staticmethod
+    def _size_differs(local_vals: dict, entry: Any) -> bool:
+        """True if the listing already shows that the external copy is different."""
+        if not isinstance(entry, RemoteEntry) or entry.size is None:
+            return False
+        size = local_vals.get("size")
+        return size is not None and size != entry.size
+
     def _ensure_external_connection(self):
         """Probe the destination; report and re-raise if unreachable."""
         try:
@@ -359,11 +677,14 @@ class Worker(WorkerBase):
             The method only iterates over the files that are registered in the
             self.file_names attribute. This attribute is typically set by the filter_local
             method.
-        """
-        use_threads = (
-            False  # To be implemented - but need to fix log rotation etc. first
-        )
 
+            The bookkeeper keeps all records in memory during the run and writes the
+            changes once per chunk.
+
+            With max_workers > 1, one thread pool is used for the whole run. The pool
+            threads only calculate checksums and move files; registering and updating
+            records in the db is done on the calling thread, one file at a time.
+        """
         log.debug("<RUN>")
         self.die_if_necessary()
         self._ensure_external_connection()
@@ -371,103 +692,416 @@ class Worker(WorkerBase):
         self.status = ("local_exists", False)
 
         failed_files = []
-
-        for chunk in chunkify(self.file_names, n=20):
-            self.die_if_necessary()
-            if use_threads:
-                failed = self._process_chunk(chunk)
+        index = self.directory_index
+        # until the run has handled them, the directories of its files are listed
+        # by every (incremental) scan
+        run_dirs = set()
+        if index is not None:
+            run_dirs = {str(Path(f).parent) for f in self.file_names}
+            index.pending |= run_dirs
+
+        self.bookkeeper.load_index()
+        try:
+            if self.max_workers > 1:
+                chunk_size = max(CHUNK_SIZE, 2 * self.max_workers)
+                with ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="oeleo-run"
+                ) as executor:
+                    for chunk in chunkify(self.file_names, n=chunk_size):
+                        self.die_if_necessary()
+                        failed = self._process_chunk(chunk, executor)
+                        failed_files.extend(failed)
+                        self.bookkeeper.flush()
+                        self._flush_checksum_cache()
             else:
-                failed = self._process_single_chunk(chunk)
-            failed_files.extend(failed)
+                chunk_size = BATCH_MAX_FILES if self.batch_file_size else CHUNK_SIZE
+                for chunk in chunkify(self.file_names, n=chunk_size):
+                    self.die_if_necessary()
+                    failed = self._process_single_chunk(chunk)
+                    failed_files.extend(failed)
+                    self.bookkeeper.flush()
+                    self._flush_checksum_cache()
+        finally:
+            self.bookkeeper.unload_index()
+        if index is not None:
+            # the files that failed are tried again after the next scan
+            index.pending -= run_dirs
+            index.pending.update(str(Path(f).parent) for f in failed_files)
 
         if not self.status["local_exists"]:
             self.reporter.report(
                 "No files to handle. Did you forget to run `worker.filter_local()`?"
             )
 
+        if self.checksum_cache is not None:
+            log.debug(f"checksum cache: {self.checksum_cache.stats}")
+        transfer_stats = self.external_connector.pop_transfer_stats()
+        if transfer_stats is not None and transfer_stats.files:
+            self.reporter.report(f"Sent {transfer_stats}")
         log.debug("<RUN FINISHED>")
         self.status = ("state", "finished")
 
-    def _process_chunk(self, chunk):
+    def _flush_checksum_cache(self):
+        if self.checksum_cache is not None:
+            self.checksum_cache.flush()
+
+    def _ensure_external_dirs(self, contexts: List[FileContext]):
+        """Let the external connector create the directories of new files in one go.
+
+        Only the files without a copy yet (code 0) are sure to be transferred;
+        move_func makes the directory of any other file that turns out to need it.
+        """
+        dirs = {
+            ctx.external_name.parent
+            for ctx in contexts
+            if getattr(ctx.record, "code", None) == 0
+        }
+        if not dirs:
+            return
+        try:
+            self.external_connector.ensure_dirs(dirs)
+        except Exception as e:
+            # not fatal - move_func makes sure the directory exists for each file
+            log.debug(f"Could not prepare external directories: {e}")
+
+    def _process_chunk(self, chunk, executor):
         failed_files = []
-        futures = []
-        with ThreadPoolExecutor(max_workers=20) as executor:
-            for f in chunk:
-                self.status = ("local_exists", True)
-                futures.append(executor.submit(self._process_file, f))
+        futures = {}
+        for ctx in self._prepare_files(chunk, failed_files):
+            futures[executor.submit(self._transfer_file, ctx)] = ctx
+
+        try:
             for future in as_completed(futures):
+                ctx = futures[future]
                 try:
-                    failed_file = future.result()
-                    if failed_file:
-                        failed_files.append(failed_file)
+                    future.result()
+                    self._commit_file(ctx)
                 except OeleoConnectionError:
                     raise
                 except Exception as e:
                     log.error(f"Error when processing file: {e}")
+                    ctx.failed = True
+                if ctx.failed:
+                    failed_files.append(ctx.path)
+        except OeleoConnectionError:
+            for future in futures:
+                future.cancel()
+            raise
         return failed_files
 
     def _process_single_chunk(self, chunk):
+        if self.batch_file_size:
+            return self._process_batched_chunk(chunk)
+        if self.hash_workers > 1:
+            return self._process_prehashed_chunk(chunk)
+        failed_files = []
+        for ctx in self._prepare_files(chunk, failed_files):
+            self._transfer_and_commit(ctx, failed_files)
+        return failed_files
+
+    def _process_prehashed_chunk(self, chunk):
+        """Hash the files of a chunk in a thread pool and transfer them one by one.
+
+        Each file is transferred as soon as its hashing has finished, while the
+        remaining files are still being hashed.
+        """
         failed_files = []
+        contexts = self._prepare_files(chunk, failed_files)
+        for ctx, _ in map_completed(self._check_file, contexts, self.hash_workers):
+            self._transfer_and_commit(ctx, failed_files)
+        return failed_files
+
+    def _process_batched_chunk(self, chunk):
+        """Check the files of a chunk and send the small changed ones in batches.
+
+        The changed files below batch_file_size are handed to
+        `Connector.move_many` together once the whole chunk is checked, and are only
+        committed to the db after the connector has verified the batch. A file that
+        was not verified is sent again on its own, like all the other files.
+        """
+        failed_files = []
+        contexts = self._prepare_files(chunk, failed_files)
+        if self.hash_workers > 1:
+            checked = map_completed(self._check_file, contexts, self.hash_workers)
+        else:
+            checked = ((self._check_file(ctx), None) for ctx in contexts)
+
+        batch = []
+        for ctx, _ in checked:
+            if self._batchable(ctx):
+                batch.append(ctx)
+            else:
+                self._transfer_and_commit(ctx, failed_files)
+
+        for group in self._batch_groups(batch):
+            self._transfer_batch(group, failed_files)
+        return failed_files
+
+    def _prepare_files(self, chunk, failed_files) -> List[FileContext]:
+        """Register the files of a chunk and create the directories of the new ones."""
+        contexts = []
         for f in chunk:
             self.status = ("local_exists", True)
             try:
-                failed_file = self._process_file(f)
-                if failed_file:
-                    failed_files.append(failed_file)
+                contexts.append(self._prepare_file(f))
             except OeleoConnectionError:
                 raise
             except Exception as e:
                 log.error(f"Error when processing file: {e}")
                 failed_files.append(f)
-        return failed_files
+        self._ensure_external_dirs(contexts)
+        return contexts
+
+    def _transfer_and_commit(self, ctx: FileContext, failed_files, sent=False):
+        """Transfer a checked file (unless it was sent in a batch) and commit it."""
+        try:
+            if sent:
+                transfer_sink = ctx.hash_sink if self._deferred(ctx) else None
+                self._finish_transfer(ctx, True, transfer_sink)
+            else:
+                self._transfer_file(ctx)
+            self._commit_file(ctx)
+        except OeleoConnectionError:
+            raise
+        except Exception as e:
+            log.error(f"Error when processing file: {e}")
+            ctx.failed = True
+        if ctx.failed:
+            failed_files.append(ctx.path)
+
+    def _batchable(self, ctx: FileContext) -> bool:
+        size = ctx.checks.get("size")
+        if ctx.failed or size is None or size >= self.batch_file_size:
+            return False
+        return self._needs_transfer(ctx)
+
+    @staticmethod
+    def _batch_groups(batch: List[FileContext]) -> Iterator[List[FileContext]]:
+        group, group_size = [], 0
+        for ctx in batch:
+            size = ctx.checks["size"]
+            if group and group_size + size > BATCH_MAX_BYTES:
+                yield group
+                group, group_size = [], 0
+            group.append(ctx)
+            group_size += size
+        if group:
+            yield group
+
+    def _transfer_batch(self, batch: List[FileContext], failed_files):
+        """Send a batch of changed files with move_many and commit the verified ones."""
+        if self.reconnect:
+            self._reconnect_external()
+        items = []
+        for ctx in batch:
+            ctx.changed = True
+            sink = ctx.hash_sink if self._deferred(ctx) else None
+            items.append((ctx.path, ctx.external_name, sink))
+        try:
+            sent = self.external_connector.move_many(items)
+        except OeleoConnectionError:
+            raise
+        except Exception as e:
+            log.error(f"Error when sending a batch of {len(batch)} files: {e}")
+            sent = [False] * len(batch)
+        log.debug(f"batch: {sum(sent)} of {len(batch)} files sent and verified")
+        for ctx, ok in zip(batch, sent):
+            if not ok:
+                log.debug(f"{ctx.path.name} was not verified - sending it on its own")
+            self._transfer_and_commit(ctx, failed_files, sent=ok)
 
     def _process_file(self, f):
         """Process a single file."""
+        ctx = self._prepare_file(f)
+        self._transfer_file(ctx)
+        self._commit_file(ctx)
+        if ctx.failed:
+            return f
+
+    def _prepare_file(self, f) -> FileContext:
+        """Create the context for a file and register it in the db (calling thread)."""
         del self.status
         self.die_if_necessary()
-        self.make_external_name(f)
-        self.bookkeeper.register(f)
+        ctx = FileContext(path=f, external_name=self._external_name_for(f))
+        self.status = ("name", f.name)
+        self.status = ("external_name", str(ctx.external_name))
+        ctx.record = self.bookkeeper.register(f)
+        return ctx
+
+    def _check_file(self, ctx: FileContext) -> FileContext:
+        """Run the checker on the file (safe to run in a pool thread)."""
+        f = ctx.path
+        ctx.checked = True
+        ctx.hash_sink = self.checker.hash_sink() if self.hash_while_copy else None
         try:
-            checks = self.checker.check(f)
+            if ctx.hash_sink is None:
+                ctx.checks = self.checker.check(f, record=ctx.record)
+            else:
+                ctx.checks = self.checker.check(f, record=ctx.record, defer=True)
         except OeleoTransferError as e:
             msg = f"Checksum failed for {f}: {e}"
             log.error(msg)
-            self.reporter.notify(msg, title="error")
-            return f
+            self._notify(msg, title="error")
+            ctx.failed = True
         except Exception as e:
             log.error(f"Error when checking {f}: {e}")
-            return f
+            ctx.failed = True
+        return ctx
 
-        if not self.bookkeeper.is_changed(**checks):
-            log.debug(f"{f.name} == {self.external_name}")
-            self.reporter.report(".", same_line=True)
-            return
+    def _transfer_file(self, ctx: FileContext) -> FileContext:
+        """Check the file and move it if it has changed (safe to run in a pool thread).
 
-        log.debug(f"{f.name} -> {self.external_name}")
+        Only the context is mutated here; the db is not written to.
+        """
+        f = ctx.path
+        if not ctx.checked:
+            self._check_file(ctx)
+        if ctx.failed:
+            return ctx
+        sink = ctx.hash_sink
+        deferred = self._deferred(ctx)
+        if not self._needs_transfer(ctx):
+            log.debug(f"{f.name} == {ctx.external_name}")
+            self._report(".", same_line=True)
+            return ctx
+
+        log.debug(f"{f.name} -> {ctx.external_name}")
+        ctx.changed = True
+        move_kwargs = {"hash_sink": sink} if deferred else {}
+
+        transfer_sink = sink if deferred else None
+        success = False
+        with self._connection_guard.use():
+            if self.append_transfer:
+                append_sink = transfer_sink or self.checker.hash_sink()
+                success = self._append_file(ctx, append_sink)
+                if success:
+                    transfer_sink = append_sink
+
+            if not success:
+                if self.reconnect:
+                    self._reconnect_external()
+                success = self.external_connector.move_func(
+                    f, ctx.external_name, **move_kwargs
+                )
 
-        self.status = ("changed", True)
+            if not success:
+                log.debug("failed - so trying one more time after reconnecting...")
+                self._reconnect_external()
+                success = self.external_connector.move_func(
+                    f, ctx.external_name, **move_kwargs
+                )
 
-        if self.reconnect:
-            self.external_connector.reconnect()
-        success = self.external_connector.move_func(f, self.external_name)
+        return self._finish_transfer(ctx, success, transfer_sink)
 
-        if not success:
-            log.debug("failed - so trying one more time after reconnecting...")
-            self.external_connector.reconnect()
-            success = self.external_connector.move_func(f, self.external_name)
+    def _finish_transfer(
+        self, ctx: FileContext, success: bool, transfer_sink
+    ) -> FileContext:
+        """Take the checksum of a deferred file and mark the context as moved."""
+        f = ctx.path
+        sink = ctx.hash_sink
+        if success and self._deferred(ctx):
+            try:
+                ctx.checks["checksum"] = self._streamed_checksum(ctx, sink)
+                if sink.size == ctx.checks.get("size"):
+                    self.checker.remember(f, ctx.checks)
+            except Exception as e:
+                log.error(f"Error when checking {f} after copying it: {e}")
+                success = False
 
         if success:
+            ctx.moved = True
+            self._note_transferred(ctx, transfer_sink)
+            self._report("o", same_line=True)
+            log.debug(f"{f.name} -> {ctx.external_name} copied")
+            return ctx
+
+        ctx.failed = True
+        self._report("!", same_line=True)
+        log.debug(f"{f.name} -> {ctx.external_name} FAILED COPY!")
+        return ctx
+
+    @staticmethod
+    def _deferred(ctx: FileContext) -> bool:
+        # the checksum is None when the checker left it to be taken during the copy
+        return ctx.hash_sink is not None and ctx.checks.get("checksum") is None
+
+    def _needs_transfer(self, ctx: FileContext) -> bool:
+        if self._deferred(ctx):
+            return True
+        return self.bookkeeper.is_changed(record=ctx.record, **ctx.checks)
+
+    def _append_file(self, ctx: FileContext, sink) -> bool:
+        """Try to send only the bytes added to the file since its last transfer."""
+        record = ctx.record
+        offset = getattr(record, "transferred_size", None)
+        prefix_checksum = getattr(record, "transferred_checksum", None)
+        size = ctx.checks.get("size")
+        if sink is None or not offset or not prefix_checksum or size is None:
+            return False
+        if size <= offset or record.code != 1:
+            return False
+        if str(record.external_name) != str(ctx.external_name):
+            return False
+        algo = record.hash_algo or LEGACY_HASH_ALGO
+        if algo != ctx.checks.get("hash_algo"):
+            return False
+        appended = self.external_connector.append_func(
+            ctx.path,
+            ctx.external_name,
+            offset,
+            prefix_checksum,
+            algo=algo,
+            hash_sink=sink,
+        )
+        if appended:
+            log.debug(f"{ctx.path.name}: appended {size - offset} bytes")
+        return appended
+
+    @staticmethod
+    def _note_transferred(ctx: FileContext, sink) -> None:
+        """Keep the size and checksum of what was sent, for the next append."""
+        if sink is not None and sink.size:
+            ctx.checks["transferred_size"] = sink.size
+            ctx.checks["transferred_checksum"] = sink.hexdigest()
+        elif ctx.checks.get("checksum"):
+            ctx.checks["transferred_size"] = ctx.checks.get("size")
+            ctx.checks["transferred_checksum"] = ctx.checks["checksum"]
+
+    def _streamed_checksum(self, ctx: FileContext, sink) -> str:
+        if sink.size == 0 and ctx.checks.get("size"):
+            # the connector did not feed the sink, so read the file after all
+            log.debug(f"{ctx.path.name}: no bytes seen during copy - hashing file")
+            return self.checker.check(ctx.path)["checksum"]
+        return sink.hexdigest()
+
+    def _commit_file(self, ctx: FileContext):
+        """Write the outcome of a file to the db (calling thread)."""
+        if ctx.changed:
+            self.status = ("changed", True)
+        if ctx.moved:
             self.status = ("moved", True)
-            self.bookkeeper.update_record(self.external_name, **checks)
-            self.reporter.report("o", same_line=True)
-            log.debug(f"{f.name} -> {self.external_name} copied")
+            self.bookkeeper.update_record(
+                ctx.external_name, record=ctx.record, **ctx.checks
+            )
             return
+        if ctx.changed:
+            # File-level failure: abort the whole run only if the destination is gone.
+            self._ensure_external_connection()
+        elif not ctx.failed:
+            self.bookkeeper.refresh_record(record=ctx.record, **ctx.checks)
 
-        self.reporter.report("!", same_line=True)
-        log.debug(f"{f.name} -> {self.external_name} FAILED COPY!")
-        # File-level failure: abort the whole run only if the destination is gone.
-        self._ensure_external_connection()
-        return f
+    def _reconnect_external(self):
+        # waits for the transfers running in the other threads to finish
+        self._connection_guard.reconnect(self.external_connector.reconnect)
+
+    def _report(self, status, **kwargs):
+        with self._reporter_lock:
+            self.reporter.report(status, **kwargs)
+
+    def _notify(self, status, title=None):
+        with self._reporter_lock:
+            self.reporter.notify(status, title=title)
 
     def _default_external_name_generator(self, f):
         log.debug(f"{self.subdirs=} {self.external_subdirs=}")
@@ -480,12 +1114,13 @@ class Worker(WorkerBase):
             ext_name = self.external_connector.directory / f.name
         return ext_name
 
-    def make_external_name(self, f):
+    def _external_name_for(self, f):
         if self.external_name_generator is not None:
-            name = self.external_name_generator(self.external_connector, f)
-        else:
-            name = self._default_external_name_generator(f)
-        self.external_name = name
+            return self.external_name_generator(self.external_connector, f)
+        return self._default_external_name_generator(f)
+
+    def make_external_name(self, f):
+        self.external_name = self._external_name_for(f)
         self.status = ("name", f.name)
         self.status = ("external_name", str(self.external_name))
 
@@ -527,6 +1162,32 @@ class Worker(WorkerBase):
             sys.exit(0)
 
 
+def _worker_options(
+    reconnect: Union[bool, None] = None,
+    max_workers: Union[int, None] = None,
+    hash_while_copy: Union[bool, None] = None,
+    hash_workers: Union[int, None] = None,
+    append_transfer: Union[bool, None] = None,
+    batch_file_size: Union[int, None] = None,
+    checksum_cache_size: Union[int, None] = None,
+    incremental_scan: Union[bool, None] = None,
+    full_scan_interval: Union[float, None] = None,
+) -> dict:
+    """The Worker arguments for the worker_kwargs of a factory (see `Worker`)."""
+    checksum_cache = make_checksum_cache(checksum_cache_size)
+    return dict(
+        checker=ChecksumChecker(cache=checksum_cache),
+        reconnect=resolve_reconnect(reconnect),
+        max_workers=resolve_max_workers(max_workers),
+        hash_while_copy=resolve_hash_while_copy(hash_while_copy),
+        hash_workers=resolve_hash_workers(hash_workers),
+        append_transfer=resolve_append_transfer(append_transfer),
+        batch_file_size=resolve_batch_file_size(batch_file_size),
+        checksum_cache=checksum_cache,
+        directory_index=make_directory_index(incremental_scan, full_scan_interval),
+    )
+
+
 def simple_worker(
     base_directory_from=None,
     base_directory_to=None,
@@ -536,7 +1197,7 @@ def simple_worker(
     reporter=None,
     include_subdirs=False,
     external_subdirs=False,
-    reconnect: Union[bool, None] = None,
+    **worker_kwargs,
 ):
     """Create a Worker for copying files locally.
 
@@ -550,8 +1211,8 @@ def simple_worker(
         include_subdirs: set to True if you want to include subdirectories.
         external_subdirs: set to True if you want to include subdirectory structure in the external directory
           (only makes sense if include_subdirs is True).
-        reconnect: when True, reconnect before each changed file. When None (default),
-            use OELEO_RECONNECT if set, otherwise False.
+        **worker_kwargs: options of the worker (reconnect, max_workers, ...), see
+            `Worker`.
 
     Returns:
         simple worker that can copy files between two local folder.
@@ -568,11 +1229,13 @@ def simple_worker(
         extension = os.environ["OELEO_FILTER_EXTENSION"]
 
     bookkeeper = SimpleDbHandler(db_name)
-    checker = ChecksumChecker()
+    options = _worker_options(**worker_kwargs)
 
     # Consider performing the setting of _include_subdirs in the worker instead
     local_connector = LocalConnector(
-        directory=base_directory_from, include_subdirs=include_subdirs
+        directory=base_directory_from,
+        include_subdirs=include_subdirs,
+        directory_index=options["directory_index"],
     )
     external_connector = LocalConnector(
         directory=base_directory_to, include_subdirs=external_subdirs
@@ -583,16 +1246,15 @@ def simple_worker(
     log.debug(f"to  :{base_directory_to}")
 
     worker = Worker(
-        checker=checker,
         local_connector=local_connector,
         external_connector=external_connector,
         bookkeeper=bookkeeper,
         extension=extension,
         dry_run=dry_run,
         reporter=reporter,
-        reconnect=resolve_reconnect(reconnect),
         subdirs=include_subdirs,
         external_subdirs=external_subdirs,
+        **options,
     )
     return worker
 
@@ -608,7 +1270,7 @@ def ssh_worker(
     is_posix: bool = True,
     include_subdirs: bool = False,
     external_subdirs: bool = False,
-    reconnect: Union[bool, None] = None,
+    **worker_kwargs,
 ):
     """Create a Worker with SSHConnector.
 
@@ -623,8 +1285,8 @@ def ssh_worker(
         reporter: reporter to use. If None, a default reporter will be used.
         include_subdirs: include subdirectories when filtering local files.
         external_subdirs: include subdirectories when filtering remote files.
-        reconnect: when True, reconnect before each changed file. When None (default),
-            use OELEO_RECONNECT if set, otherwise False. Failed moves still reconnect once.
+        **worker_kwargs: options of the worker (reconnect, max_workers, ...), see
+            `Worker`.
 
     Returns:
         worker with SSHConnector attached to it.
@@ -635,9 +1297,11 @@ def ssh_worker(
     base_directory_to = base_directory_to or os.environ["OELEO_BASE_DIR_TO"]
     extension = extension or os.environ["OELEO_FILTER_EXTENSION"]
 
+    options = _worker_options(**worker_kwargs)
     local_connector = LocalConnector(
         directory=base_directory_from,
         include_subdirs=include_subdirs,
+        directory_index=options["directory_index"],
     )
     external_connector = SSHConnector(
         directory=base_directory_to,
@@ -647,7 +1311,6 @@ def ssh_worker(
     )
 
     bookkeeper = SimpleDbHandler(db_name)
-    checker = ChecksumChecker()
     reporter = reporter or Reporter()
 
     log.debug("<SSH Worker created>")
@@ -655,16 +1318,15 @@ def ssh_worker(
     log.debug(f"to  :{external_connector.host}:{external_connector.directory}")
 
     worker = Worker(
-        checker=checker,
         local_connector=local_connector,
         external_connector=external_connector,
         bookkeeper=bookkeeper,
         extension=extension,
         dry_run=dry_run,
         reporter=reporter,
-        reconnect=resolve_reconnect(reconnect),
         subdirs=include_subdirs,
         external_subdirs=external_subdirs,
+        **options,
     )
     return worker
 
@@ -678,7 +1340,7 @@ def sharepoint_worker(
     extension: str = None,
     reporter: ReporterBase = None,
     dry_run: bool = False,
-    reconnect: Union[bool, None] = None,
+    **worker_kwargs,
 ):
     """Create a Worker with SharePointConnector.
 
@@ -691,8 +1353,8 @@ def sharepoint_worker(
         extension: file extension to filter on (for example '.csv').
         reporter: reporter to use. If None, a default reporter will be used.
         dry_run: set to True if you would like to run without updating or moving anything.
-        reconnect: when True, reconnect before each changed file. When None (default),
-            use OELEO_RECONNECT if set, otherwise False.
+        **worker_kwargs: options of the worker (reconnect, max_workers, ...), see
+            `Worker`.
 
     Returns:
         worker with SharePoint attached to it.
@@ -711,7 +1373,10 @@ def sharepoint_worker(
     extension = extension or os.environ["OELEO_FILTER_EXTENSION"]
     username = os.getenv("OELEO_SHAREPOINT_USERNAME", None)
 
-    local_connector = LocalConnector(directory=base_directory_from)
+    options = _worker_options(**worker_kwargs)
+    local_connector = LocalConnector(
+        directory=base_directory_from, directory_index=options["directory_index"]
+    )
 
     external_connector = SharePointConnector(
         username=username,
@@ -721,7 +1386,6 @@ def sharepoint_worker(
     )
 
     bookkeeper = SimpleDbHandler(db_name)
-    checker = ChecksumChecker()
     reporter = reporter or Reporter()
     log.debug("<SSH Worker created>")
 
@@ -729,7 +1393,6 @@ def sharepoint_worker(
     log.debug(f"to  :{external_connector.url}:{external_connector.directory}")
 
     worker = Worker(
-        checker=checker,
         local_connector=local_connector,
         external_connector=external_connector,
         bookkeeper=bookkeeper,
@@ -737,6 +1400,6 @@ def sharepoint_worker(
         external_name_generator=external_name_generator,
         dry_run=dry_run,
         reporter=reporter,
-        reconnect=resolve_reconnect(reconnect),
+        **options,
     )
     return worker
@@ -0,0 +1,145 @@
+"""Unit tests for append-aware transfers of growing files."""
+
+import hashlib
+import io
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from oeleo.connectors import SSHConnector
+from oeleo.movers import append_file
+from oeleo.utils import HashSink
+from oeleo.workers import simple_worker
+
+PREFIX = b"cycle 1\n" * 100
+TAIL = b"cycle 2\n" * 10
+
+
+def _md5(data):
+    return hashlib.md5(data).hexdigest()
+
+
+def test_append_file_only_sends_the_tail(tmp_path):
+    src = tmp_path / "src.res"
+    dst = tmp_path / "dst.res"
+    src.write_bytes(PREFIX + TAIL)
+    dst.write_bytes(PREFIX)
+    sink = HashSink("md5")
+
+    assert append_file(src, dst, len(PREFIX), _md5(PREFIX), sink)
+    assert dst.read_bytes() == PREFIX + TAIL
+    assert sink.size == len(PREFIX + TAIL)
+    assert sink.hexdigest() == _md5(PREFIX + TAIL)
+
+
+def test_append_file_refuses_a_different_prefix(tmp_path):
+    src = tmp_path / "src.res"
+    dst = tmp_path / "dst.res"
+    src.write_bytes(b"X" + PREFIX[1:] + TAIL)
+    dst.write_bytes(PREFIX)
+
+    assert not append_file(src, dst, len(PREFIX), _md5(PREFIX), HashSink("md5"))
+    assert dst.read_bytes() == PREFIX
+
+
+@pytest.fixture
+def growing(tmp_path):
+    base_from = tmp_path / "from"
+    base_to = tmp_path / "to"
+    base_from.mkdir()
+    base_to.mkdir()
+    (base_from / "cell.res").write_bytes(PREFIX)
+    return base_from, base_to
+
+
+def _run(base_from, base_to, **kwargs):
+    worker = simple_worker(
+        db_name=":memory:",
+        base_directory_from=base_from,
+        base_directory_to=base_to,
+        extension=".res",
+        append_transfer=True,
+        **kwargs,
+    )
+    worker.connect_to_db()
+    worker.filter_local()
+    worker.run()
+    return worker
+
+
+@pytest.mark.parametrize("hash_while_copy", [False, True])
+def test_grown_file_is_appended(growing, hash_while_copy):
+    base_from, base_to = growing
+    worker = _run(base_from, base_to, hash_while_copy=hash_while_copy)
+    with open(base_from / "cell.res", "ab") as f:
+        f.write(TAIL)
+
+    worker.filter_local()
+    with patch.object(worker.external_connector, "move_func") as move:
+        worker.run()
+
+    move.assert_not_called()
+    assert (base_to / "cell.res").read_bytes() == PREFIX + TAIL
+    record = worker.bookkeeper.db_model.get(local_name="cell.res")
+    assert record.transferred_size == len(PREFIX + TAIL)
+    assert record.transferred_checksum == _md5(PREFIX + TAIL)
+    assert record.checksum == _md5(PREFIX + TAIL)
+
+
+def test_rewritten_file_is_copied_in_full(growing):
+    base_from, base_to = growing
+    worker = _run(base_from, base_to)
+    (base_from / "cell.res").write_bytes(b"new header\n" + PREFIX + TAIL)
+
+    worker.filter_local()
+    worker.run()
+
+    assert (base_to / "cell.res").read_bytes() == b"new header\n" + PREFIX + TAIL
+
+
+@pytest.fixture
+def ssh_connector(monkeypatch, tmp_path):
+    monkeypatch.setenv("OELEO_PASSWORD", "secret")
+    monkeypatch.setenv("OELEO_USERNAME", "tester")
+    monkeypatch.setenv("OELEO_EXTERNAL_HOST", "localhost")
+    connector = SSHConnector(directory="/data", use_password=True, is_posix=True)
+    connector.c = MagicMock()
+    local = tmp_path / "cell.res"
+    local.write_bytes(PREFIX + TAIL)
+    return connector, local
+
+
+def test_ssh_append_sends_the_tail_over_sftp(ssh_connector):
+    connector, local = ssh_connector
+    connector.c.run.return_value.ok = True
+    connector.c.run.return_value.stdout = f"{_md5(PREFIX)}  -\n"
+    sent = io.BytesIO()
+    sftp = MagicMock()
+    sftp.open.return_value.__enter__.return_value.write.side_effect = sent.write
+    sftp.stat.return_value.st_size = len(PREFIX + TAIL)
+
+    with patch.object(connector, "_get_sftp", return_value=sftp):
+        appended = connector.append_func(
+            local, Path("/data/cell.res"), len(PREFIX), _md5(PREFIX)
+        )
+
+    assert appended
+    cmd = connector.c.run.call_args.args[0]
+    assert f"head -c {len(PREFIX)} -- /data/cell.res | md5sum" in cmd
+    assert sftp.open.call_args.args[:2] == ("/data/cell.res", "ab")
+    assert sent.getvalue() == TAIL
+
+
+def test_ssh_append_refuses_a_different_remote_prefix(ssh_connector):
+    connector, local = ssh_connector
+    connector.c.run.return_value.ok = True
+    connector.c.run.return_value.stdout = "0123  -\n"
+
+    with patch.object(connector, "_get_sftp") as get_sftp:
+        appended = connector.append_func(
+            local, Path("/data/cell.res"), len(PREFIX), _md5(PREFIX)
+        )
+
+    assert not appended
+    get_sftp.assert_not_called()
@@ -0,0 +1,195 @@
+"""Unit tests for sending small files in batches (Connector.move_many)."""
+
+import hashlib
+import subprocess
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from oeleo.connectors import LocalConnector, SSHConnector
+from oeleo.utils import HashSink
+from oeleo.workers import resolve_batch_file_size, simple_worker
+
+
+def test_resolve_batch_file_size(monkeypatch):
+    monkeypatch.delenv("OELEO_BATCH_FILE_SIZE", raising=False)
+    assert resolve_batch_file_size() == 0
+    monkeypatch.setenv("OELEO_BATCH_FILE_SIZE", "65536")
+    assert resolve_batch_file_size() == 65_536
+    assert resolve_batch_file_size(0) == 0
+    with pytest.raises(ValueError):
+        resolve_batch_file_size(-1)
+
+
+def test_default_move_many_moves_one_by_one(local_tmp_path, external_tmp_path):
+    connector = LocalConnector(directory=external_tmp_path)
+    sink = HashSink("md5")
+    items = [
+        (local_tmp_path / "filename1.xyz", external_tmp_path / "filename1.xyz", sink),
+        (local_tmp_path / "missing.xyz", external_tmp_path / "missing.xyz", None),
+    ]
+    assert connector.move_many(items) == [True, False]
+    assert (external_tmp_path / "filename1.xyz").read_text() == "some random strings"
+    assert sink.hexdigest() == pytest.checksum_local_file_tmp_path
+
+
+@pytest.fixture
+def local_ssh(monkeypatch, tmp_path):
+    monkeypatch.setenv("OELEO_PASSWORD", "secret")
+    monkeypatch.setenv("OELEO_USERNAME", "tester")
+    monkeypatch.setenv("OELEO_EXTERNAL_HOST", "localhost")
+    remote_dir = tmp_path / "remote"
+    connector = SSHConnector(directory=remote_dir, use_password=True, is_posix=True)
+    commands = []
+
+    def exec_command(cmd):
+        commands.append(cmd)
+        proc = subprocess.Popen(
+            ["sh", "-c", cmd],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        channel = SimpleNamespace(recv_exit_status=proc.wait)
+        return proc.stdin, SimpleNamespace(channel=channel), proc.stderr
+
+    def run(cmd, **kwargs):
+        commands.append(cmd)
+        out = subprocess.run(["sh", "-c", cmd], capture_output=True, text=True)
+        return SimpleNamespace(
+            ok=out.returncode == 0, stdout=out.stdout, stderr=out.stderr
+        )
+
+    c = MagicMock()
+    c.client.exec_command.side_effect = exec_command
+    c.run.side_effect = run
+    connector.c = c
+    return connector, remote_dir, commands
+
+
+def test_ssh_move_many_sends_one_tar_stream(local_ssh, tmp_path):
+    connector, remote_dir, commands = local_ssh
+    items = []
+    for i in range(20):
+        f = tmp_path / f"log{i}.xyz"
+        f.write_bytes(f"metadata {i}\n".encode() * i)
+        to = remote_dir / ("sub" if i % 2 else "") / f.name
+        items.append((f, to, HashSink("md5")))
+
+    assert connector.move_many(items) == [True] * 20
+    assert sum(cmd.startswith("mkdir -p") for cmd in commands) == 1
+    for f, to, sink in items:
+        assert Path(to).read_bytes() == f.read_bytes()
+        assert sink.hexdigest() == hashlib.md5(f.read_bytes()).hexdigest()
+
+
+def test_ssh_move_many_leaves_unverified_files_for_move_func(local_ssh, tmp_path):
+    connector, remote_dir, _ = local_ssh
+    f = tmp_path / "log.xyz"
+    f.write_text("metadata")
+    outside = tmp_path / "elsewhere" / "log.xyz"
+    items = [(f, remote_dir / "log.xyz", None), (f, outside, None)]
+
+    assert connector.move_many(items) == [True, False]
+    assert not outside.exists()
+
+    with patch.object(connector, "_remote_sizes", return_value={}):
+        assert connector.move_many(items[:1]) == [False]
+
+
+def test_ssh_move_many_keeps_the_previous_copies_when_the_stream_fails(
+    local_ssh, tmp_path
+):
+    connector, remote_dir, _ = local_ssh
+    exec_command = connector.c.client.exec_command.side_effect
+    remote_commands = []
+
+    def tracked_exec_command(cmd):
+        stdin, stdout, stderr = exec_command(cmd)
+        remote_commands.append(stdout.channel)
+        return stdin, stdout, stderr
+
+    connector.c.client.exec_command.side_effect = tracked_exec_command
+    remote_dir.mkdir()
+    (remote_dir / "log0.xyz").write_text("previous copy")
+    items = []
+    for i in range(3):
+        f = tmp_path / f"log{i}.xyz"
+        f.write_text(f"metadata {i}")
+        items.append((f, remote_dir / f.name, None))
+    (tmp_path / "log2.xyz").unlink()
+
+    assert connector.move_many(items) == [False] * 3
+    assert remote_commands[0].recv_exit_status() != 0
+    assert (remote_dir / "log0.xyz").read_text() == "previous copy"
+    assert sorted(p.name for p in remote_dir.iterdir()) == ["log0.xyz"]
+
+
+def _worker(local_tmp_path, external_tmp_path, **kwargs):
+    worker = simple_worker(
+        db_name=":memory:",
+        base_directory_from=local_tmp_path,
+        base_directory_to=external_tmp_path,
+        **kwargs,
+    )
+    worker.connect_to_db()
+    worker.filter_local()
+    return worker
+
+
+@pytest.mark.parametrize("hash_while_copy", [False, True])
+def test_worker_batches_small_changed_files(
+    local_tmp_path, external_tmp_path, hash_while_copy
+):
+    (local_tmp_path / "big.xyz").write_bytes(b"x" * 1000)
+    worker = _worker(
+        local_tmp_path,
+        external_tmp_path,
+        batch_file_size=100,
+        hash_while_copy=hash_while_copy,
+    )
+    connector = worker.external_connector
+    with patch.object(
+        connector, "move_many", wraps=connector.move_many
+    ) as move_many, patch.object(
+        connector, "move_func", wraps=connector.move_func
+    ) as move_func:
+        worker.run()
+
+    (items,), _ = move_many.call_args
+    assert sorted(path.name for path, _, _ in items) == [
+        "filename1.xyz",
+        "filename2.xyz",
+    ]
+    moved_alone = [args[0].name for args, _ in move_func.call_args_list]
+    assert moved_alone.count("big.xyz") == 1
+    for record in worker.bookkeeper.db_model.select():
+        assert record.code == 1
+        assert record.checksum == hashlib.md5(
+            (local_tmp_path / record.local_name).read_bytes()
+        ).hexdigest()
+
+    worker.filter_local()
+    with patch.object(connector, "move_many") as move_many:
+        worker.run()
+    move_many.assert_not_called()
+
+
+def test_worker_sends_unverified_batch_files_on_their_own(
+    local_tmp_path, external_tmp_path
+):
+    worker = _worker(local_tmp_path, external_tmp_path, batch_file_size=100)
+    connector = worker.external_connector
+    with patch.object(
+        connector, "move_many", return_value=[False, False]
+    ), patch.object(connector, "move_func", wraps=connector.move_func) as move_func:
+        worker.run()
+
+    assert move_func.call_count == 2
+    assert {f.name for f in external_tmp_path.iterdir()} == {
+        "filename1.xyz",
+        "filename2.xyz",
+    }
+    assert all(r.code == 1 for r in worker.bookkeeper.db_model.select())
@@ -0,0 +1,154 @@
+"""Unit tests for bulk checksums (Connector.calculate_checksums) used by Worker.check."""
+
+import hashlib
+import shlex
+from pathlib import Path, PurePosixPath
+from unittest.mock import MagicMock
+
+import pytest
+
+import oeleo.connectors as connectors
+from oeleo.checkers import ChecksumChecker
+from oeleo.connectors import (
+    LocalConnector,
+    OeleoTransferError,
+    RemoteEntry,
+    SharePointConnector,
+    SSHConnector,
+    _parse_md5sum_line,
+)
+from oeleo.workers import Worker
+
+
+@pytest.fixture
+def ssh_connector(monkeypatch):
+    monkeypatch.setenv("OELEO_PASSWORD", "secret")
+    monkeypatch.setenv("OELEO_USERNAME", "tester")
+    monkeypatch.setenv("OELEO_EXTERNAL_HOST", "localhost")
+    connector = SSHConnector(directory="/data", use_password=True, is_posix=True)
+    connector.c = MagicMock()
+    return connector
+
+
+def _md5sum_output(cmd):
+    """Fake md5sum: one line per quoted path on the command line."""
+    paths = shlex.split(cmd)[2:]
+    result = MagicMock()
+    result.ok = True
+    result.stdout = "".join(f"sum-{PurePosixPath(p).name}  {p}\n" for p in paths)
+    return result
+
+
+def test_ssh_calculate_checksums_uses_one_command(ssh_connector):
+    ssh_connector.c.run.side_effect = lambda cmd, **kw: _md5sum_output(cmd)
+    files = [PurePosixPath(f"f{i}.xyz") for i in range(10)]
+
+    checksums = ssh_connector.calculate_checksums(files)
+
+    assert ssh_connector.c.run.call_count == 1
+    cmd = ssh_connector.c.run.call_args.args[0]
+    assert cmd.startswith("md5sum -- ")
+    assert checksums == {f: f"sum-{f.name}" for f in files}
+
+
+def test_ssh_calculate_checksums_splits_long_argument_lists(ssh_connector, monkeypatch):
+    monkeypatch.setattr(connectors, "REMOTE_ARGV_BYTES", 100)
+    ssh_connector.c.run.side_effect = lambda cmd, **kw: _md5sum_output(cmd)
+    files = [PurePosixPath(f"file_number_{i}.xyz") for i in range(20)]
+
+    checksums = ssh_connector.calculate_checksums(files)
+
+    assert ssh_connector.c.run.call_count > 1
+    for call in ssh_connector.c.run.call_args_list:
+        assert len(call.args[0]) < 100 + len("md5sum -- ") + 40
+    assert len(checksums) == 20
+
+
+def test_ssh_calculate_checksums_leaves_out_missing_files(ssh_connector):
+    result = MagicMock()
+    result.ok = False
+    result.stdout = "abc  /data/a.xyz\n"
+    ssh_connector.c.run.return_value = result
+
+    checksums = ssh_connector.calculate_checksums(
+        [PurePosixPath("a.xyz"), PurePosixPath("missing.xyz")]
+    )
+
+    assert checksums == {PurePosixPath("a.xyz"): "abc"}
+
+
+def test_ssh_calculate_checksums_raises_when_command_fails(ssh_connector):
+    ssh_connector.c.run.side_effect = RuntimeError("transport down")
+
+    with pytest.raises(OeleoTransferError):
+        ssh_connector.calculate_checksums([PurePosixPath("a.xyz")])
+
+
+def test_parse_md5sum_line_handles_escaped_names():
+    assert _parse_md5sum_line("abc  /data/a b.xyz") == ("abc", "/data/a b.xyz")
+    assert _parse_md5sum_line("abc */data/a.xyz") == ("abc", "/data/a.xyz")
+    assert _parse_md5sum_line("\\abc  /data/a\\nb\\\\c") == ("abc", "/data/a\nb\\c")
+    assert _parse_md5sum_line("garbage") is None
+
+
+def test_default_calculate_checksums_falls_back_to_single_files(local_tmp_path):
+    connector = LocalConnector(directory=local_tmp_path)
+    files = [local_tmp_path / "filename1.xyz", local_tmp_path / "missing.xyz"]
+    connector.calculate_checksum = MagicMock(
+        side_effect=["7920697396c631989f51a80df0813e86", OeleoTransferError("gone")]
+    )
+
+    checksums = connector.calculate_checksums(files)
+
+    assert checksums == {files[0]: "7920697396c631989f51a80df0813e86"}
+
+
+def test_worker_check_requests_remote_checksums_in_bulk(tmp_path, ssh_connector):
+    local_dir = tmp_path / "from"
+    local_dir.mkdir()
+    for i in range(5):
+        (local_dir / f"f{i}.xyz").write_text("same")
+    local = LocalConnector(directory=local_dir)
+    local_sum = ChecksumChecker().check(local_dir / "f0.xyz")["checksum"]
+
+    ssh_connector.list_entries = MagicMock(
+        return_value=[RemoteEntry(PurePosixPath(f"/data/f{i}.xyz")) for i in range(5)]
+    )
+    ssh_connector.calculate_checksums = MagicMock(
+        side_effect=lambda paths, **kwargs: {p: local_sum for p in paths}
+    )
+    reporter = MagicMock()
+    reporter.should_die.return_value = False
+
+    worker = Worker(
+        checker=ChecksumChecker(),
+        bookkeeper=MagicMock(),
+        local_connector=local,
+        external_connector=ssh_connector,
+        reporter=reporter,
+        extension=".xyz",
+        external_name_generator=lambda con, f: con.directory / f.name,
+    )
+    worker.filter_local()
+    worker.check()
+
+    ssh_connector.calculate_checksums.assert_called_once()
+    assert worker.number_of_external_duplicates == 5
+    assert worker.number_of_duplicates_out_of_sync == 0
+
+
+def test_checker_hashes_sharepoint_files_remotely():
+    connector = SharePointConnector.__new__(SharePointConnector)
+    folder = MagicMock()
+    folder.get_file.side_effect = lambda name: name.encode()
+    connector.connection = MagicMock(folder=folder)
+    files = [Path("a.xyz"), Path("b.xyz")]
+    expected = {f: hashlib.md5(f.name.encode()).hexdigest() for f in files}
+
+    checker = ChecksumChecker()
+    assert checker.check(files[0], connector=connector) == {
+        "checksum": expected[files[0]],
+        "hash_algo": "md5",
+    }
+    checks = checker.check_many(files, connector=connector)
+    assert {f: c["checksum"] for f, c in checks.items()} == expected
@@ -0,0 +1,83 @@
+"""Unit tests for the in-memory bookkeeping index of SimpleDbHandler."""
+
+from pathlib import Path
+from unittest.mock import patch
+
+from oeleo.models import SimpleDbHandler
+from oeleo.workers import simple_worker
+
+
+def _bookkeeper(db_tmp_path, names=()):
+    bookkeeper = SimpleDbHandler(db_tmp_path)
+    bookkeeper.initialize_db()
+    for name in names:
+        record = bookkeeper.register(Path(name))
+        bookkeeper.update_record(Path("/to") / name, record=record, checksum=name)
+    return bookkeeper
+
+
+def test_register_is_answered_from_index(db_tmp_path):
+    bookkeeper = _bookkeeper(db_tmp_path, names=["a.xyz", "b.xyz"])
+    bookkeeper.load_index()
+
+    with patch.object(bookkeeper.db_model, "get_or_create") as get_or_create:
+        record = bookkeeper.register(Path("a.xyz"))
+
+    get_or_create.assert_not_called()
+    assert record.checksum == "a.xyz"
+    assert not bookkeeper.is_changed(record=record, checksum="a.xyz")
+
+
+def test_changes_are_buffered_until_flush(db_tmp_path):
+    bookkeeper = _bookkeeper(db_tmp_path, names=["a.xyz"])
+    bookkeeper.load_index()
+
+    new = bookkeeper.register(Path("new.xyz"))
+    bookkeeper.update_record(Path("/to/new.xyz"), record=new, checksum="n")
+    old = bookkeeper.register(Path("a.xyz"))
+    bookkeeper.update_record(Path("/to/a.xyz"), record=old, checksum="changed")
+
+    assert bookkeeper.db_model.select().count() == 1
+    assert bookkeeper.db_model.get(local_name="a.xyz").checksum == "a.xyz"
+
+    bookkeeper.flush()
+
+    assert bookkeeper.db_model.select().count() == 2
+    assert bookkeeper.db_model.get(local_name="a.xyz").checksum == "changed"
+    assert bookkeeper.db_model.get(local_name="new.xyz").code == 1
+
+
+def test_unload_index_flushes_and_returns_to_direct_saves(db_tmp_path):
+    bookkeeper = _bookkeeper(db_tmp_path)
+    bookkeeper.load_index()
+    record = bookkeeper.register(Path("a.xyz"))
+    bookkeeper.unload_index()
+
+    assert bookkeeper.db_model.get(local_name="a.xyz").code == 0
+
+    bookkeeper.update_record(Path("/to/a.xyz"), record=record, checksum="x")
+    assert bookkeeper.db_model.get(local_name="a.xyz").checksum == "x"
+
+
+def test_run_flushes_once_per_chunk(
+    db_tmp_path, local_tmp_path, external_tmp_path
+):
+    for i in range(43):
+        (local_tmp_path / f"extra{i}.xyz").write_text(f"extra {i}")
+    worker = simple_worker(
+        db_name=db_tmp_path,
+        base_directory_from=local_tmp_path,
+        base_directory_to=external_tmp_path,
+    )
+    worker.connect_to_db()
+    worker.filter_local()
+
+    with patch.object(
+        worker.bookkeeper, "flush", wraps=worker.bookkeeper.flush
+    ) as flush:
+        worker.run()
+
+    # 45 files in chunks of 20, plus one flush each when loading and unloading
+    assert flush.call_count == 5
+    assert worker.bookkeeper.db_model.select().count() == 45
+    assert worker.bookkeeper._index is None
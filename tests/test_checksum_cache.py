@@ -0,0 +1,84 @@
+"""Unit tests for the persistent checksum cache (oeleo.cache)."""
+
+from unittest.mock import patch
+
+import pytest
+
+import oeleo.checkers
+from oeleo.cache import ChecksumCache, make_checksum_cache, resolve_checksum_cache_size
+from oeleo.checkers import ChecksumChecker
+from oeleo.models import ChecksumCacheEntry, SimpleDbHandler
+from oeleo.utils import stat_fingerprint
+from oeleo.workers import simple_worker
+
+
+def test_resolve_checksum_cache_size(monkeypatch):
+    monkeypatch.delenv("OELEO_CHECKSUM_CACHE_SIZE", raising=False)
+    assert resolve_checksum_cache_size() == 100_000
+    monkeypatch.setenv("OELEO_CHECKSUM_CACHE_SIZE", "10")
+    assert resolve_checksum_cache_size() == 10
+    assert resolve_checksum_cache_size(5) == 5
+    assert make_checksum_cache(0) is None
+    with pytest.raises(ValueError):
+        resolve_checksum_cache_size(-1)
+
+
+def test_get_requires_the_same_stat_fingerprint(local_file_tmp_path):
+    cache = ChecksumCache(10)
+    stat = stat_fingerprint(local_file_tmp_path)
+    cache.put(local_file_tmp_path, stat, "md5", "abc")
+
+    assert cache.get(local_file_tmp_path, stat, "md5") == "abc"
+    assert cache.get(local_file_tmp_path, stat, "sha256") is None
+    assert cache.get(local_file_tmp_path, {**stat, "mtime_ns": 1}, "md5") is None
+    assert cache.stats == {"hits": 1, "misses": 2, "entries": 1}
+
+
+def test_flush_and_load_round_trip_with_eviction():
+    SimpleDbHandler(":memory:").initialize_db()
+    stat = {"size": 1, "mtime_ns": 2, "inode": 3}
+    cache = ChecksumCache(2)
+    cache.put("a", stat, "md5", "1")
+    cache.flush()
+    cache.put("b", stat, "md5", "2")
+    cache.put("c", stat, "md5", "3")  # evicts a
+    cache.flush()
+    assert {e.path for e in ChecksumCacheEntry.select()} == {"b", "c"}
+
+    restored = ChecksumCache(2)
+    restored.load()
+    assert len(restored) == 2
+    assert restored.get("c", stat, "md5") == "3"
+    assert restored.get("a", stat, "md5") is None
+
+
+def test_checker_uses_the_cache_before_hashing(local_file_tmp_path):
+    checker = ChecksumChecker(mode="stat", algo="md5", cache=ChecksumCache(10))
+    first = checker.check(local_file_tmp_path)
+    assert first["checksum"] == pytest.checksum_local_file_tmp_path
+
+    with patch.object(oeleo.checkers, "calculate_checksum") as calculate:
+        second = checker.check(local_file_tmp_path)
+    calculate.assert_not_called()
+    assert second["checksum"] == first["checksum"]
+    assert checker.cache.hits == 1
+
+
+def test_worker_check_reuses_cached_checksums(
+    db_tmp_path, local_tmp_path, external_tmp_path
+):
+    worker = simple_worker(
+        db_name=db_tmp_path,
+        base_directory_from=local_tmp_path,
+        base_directory_to=external_tmp_path,
+        checksum_cache_size=100,
+    )
+    worker.connect_to_db()
+    worker.filter_local()
+    worker.check(update_db=False)
+    assert ChecksumCacheEntry.select().count() == 2
+
+    with patch.object(oeleo.checkers, "calculate_checksum") as calculate:
+        worker.check(update_db=False)
+    calculate.assert_not_called()
+    assert worker.checksum_cache.hits == 2
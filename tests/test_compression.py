@@ -0,0 +1,177 @@
+"""Unit tests for compressed transfers to SSH remotes (oeleo.compression)."""
+
+import gzip
+import hashlib
+import io
+import os
+import subprocess
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from oeleo.compression import (
+    COMPRESSION_MIN_FILE_SIZE,
+    CompressingWriter,
+    TransferStats,
+    resolve_compression,
+    should_compress,
+)
+from oeleo.connectors import OeleoTransferError, SSHConnector
+from oeleo.utils import HashSink
+
+TEXT = b"2024-01-01 12:00:00, 3.1415, 0.0021, 25.0\n" * 10_000
+
+
+def test_resolve_compression():
+    assert resolve_compression(None) == "off"
+    assert resolve_compression("GZIP") == "gzip"
+    with pytest.raises(ValueError):
+        resolve_compression("lz4")
+
+
+def test_should_compress(tmp_path):
+    text = tmp_path / "export.res"
+    text.write_bytes(TEXT)
+    noise = tmp_path / "raw.res"
+    noise.write_bytes(os.urandom(len(TEXT)))
+    archive = tmp_path / "export.zip"
+    archive.write_bytes(TEXT)
+
+    assert should_compress(text, len(TEXT))
+    assert not should_compress(noise, len(TEXT))
+    assert not should_compress(archive, len(TEXT))
+    assert not should_compress(text, COMPRESSION_MIN_FILE_SIZE - 1)
+
+
+def test_compressing_writer_counts_bytes():
+    out = io.BytesIO()
+    writer = CompressingWriter(out, "gzip")
+    for i in range(0, len(TEXT), 4096):
+        assert writer.write(TEXT[i : i + 4096]) == len(TEXT[i : i + 4096])
+    writer.finish()
+
+    assert gzip.decompress(out.getvalue()) == TEXT
+    assert writer.raw_bytes == len(TEXT)
+    assert writer.wire_bytes == len(out.getvalue()) < len(TEXT) / 5
+
+
+def test_transfer_stats_summary():
+    stats = TransferStats()
+    stats.add(4_000_000, 1_000_000, compressed=True, cpu_seconds=0.5)
+    stats.add(1_000_000, 1_000_000)
+    assert str(stats) == (
+        "2 files, 5.0 MB (2.0 MB sent, 2.5x; 1 compressed in 0.5 s cpu)"
+    )
+
+    stats.add(3_000_000, None)
+    assert str(stats) == (
+        "3 files, 8.0 MB (2.0 MB sent, 2.5x; 3.0 MB through ssh compression, "
+        "size sent unknown; 1 compressed in 0.5 s cpu)"
+    )
+
+
+@pytest.fixture
+def ssh_env(monkeypatch):
+    monkeypatch.setenv("OELEO_PASSWORD", "secret")
+    monkeypatch.setenv("OELEO_USERNAME", "tester")
+    monkeypatch.setenv("OELEO_EXTERNAL_HOST", "localhost")
+    monkeypatch.delenv("OELEO_COMPRESSION", raising=False)
+
+
+def test_ssh_compression_is_passed_to_the_transport(ssh_env):
+    connector = SSHConnector(directory="/data", use_password=True, compression="ssh")
+    assert connector._new_connection().connect_kwargs["compress"] is True
+
+
+def test_ssh_compression_leaves_bytes_sent_unknown(ssh_env):
+    stats = TransferStats()
+    stats.add(3_000_000, None)
+    assert str(stats) == (
+        "1 files, 3.0 MB (3.0 MB through ssh compression, size sent unknown; "
+        "0 compressed in 0.0 s cpu)"
+    )
+    connector = SSHConnector(directory="/data", use_password=True, compression="ssh")
+    assert connector._wire_bytes(1_000) is None
+    connector = SSHConnector(directory="/data", use_password=True)
+    assert connector._wire_bytes(1_000) == 1_000
+
+
+@pytest.fixture
+def gzip_ssh(ssh_env, tmp_path):
+    connector = SSHConnector(
+        directory=tmp_path / "remote", use_password=True, compression="gzip"
+    )
+
+    def exec_command(cmd):
+        proc = subprocess.Popen(
+            ["sh", "-c", cmd],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        channel = SimpleNamespace(recv_exit_status=proc.wait)
+        return proc.stdin, SimpleNamespace(channel=channel), proc.stderr
+
+    def run(cmd, **kwargs):
+        out = subprocess.run(["sh", "-c", cmd], capture_output=True, text=True)
+        return SimpleNamespace(ok=out.returncode == 0, stdout=out.stdout)
+
+    c = MagicMock()
+    c.client.exec_command.side_effect = exec_command
+    c.run.side_effect = run
+    connector.c = c
+    connector._get_sftp = lambda c: SimpleNamespace(chmod=os.chmod)
+    (tmp_path / "remote").mkdir()
+    return connector
+
+
+def test_ssh_sends_compressible_files_compressed(gzip_ssh, tmp_path):
+    local = tmp_path / "export.csv"
+    local.write_bytes(TEXT)
+    remote = tmp_path / "remote" / "export.csv"
+    sink = HashSink("md5")
+
+    with patch.object(gzip_ssh, "_put_file") as put:
+        assert gzip_ssh.move_func(local, remote, hash_sink=sink)
+    put.assert_not_called()
+    assert remote.read_bytes() == TEXT
+    assert sink.hexdigest() == hashlib.md5(TEXT).hexdigest()
+
+    stats = gzip_ssh.pop_transfer_stats()
+    assert (stats.files, stats.compressed_files, stats.raw_bytes) == (1, 1, len(TEXT))
+    assert stats.wire_bytes < len(TEXT) / 5
+    assert gzip_ssh.pop_transfer_stats().files == 0
+
+
+def test_failed_compressed_transfer_keeps_the_previous_copy(gzip_ssh, tmp_path):
+    local = tmp_path / "export.csv"
+    local.write_bytes(TEXT)
+    remote = tmp_path / "remote" / "export.csv"
+    remote.write_bytes(b"previous copy")
+
+    # without the end of the stream, gzip -dc fails
+    with patch.object(CompressingWriter, "finish"):
+        with pytest.raises(OeleoTransferError):
+            gzip_ssh._compressed_put(local, remote, gzip_ssh.c)
+    assert remote.read_bytes() == b"previous copy"
+    assert os.listdir(tmp_path / "remote") == ["export.csv"]
+
+    gzip_ssh._compressed_put(local, remote, gzip_ssh.c)
+    assert remote.read_bytes() == TEXT
+    assert os.listdir(tmp_path / "remote") == ["export.csv"]
+
+
+def test_ssh_batches_are_compressed(gzip_ssh, tmp_path):
+    items = []
+    for i in range(5):
+        f = tmp_path / f"log{i}.xyz"
+        f.write_bytes(TEXT[: 1000 * (i + 1)])
+        items.append((f, tmp_path / "remote" / f.name, None))
+
+    assert gzip_ssh.move_many(items) == [True] * 5
+    for f, to, _ in items:
+        assert to.read_bytes() == f.read_bytes()
+    stats = gzip_ssh.pop_transfer_stats()
+    assert stats.compressed_files == 5
+    assert stats.wire_bytes < stats.raw_bytes / 5
@@ -9,6 +9,7 @@ from shareplum.errors import ShareplumRequestError
 from oeleo.connectors import (
     OeleoConnectionError,
     OeleoTransferError,
+    RemoteEntry,
     SharePointConnector,
     SSHConnector,
 )
@@ -134,7 +135,7 @@ def test_check_aborts_and_notifies_when_external_list_fails(tmp_path):
     f = tmp_path / "from" / "a.xyz"
     f.write_text("data")
     worker.file_names = [f]
-    external.base_filter_sub_method.side_effect = OeleoConnectionError("list failed")
+    external.list_entries.side_effect = OeleoConnectionError("list failed")
 
     with pytest.raises(OeleoConnectionError, match="list failed"):
         worker.check()
@@ -150,11 +151,9 @@ def test_check_continues_after_external_checksum_transfer_error(tmp_path):
     worker.file_names = [f]
     worker.make_external_name = MagicMock()
     worker.external_name = Path("a.xyz")
-    external.base_filter_sub_method.return_value = [Path("a.xyz")]
-    checker.check.side_effect = [
-        {"checksum": "local"},
-        OeleoTransferError("md5 failed"),
-    ]
+    external.list_entries.return_value = [RemoteEntry(Path("a.xyz"))]
+    checker.check.return_value = {"checksum": "local"}
+    checker.check_many.side_effect = OeleoTransferError("md5 failed")
 
     worker.check(update_db=True)
 
@@ -0,0 +1,183 @@
+"""Unit tests for the rsync-style delta transfer (oeleo.delta)."""
+
+import io
+import os
+import shutil
+import subprocess
+import sys
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+import oeleo.delta as delta
+from oeleo.connectors import SSHConnector
+from oeleo.delta import (
+    DELTA_BLOCK_SIZE_MAX,
+    DELTA_BLOCK_SIZE_MIN,
+    PATCH_SCRIPT,
+    SIGNATURE_SCRIPT,
+    block_signatures,
+    delta_block_size,
+    generate_delta,
+    parse_signatures,
+)
+from oeleo.utils import HashSink
+
+BLOCK = 2_048
+OLD = os.urandom(64 * BLOCK + 100)
+
+
+def _changed(kind):
+    if kind == "header":
+        return b"H" * 300 + OLD[300:]
+    if kind == "insert":
+        middle = len(OLD) // 2
+        return OLD[:middle] + b"inserted" + OLD[middle:]
+    if kind == "append":
+        return OLD + b"more data"
+    return OLD[: len(OLD) // 3] + OLD[len(OLD) // 3 + BLOCK :]  # a block removed
+
+
+def _run_patch(tmp_path, old_file, md5):
+    delta_file = tmp_path / "delta"
+    args = [old_file, delta_file, tmp_path / "tmp.bin", BLOCK, md5]
+    return subprocess.run(
+        [sys.executable, "-c", PATCH_SCRIPT, *map(str, args)],
+        capture_output=True,
+        text=True,
+    )
+
+
+def _patch(tmp_path, old, new):
+    old_file = tmp_path / "old.bin"
+    new_file = tmp_path / "new.bin"
+    old_file.write_bytes(old)
+    new_file.write_bytes(new)
+    sig = subprocess.run(
+        [sys.executable, "-c", SIGNATURE_SCRIPT, str(old_file), str(BLOCK)],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    signatures = parse_signatures(sig)
+    assert signatures == block_signatures(old_file, BLOCK)
+
+    out = io.BytesIO()
+    sink = HashSink("md5")
+    stats = generate_delta(new_file, signatures, BLOCK, out, hash_sink=sink)
+    assert sink.hexdigest() == stats.md5
+    (tmp_path / "delta").write_bytes(out.getvalue())
+    return old_file, stats, _run_patch(tmp_path, old_file, stats.md5)
+
+
+def test_delta_block_size_bounds():
+    assert delta_block_size(0) == DELTA_BLOCK_SIZE_MIN
+    assert delta_block_size(64 * 1024**2) == 8_192
+    assert delta_block_size(20 * 1024**3) == DELTA_BLOCK_SIZE_MAX
+
+
+@pytest.mark.parametrize("read_size", [1_048_576, 5_000])
+@pytest.mark.parametrize("kind", ["header", "insert", "append", "remove"])
+def test_delta_rebuilds_the_file_from_few_literal_bytes(
+    tmp_path, monkeypatch, kind, read_size
+):
+    # small reads move the blocks and the rolled bytes across the buffer refills
+    monkeypatch.setattr(delta, "DELTA_READ_SIZE", read_size)
+    new = _changed(kind)
+    old_file, stats, result = _patch(tmp_path, OLD, new)
+
+    assert result.returncode == 0, result.stderr
+    assert old_file.read_bytes() == new
+    assert stats.literal_bytes <= 3 * BLOCK + 100
+    assert stats.total_bytes == len(new)
+
+
+def test_delta_of_a_new_file_is_written_in_bounded_literals(tmp_path, monkeypatch):
+    monkeypatch.setattr(delta, "DELTA_READ_SIZE", 5_000)
+    monkeypatch.setattr(delta, "DELTA_MAX_LITERAL", 3_000)
+    new = os.urandom(len(OLD))
+    old_file, stats, result = _patch(tmp_path, OLD, new)
+
+    assert result.returncode == 0, result.stderr
+    assert old_file.read_bytes() == new
+    assert stats.literal_bytes == len(new)
+
+
+def test_patch_keeps_the_old_file_when_the_result_differs(tmp_path):
+    old_file = tmp_path / "old.bin"
+    old_file.write_bytes(OLD)
+    (tmp_path / "delta").write_bytes(b"D\x00\x00\x00\x03abcE")
+    result = _run_patch(tmp_path, old_file, "0" * 32)
+    assert result.returncode != 0
+    assert old_file.read_bytes() == OLD
+    assert not (tmp_path / "tmp.bin").exists()
+
+
+class _LocalSFTP:
+    """Just enough of an SFTP client, writing to the local file system."""
+
+    def __init__(self):
+        self.sent = 0
+
+    def open(self, name, mode, bufsize=-1):
+        f = open(name, mode)
+        write = f.write
+
+        def counting_write(data):
+            self.sent += len(data)
+            return write(data)
+
+        f.write = counting_write
+        f.set_pipelined = lambda pipelined: None
+        return f
+
+    def chmod(self, name, mode):
+        os.chmod(name, mode)
+
+
+@pytest.fixture
+def local_ssh(monkeypatch, tmp_path):
+    if shutil.which("python3") is None:
+        pytest.skip("needs python3 on the PATH")
+    monkeypatch.setenv("OELEO_PASSWORD", "secret")
+    monkeypatch.setenv("OELEO_USERNAME", "tester")
+    monkeypatch.setenv("OELEO_EXTERNAL_HOST", "localhost")
+    connector = SSHConnector(
+        directory=tmp_path, use_password=True, is_posix=True, delta_transfer=True
+    )
+
+    def run(cmd, **kwargs):
+        out = subprocess.run(["sh", "-c", cmd], capture_output=True, text=True)
+        return SimpleNamespace(
+            ok=out.returncode == 0, stdout=out.stdout, stderr=out.stderr
+        )
+
+    c = MagicMock()
+    c.run.side_effect = run
+    sftp = _LocalSFTP()
+    connector._get_sftp = lambda c: sftp
+    return connector, c, sftp
+
+
+def test_ssh_delta_put_sends_only_the_changes(local_ssh, tmp_path):
+    connector, c, sftp = local_ssh
+    old = os.urandom(2 * 1024**2)
+    local = tmp_path / "local.res"
+    remote = tmp_path / "remote.res"
+    remote.write_bytes(old)
+    local.write_bytes(b"new header" + old[10:])
+
+    assert connector._delta_put(local, remote, c)
+    assert remote.read_bytes() == local.read_bytes()
+    assert sftp.sent < 50_000
+    assert not (tmp_path / "remote.res.oeleo-delta").exists()
+
+
+def test_ssh_delta_put_needs_a_remote_copy(local_ssh, tmp_path):
+    connector, c, sftp = local_ssh
+    local = tmp_path / "local.res"
+    local.write_bytes(os.urandom(2 * 1024**2))
+
+    assert not connector._delta_put(local, tmp_path / "missing.res", c)
+    assert sftp.sent == 0
@@ -0,0 +1,46 @@
+"""Unit tests for the readinto file hashing in oeleo.utils."""
+
+import hashlib
+
+import pytest
+
+import oeleo.utils as utils
+from oeleo.utils import calculate_checksum, calculate_checksums, hash_block_size
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    f = tmp_path / "data.bin"
+    f.write_bytes(bytes(range(256)) * 4099)  # not a multiple of any block size
+    return f
+
+
+def test_hash_block_size_grows_with_the_file():
+    assert hash_block_size(0) == utils.HASH_BLOCK_SIZE_MIN
+    assert hash_block_size(1_000) == utils.HASH_BLOCK_SIZE_MIN
+    assert hash_block_size(16 * 1_048_576) == 1_048_576
+    assert hash_block_size(10 * 1024**3) == utils.HASH_BLOCK_SIZE_MAX
+
+
+def test_reads_the_file_once_in_blocks(data_file, monkeypatch):
+    monkeypatch.setattr(utils, "HASH_BLOCK_SIZE_MAX", 65_536)
+    data = data_file.read_bytes()
+
+    checksums = calculate_checksums(data_file, ("md5", "sha256"))
+
+    assert checksums == {
+        "md5": hashlib.md5(data).hexdigest(),
+        "sha256": hashlib.sha256(data).hexdigest(),
+    }
+
+
+def test_empty_file(tmp_path):
+    f = tmp_path / "empty.bin"
+    f.write_bytes(b"")
+    assert calculate_checksum(f) == hashlib.md5(b"").hexdigest()
+
+
+def test_hashes_without_posix_fadvise(data_file, monkeypatch):
+    monkeypatch.delattr(utils.os, "posix_fadvise", raising=False)
+    checksum = calculate_checksum(data_file)
+    assert checksum == hashlib.md5(data_file.read_bytes()).hexdigest()
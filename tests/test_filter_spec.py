@@ -0,0 +1,229 @@
+"""Unit tests for compiled additional_filters (oeleo.filters.FilterSpec)."""
+
+import io
+import os
+import subprocess
+from datetime import datetime, timedelta
+from pathlib import PurePosixPath
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from oeleo.connectors import SSHConnector
+from oeleo.filters import FILTERS, FilterSpec, additional_filtering, scan_files
+
+NOW = datetime.now().replace(microsecond=0)
+
+
+def _chained(paths, additional_filters):
+    # the filters applied one after the other, as additional_filtering used to
+    for filter_name, filter_val in additional_filters:
+        paths = filter(lambda p, f=FILTERS[filter_name], v=filter_val: f(p, v), paths)
+    return list(paths)
+
+
+@pytest.fixture
+def files(tmp_path):
+    names = ["run_a1.xyz", "run_b2.xyz", "cal_a3.xyz", "run_c4.txt", "old_a5.xyz"]
+    for age, name in enumerate(names):
+        f = tmp_path / name
+        f.write_text(name)
+        mtime = (NOW - timedelta(days=age)).timestamp()
+        os.utime(f, (mtime, mtime))
+    return tmp_path
+
+
+@pytest.mark.parametrize(
+    "additional_filters",
+    [
+        [("startswith", ["run", "cal"]), ("contains", "a")],
+        [("contains", ["1", "3"]), ("not_contains", "cal"), ("startswith", "run")],
+        [("excluded", ["run_a1.xyz"]), ("not_contains", ["b", "c"])],
+        [("callable", lambda name: name.endswith(".xyz")), ("startswith", [])],
+        [("not_before", NOW - timedelta(days=3)), ("startswith", "run")],
+        [
+            ("not_after", NOW - timedelta(days=1)),
+            ("not_before", NOW - timedelta(days=4)),
+            ("not_after", NOW - timedelta(hours=60)),
+        ],
+    ],
+)
+def test_filter_spec_matches_the_chained_filters(files, additional_filters):
+    paths = sorted(files.iterdir())
+    expected = _chained(paths, additional_filters)
+    assert list(additional_filtering(paths, additional_filters)) == expected
+    assert list(filter(FilterSpec(additional_filters), map(str, paths))) == [
+        str(p) for p in expected
+    ]
+
+
+def test_filter_spec_stats_after_name_filters_and_once(files):
+    spec = FilterSpec(
+        [
+            ("not_before", NOW - timedelta(days=10)),
+            ("not_after", NOW),
+            ("startswith", "run"),
+        ]
+    )
+    paths = sorted(files.iterdir())
+    with patch("oeleo.filters.os.stat", wraps=os.stat) as stat:
+        assert [p.name for p in paths if spec(p)] == [
+            "run_a1.xyz",
+            "run_b2.xyz",
+            "run_c4.txt",
+        ]
+    assert stat.call_count == 3
+
+    with patch("oeleo.filters.os.stat", wraps=os.stat) as stat:
+        assert len([p for p in scan_files(files) if spec(p)]) == 3
+    stat.assert_not_called()
+
+
+def test_filter_spec_rejects_unknown_filters():
+    with pytest.raises(KeyError):
+        FilterSpec([("endswith", ".xyz")])
+    assert not FilterSpec(None)
+    spec = FilterSpec([("excluded", ["a.xyz"])])
+    assert FilterSpec.of(spec) is spec
+
+
+@pytest.fixture
+def ssh_connector(monkeypatch):
+    monkeypatch.setenv("OELEO_PASSWORD", "secret")
+    monkeypatch.setenv("OELEO_USERNAME", "tester")
+    monkeypatch.setenv("OELEO_EXTERNAL_HOST", "localhost")
+    connector = SSHConnector(directory="/data", use_password=True, is_posix=True)
+    connector.c = MagicMock()
+    stdout = io.BytesIO(
+        b"1 1700000000.0 /data/run_a1.xyz\0"
+        b"1 1600000000.0 /data/run_b2.xyz\0"
+        b"1 1700000000.0 /data/cal_a3.xyz\0"
+    )
+    stdout.channel = MagicMock()
+    stdout.channel.recv_exit_status.return_value = 0
+    connector.c.client.exec_command.return_value = (
+        MagicMock(),
+        stdout,
+        io.BytesIO(b""),
+    )
+    return connector
+
+
+def test_ssh_connector_applies_additional_filters(ssh_connector):
+    additional_filters = [
+        ("not_before", datetime.fromtimestamp(1650000000)),
+        ("startswith", "run"),
+    ]
+    entries = ssh_connector.list_entries(".xyz", additional_filters=additional_filters)
+    assert [entry.path for entry in entries] == [PurePosixPath("/data/run_a1.xyz")]
+
+    ssh_connector.c.run.return_value = MagicMock(
+        ok=True, stdout="/data/run_a1.xyz\n/data/run_b2.xyz\n/data/cal_a3.xyz\n"
+    )
+    paths = ssh_connector.base_filter_sub_method(
+        ".xyz", additional_filters=[("contains", "_a")]
+    )
+    assert [p.name for p in paths] == ["run_a1.xyz", "cal_a3.xyz"]
+
+
+@pytest.fixture
+def local_ssh(monkeypatch, files):
+    monkeypatch.setenv("OELEO_PASSWORD", "secret")
+    monkeypatch.setenv("OELEO_USERNAME", "tester")
+    monkeypatch.setenv("OELEO_EXTERNAL_HOST", "localhost")
+    connector = SSHConnector(directory=files, use_password=True, is_posix=True)
+    commands = []
+
+    def run(cmd, **kwargs):
+        commands.append(cmd)
+        out = subprocess.run(["sh", "-c", cmd], capture_output=True, text=True)
+        return SimpleNamespace(ok=out.returncode == 0, stdout=out.stdout)
+
+    def exec_command(cmd):
+        commands.append(cmd)
+        proc = subprocess.Popen(
+            ["sh", "-c", cmd],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        channel = SimpleNamespace(recv_exit_status=proc.wait)
+        stdout = SimpleNamespace(read=proc.stdout.read, channel=channel)
+        return proc.stdin, stdout, proc.stderr
+
+    connector.c = MagicMock()
+    connector.c.run.side_effect = run
+    connector.c.client.exec_command.side_effect = exec_command
+    return connector, commands
+
+
+@pytest.mark.parametrize(
+    "additional_filters",
+    [
+        [("startswith", ["run", "c*l"]), ("not_contains", "b")],
+        [("contains", "a"), ("excluded", ["cal_a3.xyz", "old_a5.xyz"])],
+        [("startswith", []), ("callable", lambda name: True)],
+        [("callable", lambda name: "1" not in name)],
+        [
+            ("not_before", NOW - timedelta(days=3)),
+            ("not_after", NOW - timedelta(days=1)),
+        ],
+    ],
+)
+def test_ssh_listing_is_filtered_by_find(local_ssh, files, additional_filters):
+    connector, commands = local_ssh
+    expected = [p.name for p in _chained(sorted(files.iterdir()), additional_filters)]
+    expected = [name for name in expected if name.endswith((".xyz", ".txt"))]
+
+    paths = connector.base_filter_sub_method(
+        [".xyz", ".txt"], additional_filters=additional_filters
+    )
+    assert sorted(p.name for p in paths) == expected
+    entries = connector.list_entries(
+        [".xyz", ".txt"], additional_filters=additional_filters
+    )
+    assert sorted(entry.path.name for entry in entries) == expected
+
+
+def test_ssh_listing_without_gnu_find_filters_mtimes_locally(local_ssh, files):
+    connector, commands = local_ssh
+    exec_command = connector.c.client.exec_command.side_effect
+
+    def busybox_exec_command(cmd):
+        commands.append(cmd)
+        if "-printf" in cmd or "-newermt" in cmd:
+            cmd = "exit 1"
+        return exec_command(cmd)
+
+    connector.c.client.exec_command.side_effect = busybox_exec_command
+    additional_filters = [
+        ("not_before", NOW - timedelta(days=3)),
+        ("not_after", NOW - timedelta(days=1)),
+        ("startswith", ["run", "old"]),
+    ]
+    expected = [p.name for p in _chained(sorted(files.iterdir()), additional_filters)]
+
+    paths = connector.base_filter_sub_method(
+        [".xyz", ".txt"], additional_filters=additional_filters
+    )
+    assert sorted(p.name for p in paths) == expected == ["run_b2.xyz", "run_c4.txt"]
+    assert "-exec stat -c" in commands[-1]
+    assert "-newermt" not in commands[-1]
+
+
+def test_ssh_find_predicates(local_ssh):
+    connector, commands = local_ssh
+    connector.list_entries(
+        ".xyz",
+        additional_filters=[
+            ("startswith", ["run", "c*l"]),
+            ("excluded", ["old.xyz"]),
+            ("not_before", datetime.fromtimestamp(1700000000.5)),
+            ("callable", str.isalpha),
+        ],
+    )
+    assert (
+        r"-name '*.xyz' \( -name 'run*' -o -name 'c\*l*' \) ! -name old.xyz "
+        "-newermt @1699999999 -type f"
+    ) in commands[-1]
@@ -0,0 +1,107 @@
+"""Unit tests for the hash algorithm registry and per-row hash_algo bookkeeping."""
+
+import hashlib
+from pathlib import PurePosixPath
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from oeleo.checkers import ChecksumChecker
+from oeleo.connectors import SSHConnector
+from oeleo.utils import (
+    HASH_ALGORITHMS,
+    calculate_checksum,
+    calculate_checksums,
+    resolve_hash_algo,
+)
+from oeleo.workers import simple_worker
+
+
+def test_resolve_hash_algo(monkeypatch):
+    monkeypatch.delenv("OELEO_HASH_ALGO", raising=False)
+    assert resolve_hash_algo() == "md5"
+    monkeypatch.setenv("OELEO_HASH_ALGO", "BLAKE2B")
+    assert resolve_hash_algo() == "blake2b"
+    assert resolve_hash_algo("sha256") == "sha256"
+    with pytest.raises(ValueError):
+        resolve_hash_algo("crc32")
+
+
+def test_calculate_checksums_reads_once_for_several_algorithms(local_file_tmp_path):
+    data = local_file_tmp_path.read_bytes()
+    checksums = calculate_checksums(local_file_tmp_path, ("md5", "sha256", "blake2b"))
+    assert checksums == {
+        "md5": hashlib.md5(data).hexdigest(),
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "blake2b": hashlib.blake2b(data).hexdigest(),
+    }
+    assert calculate_checksum(local_file_tmp_path) == pytest.checksum_local_file_tmp_path
+    assert set(HASH_ALGORITHMS) >= {"md5", "sha1", "sha256", "blake2b"}
+
+
+def test_ssh_checksums_use_the_matching_remote_command(monkeypatch):
+    monkeypatch.setenv("OELEO_PASSWORD", "secret")
+    monkeypatch.setenv("OELEO_USERNAME", "tester")
+    monkeypatch.setenv("OELEO_EXTERNAL_HOST", "localhost")
+    connector = SSHConnector(directory="/data", use_password=True)
+    connector.c = MagicMock()
+    connector.c.run.return_value.ok = True
+    connector.c.run.return_value.stdout = "abc  /data/a.xyz\n"
+
+    checksums = connector.calculate_checksums([PurePosixPath("a.xyz")], algo="blake2b")
+
+    assert connector.c.run.call_args.args[0].startswith("b2sum -- ")
+    assert checksums == {PurePosixPath("a.xyz"): "abc"}
+    connector.calculate_checksum(PurePosixPath("a.xyz"), algo="sha256")
+    assert connector.c.run.call_args.args[0].startswith("sha256sum ")
+
+
+@pytest.fixture
+def md5_worker(db_tmp_path, local_tmp_path, external_tmp_path, monkeypatch):
+    monkeypatch.delenv("OELEO_HASH_ALGO", raising=False)
+    worker = simple_worker(
+        db_name=db_tmp_path,
+        base_directory_from=local_tmp_path,
+        base_directory_to=external_tmp_path,
+    )
+    worker.connect_to_db()
+    worker.filter_local()
+    worker.run()
+    return worker
+
+
+def _records(worker):
+    return {r.local_name: r for r in worker.bookkeeper.db_model.select()}
+
+
+def test_md5_rows_migrate_without_copying_again(md5_worker, local_tmp_path):
+    worker = md5_worker
+    assert {r.hash_algo for r in _records(worker).values()} == {"md5"}
+    # rows written before hash_algo existed
+    worker.bookkeeper.db_model.update(hash_algo=None).execute()
+
+    worker.checker = ChecksumChecker(mode="full", algo="sha256")
+    worker.filter_local()
+    with patch.object(worker.external_connector, "move_func") as move:
+        worker.run()
+    move.assert_not_called()
+
+    sha256 = hashlib.sha256((local_tmp_path / "filename1.xyz").read_bytes())
+    for record in _records(worker).values():
+        assert record.hash_algo == "sha256"
+        assert record.checksum == sha256.hexdigest()
+
+
+def test_md5_row_with_changed_content_is_copied(md5_worker, local_tmp_path):
+    worker = md5_worker
+    (local_tmp_path / "filename1.xyz").write_text("new content")
+
+    worker.checker = ChecksumChecker(algo="sha256")
+    worker.filter_local()
+    worker.run()
+
+    record = _records(worker)["filename1.xyz"]
+    assert record.hash_algo == "sha256"
+    assert record.checksum == hashlib.sha256(b"new content").hexdigest()
+    # untouched files keep their md5 rows in stat mode
+    assert _records(worker)["filename2.xyz"].hash_algo == "md5"
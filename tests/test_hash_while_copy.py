@@ -0,0 +1,144 @@
+"""Unit tests for taking the checksum of changed files during their transfer."""
+
+import hashlib
+from pathlib import PurePosixPath
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from oeleo.connectors import SSHConnector
+from oeleo.movers import copy_file
+from oeleo.utils import HashSink
+from oeleo.workers import resolve_hash_while_copy, simple_worker
+
+
+def test_resolve_hash_while_copy(monkeypatch):
+    monkeypatch.delenv("OELEO_HASH_WHILE_COPY", raising=False)
+    assert resolve_hash_while_copy() is False
+    monkeypatch.setenv("OELEO_HASH_WHILE_COPY", "yes")
+    assert resolve_hash_while_copy() is True
+    assert resolve_hash_while_copy(False) is False
+
+
+def test_copy_file_feeds_sink_and_resets_per_attempt(tmp_path):
+    src = tmp_path / "a.xyz"
+    src.write_bytes(b"0123456789" * 1000)
+    sink = HashSink()
+    sink.update(b"left over from a failed attempt")
+
+    copy_file(src, tmp_path / "b.xyz", sink)
+
+    assert (tmp_path / "b.xyz").read_bytes() == src.read_bytes()
+    assert sink.size == 10_000
+    assert sink.hexdigest() == hashlib.md5(src.read_bytes()).hexdigest()
+
+
+def test_ssh_put_file_feeds_sink(monkeypatch, tmp_path):
+    monkeypatch.setenv("OELEO_PASSWORD", "secret")
+    monkeypatch.setenv("OELEO_USERNAME", "tester")
+    monkeypatch.setenv("OELEO_EXTERNAL_HOST", "localhost")
+    connector = SSHConnector(directory="/data", use_password=True, sftp_buffer_size=4)
+    connector.c = MagicMock()
+    connector._sftp_clients[id(connector.c)] = MagicMock()
+    f = tmp_path / "data.xyz"
+    f.write_bytes(b"0123456789")
+    sink = HashSink()
+
+    assert connector.move_func(f, PurePosixPath("/data/data.xyz"), hash_sink=sink)
+    assert sink.hexdigest() == hashlib.md5(b"0123456789").hexdigest()
+
+
+@pytest.fixture
+def hashing_worker(db_tmp_path, local_tmp_path, external_tmp_path):
+    worker = simple_worker(
+        db_name=db_tmp_path,
+        base_directory_from=local_tmp_path,
+        base_directory_to=external_tmp_path,
+        hash_while_copy=True,
+    )
+    worker.connect_to_db()
+    return worker
+
+
+def _records(worker):
+    return {r.local_name: r for r in worker.bookkeeper.db_model.select()}
+
+
+def test_run_hashes_changed_files_only_during_copy(
+    hashing_worker, local_tmp_path, external_tmp_path
+):
+    worker = hashing_worker
+    worker.filter_local()
+    with patch("oeleo.checkers.calculate_checksum") as calc:
+        worker.run()
+    calc.assert_not_called()
+
+    assert (external_tmp_path / "filename1.xyz").exists()
+    for record in _records(worker).values():
+        assert record.checksum == pytest.checksum_local_file_tmp_path
+        assert record.code == 1
+
+    # unchanged files are neither hashed nor copied again
+    worker.filter_local()
+    with patch.object(worker.external_connector, "move_func") as move:
+        worker.run()
+    move.assert_not_called()
+
+    changed = local_tmp_path / "filename2.xyz"
+    changed.write_text("new content")
+    worker.filter_local()
+    with patch("oeleo.checkers.calculate_checksum") as calc:
+        worker.run()
+    calc.assert_not_called()
+    assert (external_tmp_path / "filename2.xyz").read_text() == "new content"
+    records = _records(worker)
+    assert records[changed.name].checksum == hashlib.md5(b"new content").hexdigest()
+
+
+def test_run_hashes_file_when_connector_ignores_sink(hashing_worker):
+    worker = hashing_worker
+    worker.external_connector.move_func = MagicMock(return_value=True)
+    worker.filter_local()
+
+    worker.run()
+
+    for record in _records(worker).values():
+        assert record.checksum == pytest.checksum_local_file_tmp_path
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {"hash_while_copy": False},
+        {"hash_while_copy": True},
+        {"hash_while_copy": True, "batch_file_size": 1_000},
+    ],
+)
+def test_run_does_not_copy_frozen_files(
+    db_tmp_path, local_tmp_path, external_tmp_path, options
+):
+    worker = simple_worker(
+        db_name=db_tmp_path,
+        base_directory_from=local_tmp_path,
+        base_directory_to=external_tmp_path,
+        **options,
+    )
+    worker.connect_to_db()
+    worker.filter_local()
+    worker.run()
+    frozen = _records(worker)["filename1.xyz"]
+    frozen.code = 2
+    frozen.save()
+
+    (local_tmp_path / "filename1.xyz").write_text("new content")
+    worker.filter_local()
+    connector = worker.external_connector
+    with patch.object(connector, "move_func") as move, patch.object(
+        connector, "move_many", return_value=[]
+    ) as move_many:
+        worker.run()
+    move.assert_not_called()
+    move_many.assert_not_called()
+    record = _records(worker)["filename1.xyz"]
+    assert record.code == 2
+    assert record.checksum == pytest.checksum_local_file_tmp_path
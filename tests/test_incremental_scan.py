@@ -0,0 +1,213 @@
+"""Unit tests for incremental scans of local directories (oeleo.cache.DirectoryIndex)."""
+
+import os
+import sqlite3
+import time
+
+import pytest
+
+from oeleo.cache import (
+    DirectoryIndex,
+    make_directory_index,
+    resolve_full_scan_interval,
+)
+from oeleo.filters import scan_files
+from oeleo.models import DirectoryState, SimpleDbHandler
+from oeleo.workers import simple_worker
+
+HOUR = 3_600
+
+
+def _age(directory, seconds=2 * HOUR):
+    """Set the mtime of directory and everything below it back in time."""
+    then = time.time() - seconds
+    for current, _, files in os.walk(directory):
+        for path in [current, *(os.path.join(current, f) for f in files)]:
+            os.utime(path, (then, then))
+
+
+def test_resolve_incremental_scan_settings(monkeypatch):
+    monkeypatch.delenv("OELEO_INCREMENTAL_SCAN", raising=False)
+    monkeypatch.delenv("OELEO_FULL_SCAN_INTERVAL", raising=False)
+    assert make_directory_index() is None
+    assert resolve_full_scan_interval() == 86_400
+    monkeypatch.setenv("OELEO_INCREMENTAL_SCAN", "yes")
+    monkeypatch.setenv("OELEO_FULL_SCAN_INTERVAL", "600")
+    assert make_directory_index().full_scan_interval == 600
+    assert make_directory_index(False) is None
+    with pytest.raises(ValueError):
+        resolve_full_scan_interval(-1)
+
+
+def test_unchanged_directories_are_not_listed(local_tmp_path_with_subdirs):
+    d = local_tmp_path_with_subdirs
+    _age(d)
+    index = DirectoryIndex(full_scan_interval=HOUR)
+    assert len(list(scan_files(d, ".xyz", recursive=True, index=index))) == 4
+    assert index.stats == {"full": True, "listed": 3, "skipped": 0, "directories": 3}
+
+    assert list(scan_files(d, ".xyz", recursive=True, index=index)) == []
+    assert index.stats["skipped"] == 3
+
+    (d / "subdir2" / "new").mkdir()
+    (d / "subdir2" / "new" / "deep.xyz").write_text("new")
+    found = list(scan_files(d, ".xyz", recursive=True, index=index))
+    assert sorted(p.name for p in found) == ["deep.xyz", "filename2.xyz"]
+    assert (index.listed, index.skipped) == (2, 2)
+
+
+def test_recently_modified_directories_are_always_listed(local_tmp_path_with_subdirs):
+    d = local_tmp_path_with_subdirs
+    _age(d)
+    index = DirectoryIndex(full_scan_interval=HOUR)
+    list(scan_files(d, ".xyz", recursive=True, index=index))
+
+    # an instrument writing to a file does not change the mtime of its directory
+    now = time.time() - 60
+    os.utime(d / "subdir1", (now, now))
+    list(scan_files(d, ".xyz", recursive=True, index=index))
+    found = list(scan_files(d, ".xyz", recursive=True, index=index))
+    assert [p.name for p in found] == ["filename1.xyz"]
+
+    index.last_full_scan -= HOUR
+    assert len(list(scan_files(d, ".xyz", recursive=True, index=index))) == 4
+    assert index.full
+
+
+def test_directories_with_recently_modified_files_are_always_listed(
+    local_tmp_path_with_subdirs,
+):
+    d = local_tmp_path_with_subdirs
+    _age(d)
+    growing = d / "subdir1" / "filename1.xyz"
+    now = time.time() - 60
+    os.utime(growing, (now, now))
+    index = DirectoryIndex(full_scan_interval=HOUR)
+    list(scan_files(d, ".xyz", recursive=True, index=index))
+
+    # appending does not change the mtime of the (old) directory
+    with open(growing, "a") as f:
+        f.write("more")
+    found = list(scan_files(d, ".xyz", recursive=True, index=index))
+    assert [p.name for p in found] == ["filename1.xyz"]
+    assert (index.listed, index.skipped) == (1, 2)
+
+    _age(d)
+    list(scan_files(d, ".xyz", recursive=True, index=index))
+    assert list(scan_files(d, ".xyz", recursive=True, index=index)) == []
+
+
+def test_directory_states_of_an_old_db_are_migrated(tmp_path):
+    db_path = tmp_path / "old.db"
+    con = sqlite3.connect(db_path)
+    con.execute(
+        "CREATE TABLE directorystate (id INTEGER NOT NULL PRIMARY KEY, "
+        "path VARCHAR(255) NOT NULL, parent VARCHAR(255), mtime_ns BIGINT NOT NULL, "
+        "entries INTEGER NOT NULL, scanned_date DATETIME NOT NULL)"
+    )
+    con.execute(
+        "INSERT INTO directorystate (path, parent, mtime_ns, entries, scanned_date) "
+        "VALUES ('/data/a', '/data', 1, 2, '2024-01-01 00:00:00')"
+    )
+    con.commit()
+    con.close()
+
+    SimpleDbHandler(str(db_path)).initialize_db()
+    index = DirectoryIndex()
+    index.load()
+    assert index._states["/data/a"]["newest_ns"] == 0
+
+
+def test_directory_states_round_trip(local_tmp_path_with_subdirs):
+    d = local_tmp_path_with_subdirs
+    SimpleDbHandler(":memory:").initialize_db()
+    _age(d)
+    index = DirectoryIndex(full_scan_interval=HOUR)
+    list(scan_files(d, ".xyz", recursive=True, index=index))
+    index.flush()
+    assert DirectoryState.select().count() == 3
+    state = DirectoryState.get(DirectoryState.path == str(d / "subdir1"))
+    assert (state.parent, state.entries) == (str(d), 2)
+
+    for f in (d / "subdir2").iterdir():
+        f.unlink()
+    (d / "subdir2").rmdir()
+    then = time.time() - 2 * HOUR
+    os.utime(d, (then, then))
+    restored = DirectoryIndex(full_scan_interval=HOUR)
+    restored.load()
+    restored.last_full_scan = time.time()
+    found = scan_files(d, ".xyz", recursive=True, index=restored)
+    assert sorted(found) == [d / "filename1.xyz", d / "filename2.xyz"]
+    restored.flush()
+    assert {s.path for s in DirectoryState.select()} == {str(d), str(d / "subdir1")}
+
+
+def test_worker_scans_incrementally(local_tmp_path_with_subdirs, external_tmp_path):
+    d = local_tmp_path_with_subdirs
+    _age(d)
+    worker = simple_worker(
+        db_name=":memory:",
+        base_directory_from=d,
+        base_directory_to=external_tmp_path,
+        include_subdirs=True,
+        incremental_scan=True,
+        full_scan_interval=HOUR,
+    )
+    worker.connect_to_db()
+    assert len(worker.filter_local()) == 4
+    worker.run()
+    assert worker.filter_local() == []
+    assert DirectoryState.select().count() == 3
+
+
+def test_check_lists_every_directory(local_tmp_path_with_subdirs, external_tmp_path):
+    d = local_tmp_path_with_subdirs
+    worker = simple_worker(
+        db_name=":memory:",
+        base_directory_from=d,
+        base_directory_to=external_tmp_path,
+        include_subdirs=True,
+        incremental_scan=True,
+        full_scan_interval=HOUR,
+    )
+    worker.connect_to_db()
+    worker.filter_local()
+    worker.run()
+    _age(d)
+    worker.filter_local()
+    assert worker.filter_local() == []
+
+    worker.check()
+    assert worker.number_of_local_files == 4
+    assert worker.directory_index.full
+
+
+def test_directories_of_failed_files_are_listed_again(
+    local_tmp_path_with_subdirs, external_tmp_path
+):
+    d = local_tmp_path_with_subdirs
+    _age(d)
+    worker = simple_worker(
+        db_name=":memory:",
+        base_directory_from=d,
+        base_directory_to=external_tmp_path,
+        include_subdirs=True,
+        incremental_scan=True,
+        full_scan_interval=HOUR,
+    )
+    worker.connect_to_db()
+    worker.filter_local()
+    failing = d / "subdir1" / "filename1.xyz"
+    move_func = worker.external_connector.move_func
+    worker.external_connector.move_func = lambda path, to, **kwargs: (
+        path != failing and move_func(path, to, **kwargs)
+    )
+    worker.run()
+    assert worker.directory_index.pending == {str(d / "subdir1")}
+
+    worker.external_connector.move_func = move_func
+    assert worker.filter_local() == [failing]
+    worker.run()
+    assert (external_tmp_path / "filename1.xyz").exists()
+    assert worker.filter_local() == []
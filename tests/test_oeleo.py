@@ -338,6 +338,31 @@ def test_simple_worker_reconnect_from_env(
     assert worker_kw.reconnect is False
 
 
+def test_worker_factories_pass_worker_kwargs_on(
+    monkeypatch, db_tmp_path, local_tmp_path, external_tmp_path
+):
+    monkeypatch.setenv("OELEO_HASH_WORKERS", "3")
+    worker = simple_worker(
+        db_name=db_tmp_path,
+        base_directory_from=local_tmp_path,
+        base_directory_to=external_tmp_path,
+        max_workers=2,
+        append_transfer=True,
+        checksum_cache_size=0,
+    )
+    assert (worker.max_workers, worker.hash_workers) == (2, 3)
+    assert worker.append_transfer is True
+    assert worker.checksum_cache is None
+
+    with pytest.raises(TypeError):
+        simple_worker(
+            db_name=db_tmp_path,
+            base_directory_from=local_tmp_path,
+            base_directory_to=external_tmp_path,
+            max_worker=2,
+        )
+
+
 def test_local_ensure_connection_ok_and_missing(tmp_path):
     dest = tmp_path / "to"
     dest.mkdir()
@@ -0,0 +1,129 @@
+"""Unit tests for the parallel hashing stage (map_completed / hash_workers)."""
+
+import threading
+
+import pytest
+
+from oeleo.workers import map_completed, resolve_hash_workers, simple_worker
+
+
+def test_resolve_hash_workers(monkeypatch):
+    monkeypatch.delenv("OELEO_HASH_WORKERS", raising=False)
+    assert resolve_hash_workers() == 1
+    monkeypatch.setenv("OELEO_HASH_WORKERS", "4")
+    assert resolve_hash_workers() == 4
+    assert resolve_hash_workers(2) == 2
+    with pytest.raises(ValueError):
+        resolve_hash_workers(0)
+
+
+def test_map_completed_yields_in_completion_order():
+    release = threading.Event()
+
+    def work(i):
+        if i == 0:
+            assert release.wait(5)  # item 0 only finishes after item 1 is yielded
+        return i * 10
+
+    results = map_completed(work, [0, 1], max_workers=2)
+    first = next(results)
+    release.set()
+    assert [first, *results] == [(1, 10), (0, 0)]
+
+
+def test_map_completed_bounds_items_in_flight():
+    lock = threading.Lock()
+    both_running = threading.Barrier(2, timeout=5)
+    running = []
+    peak = []
+
+    def work(i):
+        with lock:
+            running.append(i)
+            peak.append(len(running))
+        both_running.wait()  # every call overlaps with one on the other thread
+        with lock:
+            running.remove(i)
+        return i
+
+    pulled = []
+
+    def items():
+        for i in range(20):
+            pulled.append(i)
+            yield i
+
+    results = map_completed(work, items(), max_workers=2, max_in_flight=3)
+    first = next(results)
+    assert len(pulled) <= 3
+    rest = list(results)
+    assert sorted(i for i, _ in [first, *rest]) == list(range(20))
+    assert max(peak) == 2
+
+
+def test_map_completed_raises_and_cancels_the_rest():
+    started = []
+
+    def work(i):
+        started.append(i)
+        if i == 0:
+            raise OSError("unreadable")
+        return i
+
+    with pytest.raises(OSError):
+        list(map_completed(work, range(100), max_workers=1, max_in_flight=4))
+    assert len(started) <= 4
+
+
+@pytest.fixture
+def many_files(local_tmp_path):
+    for i in range(30):
+        (local_tmp_path / f"extra{i}.xyz").write_text(f"extra {i}")
+    return local_tmp_path
+
+
+def _worker(db_tmp_path, local_tmp_path, external_tmp_path, hash_workers):
+    worker = simple_worker(
+        db_name=db_tmp_path,
+        base_directory_from=local_tmp_path,
+        base_directory_to=external_tmp_path,
+        hash_workers=hash_workers,
+    )
+    worker.connect_to_db()
+    worker.filter_local()
+    return worker
+
+
+def test_check_hashes_in_threads(db_tmp_path, many_files, external_tmp_path):
+    (external_tmp_path / "filename1.xyz").write_text("some random strings")
+    (external_tmp_path / "extra1.xyz").write_text("out of sync")
+    worker = _worker(db_tmp_path, many_files, external_tmp_path, hash_workers=4)
+
+    threads = set()
+    check_local = worker._check_local
+
+    def recording_check_local(f, **kwargs):
+        threads.add(threading.current_thread().name)
+        return check_local(f, **kwargs)
+
+    worker._check_local = recording_check_local
+    worker.check(update_db=True)
+
+    assert all(name.startswith("oeleo-hash") for name in threads)
+    assert worker.number_of_local_files == 32
+    assert worker.number_of_external_duplicates == 2
+    assert worker.number_of_duplicates_out_of_sync == 31
+    assert worker.bookkeeper.db_model.select().count() == 32
+
+
+def test_run_hashes_ahead_of_serial_transfers(
+    db_tmp_path, many_files, external_tmp_path
+):
+    worker = _worker(db_tmp_path, many_files, external_tmp_path, hash_workers=3)
+    worker.run()
+
+    copied = {f.name for f in external_tmp_path.iterdir()}
+    assert copied == {f.name for f in worker.file_names}
+    for record in worker.bookkeeper.db_model.select():
+        assert record.code == 1
+        assert record.checksum is not None
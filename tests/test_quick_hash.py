@@ -0,0 +1,148 @@
+"""Unit tests for the quick hash tier of ChecksumChecker ('quick' mode)."""
+
+import datetime
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import oeleo.checkers
+from oeleo.checkers import ChecksumChecker, resolve_full_verify_days
+from oeleo.connectors import SSHConnector
+from oeleo.models import SimpleDbHandler
+from oeleo.utils import calculate_quick_hash
+
+SAMPLE = 16
+
+
+@pytest.fixture
+def big_file(tmp_path):
+    f = tmp_path / "image.raw"
+    f.write_bytes(bytes(range(256)) * 4)  # 1024 bytes, well above 3 samples
+    return f
+
+
+def test_quick_hash_covers_size_and_three_samples(big_file):
+    data = big_file.read_bytes()
+    middle = (len(data) - SAMPLE) // 2
+    expected = hashlib.md5(
+        b"1024\n" + data[:SAMPLE] + data[middle : middle + SAMPLE] + data[-SAMPLE:]
+    ).hexdigest()
+    assert calculate_quick_hash(big_file, "md5", SAMPLE) == expected
+
+
+def test_resolve_full_verify_days(monkeypatch):
+    monkeypatch.delenv("OELEO_FULL_VERIFY_DAYS", raising=False)
+    assert resolve_full_verify_days() == 7
+    monkeypatch.setenv("OELEO_FULL_VERIFY_DAYS", "0.5")
+    assert resolve_full_verify_days() == 0.5
+    with pytest.raises(ValueError):
+        resolve_full_verify_days(-1)
+
+
+@pytest.mark.skipif(
+    not sys.platform.startswith("linux") or shutil.which("md5sum") is None,
+    reason="needs a POSIX shell with GNU coreutils",
+)
+def test_ssh_quick_hashes_match_local_ones(tmp_path, monkeypatch):
+    monkeypatch.setenv("OELEO_PASSWORD", "secret")
+    monkeypatch.setenv("OELEO_USERNAME", "tester")
+    monkeypatch.setenv("OELEO_EXTERNAL_HOST", "localhost")
+    sizes = {"empty.raw": 0, "small.raw": 20, "odd name.raw": 1001}
+    for name, size in sizes.items():
+        (tmp_path / name).write_bytes(os.urandom(size))
+
+    def run(cmd, **kwargs):
+        out = subprocess.run(["sh", "-c", cmd], capture_output=True, text=True)
+        return SimpleNamespace(ok=out.returncode == 0, stdout=out.stdout)
+
+    connector = SSHConnector(directory=tmp_path, use_password=True, is_posix=True)
+    connector.c = MagicMock()
+    connector.c.run.side_effect = run
+    names = [Path(name) for name in [*sizes, "missing.raw"]]
+
+    quick_hashes = connector.calculate_quick_hashes(names, sample_size=SAMPLE)
+
+    assert quick_hashes == {
+        Path(name): calculate_quick_hash(tmp_path / name, "md5", SAMPLE)
+        for name in sizes
+    }
+
+
+@pytest.fixture
+def quick_record(db_tmp_path, big_file):
+    bookkeeper = SimpleDbHandler(db_tmp_path)
+    bookkeeper.initialize_db()
+    record = bookkeeper.register(big_file)
+    checker = ChecksumChecker(mode="quick", quick_size=SAMPLE)
+    checks = checker.check(big_file, record=record)
+    bookkeeper.update_record("/to/image.raw", record=record, **checks)
+    return checker, record, big_file
+
+
+def _touch(f):
+    st = f.stat()
+    os.utime(f, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+
+def test_quick_hash_is_stored_with_the_record(quick_record):
+    _, record, big_file = quick_record
+    assert record.quick_hash == calculate_quick_hash(big_file, "md5", SAMPLE)
+    assert record.verified_date is not None
+
+
+def test_touched_file_with_same_quick_hash_is_not_read(quick_record):
+    checker, record, big_file = quick_record
+    _touch(big_file)
+    with patch.object(oeleo.checkers, "calculate_checksum") as calculate:
+        checks = checker.check(big_file, record=record)
+    calculate.assert_not_called()
+    assert checks["checksum"] == record.checksum
+    assert "verified_date" not in checks
+
+
+def test_changed_sample_is_hashed_in_full(quick_record):
+    checker, record, big_file = quick_record
+    data = bytearray(big_file.read_bytes())
+    data[0] ^= 0xFF
+    big_file.write_bytes(bytes(data))
+    checks = checker.check(big_file, record=record)
+    assert checks["checksum"] == hashlib.md5(bytes(data)).hexdigest()
+    assert checks["quick_hash"] != record.quick_hash
+
+
+def test_full_verification_when_due(quick_record):
+    checker, record, big_file = quick_record
+    record.verified_date = datetime.datetime.now() - datetime.timedelta(days=8)
+    with patch.object(
+        oeleo.checkers, "calculate_checksum", return_value=record.checksum
+    ) as calculate:
+        checks = checker.check(big_file, record=record)
+    calculate.assert_called_once()
+    assert "verified_date" in checks
+
+
+def test_check_many_settles_remote_files_by_quick_hash():
+    checker = ChecksumChecker(mode="quick", quick_size=SAMPLE)
+    connector = MagicMock(is_local=False)
+    connector.calculate_quick_hashes.return_value = {Path("a.raw"): "q"}
+    connector.calculate_checksums.return_value = {Path("b.raw"): "c"}
+
+    results = checker.check_many(
+        [Path("a.raw"), Path("b.raw")],
+        connector=connector,
+        quick_hashes={Path("a.raw"): "q", Path("b.raw"): None},
+    )
+
+    assert connector.calculate_quick_hashes.call_args.args[0] == [Path("a.raw")]
+    assert connector.calculate_checksums.call_args.args[0] == [Path("b.raw")]
+    assert results == {
+        Path("a.raw"): {"quick_hash": "q", "hash_algo": "md5"},
+        Path("b.raw"): {"checksum": "c", "hash_algo": "md5"},
+    }
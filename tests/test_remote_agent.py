@@ -0,0 +1,130 @@
+"""Unit tests for the remote agent (oeleo.agent) used by SSHConnector."""
+
+import subprocess
+import sys
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+from invoke import UnexpectedExit
+
+from oeleo.agent import AgentConnection, RemoteAgent
+from oeleo.connectors import SSHConnector
+
+
+class _LocalExec:
+    """Runs exec_command locally, with python3 replaced by the running python."""
+
+    def __init__(self):
+        self.commands = []
+        self.processes = []
+
+    def __call__(self, cmd):
+        self.commands.append(cmd)
+        if cmd.startswith("python3 "):
+            cmd = f"{sys.executable} {cmd[8:]}"
+        proc = subprocess.Popen(
+            ["sh", "-c", cmd],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+        )
+        self.processes.append(proc)
+        channel = SimpleNamespace(
+            settimeout=lambda timeout: None, close=proc.stdout.close
+        )
+        stdout = SimpleNamespace(readline=proc.stdout.readline, channel=channel)
+        return proc.stdin, stdout, proc.stderr
+
+
+def _connection(exec_command):
+    c = MagicMock()
+    c.client.exec_command.side_effect = exec_command
+    c.run.side_effect = lambda cmd, **kwargs: SimpleNamespace(
+        ok=True, stdout="plain exec\n", stderr=""
+    )
+    return c
+
+
+@pytest.fixture
+def agent():
+    local_exec = _LocalExec()
+    agent = RemoteAgent.start(_connection(local_exec))
+    yield agent
+    agent.close()
+    for proc in local_exec.processes:
+        proc.wait(5)
+
+
+def test_agent_runs_commands(agent):
+    assert agent.run("echo hello; echo oops >&2; exit 3") == (3, "hello\n", "oops\n")
+
+
+def test_agent_pipelines_many_commands(agent):
+    replies = agent.run_many([f"echo {i}" for i in range(100)])
+    assert [stdout for _, stdout, _ in replies] == [f"{i}\n" for i in range(100)]
+
+
+def test_agent_does_not_start_without_python():
+    c = _connection(lambda cmd: _LocalExec()("exit 127"))
+    assert RemoteAgent.start(c) is None
+
+
+def test_agent_connection_behaves_like_fabric(agent):
+    c = AgentConnection(MagicMock(), agent)
+    assert c.run("printf 'a b'", hide=True).stdout == "a b"
+    assert not c.run("false", warn=True).ok
+    with pytest.raises(UnexpectedExit):
+        c.run("false")
+
+
+def test_agent_connection_falls_back_to_plain_exec():
+    broken = MagicMock()
+    broken.run_many.side_effect = EOFError("the remote agent has stopped")
+    connection = MagicMock()
+    connection.run.return_value = SimpleNamespace(ok=True, stdout="plain")
+    c = AgentConnection(connection, broken)
+
+    assert c.run("true").stdout == "plain"
+    assert c.agent is None
+    broken.close.assert_called_once()
+
+
+@pytest.fixture
+def ssh_env(monkeypatch):
+    monkeypatch.setenv("OELEO_PASSWORD", "secret")
+    monkeypatch.setenv("OELEO_USERNAME", "tester")
+    monkeypatch.setenv("OELEO_EXTERNAL_HOST", "localhost")
+    monkeypatch.delenv("OELEO_REMOTE_AGENT", raising=False)
+
+
+def test_ssh_connector_runs_commands_through_the_agent(ssh_env, tmp_path):
+    local_exec = _LocalExec()
+    connector = SSHConnector(
+        directory=tmp_path, use_password=True, is_posix=True, remote_agent=True
+    )
+    connector.c = _connection(local_exec)
+    dirs = [tmp_path / "a", tmp_path / "b" / "c"]
+
+    connector.ensure_dirs(dirs)
+    connector.ensure_connection()
+
+    assert all(d.is_dir() for d in dirs)
+    connector.c.run.assert_not_called()
+    assert len(local_exec.commands) == 1  # one exec channel for the agent
+
+    connector._discard(connector.c)
+    for proc in local_exec.processes:
+        proc.wait(5)
+
+
+def test_ssh_connector_uses_plain_exec_without_agent(ssh_env, tmp_path):
+    connector = SSHConnector(
+        directory=tmp_path, use_password=True, is_posix=True, remote_agent=True
+    )
+    connector.c = _connection(lambda cmd: _LocalExec()("exit 127"))
+    connector.ensure_dirs([tmp_path / "a"])
+    connector.ensure_dirs([tmp_path / "b"])
+
+    assert connector.c.run.call_count == 2
+    assert connector.c.client.exec_command.call_count == 1
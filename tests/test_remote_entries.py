@@ -0,0 +1,212 @@
+"""Unit tests for listings with metadata (Connector.list_entries / RemoteEntry)."""
+
+import io
+import os
+import subprocess
+from datetime import datetime
+from pathlib import PurePosixPath
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import pytest
+
+from oeleo.checkers import ChecksumChecker
+from oeleo.connectors import (
+    LocalConnector,
+    OeleoConnectionError,
+    RemoteEntry,
+    SSHConnector,
+)
+from oeleo.workers import Worker
+
+
+class _ChunkedStream(io.BytesIO):
+    """Returns at most `step` bytes per read, like data trickling in over ssh."""
+
+    def __init__(self, data, step, status=0):
+        super().__init__(data)
+        self.step = step
+        self.channel = MagicMock()
+        self.channel.recv_exit_status.return_value = status
+
+    def read(self, size=-1):
+        return super().read(min(size, self.step))
+
+
+@pytest.fixture
+def ssh_connector(monkeypatch):
+    monkeypatch.setenv("OELEO_PASSWORD", "secret")
+    monkeypatch.setenv("OELEO_USERNAME", "tester")
+    monkeypatch.setenv("OELEO_EXTERNAL_HOST", "localhost")
+    connector = SSHConnector(directory="/data out", use_password=True, is_posix=True)
+    connector.c = MagicMock()
+    return connector
+
+
+def _serve(connector, output, step=7, status=0):
+    stdout = _ChunkedStream(output, step, status=status)
+    connector.c.client.exec_command.return_value = (
+        MagicMock(),
+        stdout,
+        io.BytesIO(b""),
+    )
+
+
+def test_ssh_list_entries_parses_streamed_find_output(ssh_connector):
+    output = (
+        b"12 1700000000.5000000000 /data out/a.xyz\0"
+        b"0 1700000001.0000000000 /data out/sub dir/b c.xyz\0"
+    )
+    _serve(ssh_connector, output, step=5)
+
+    entries = ssh_connector.list_entries(".xyz")
+
+    cmd = ssh_connector.c.client.exec_command.call_args.args[0]
+    assert cmd.startswith("find '/data out' -maxdepth 1 -name '*.xyz' -type f -printf")
+    assert entries == [
+        RemoteEntry(PurePosixPath("/data out/a.xyz"), 12, 1700000000.5),
+        RemoteEntry(PurePosixPath("/data out/sub dir/b c.xyz"), 0, 1700000001.0),
+    ]
+    ssh_connector.c.run.assert_not_called()
+
+
+def test_ssh_list_entries_empty_listing(ssh_connector):
+    _serve(ssh_connector, b"")
+    assert ssh_connector.list_entries(".xyz") == []
+
+
+def test_ssh_list_entries_raises_on_failed_find(ssh_connector):
+    _serve(ssh_connector, b"", status=1)
+    with pytest.raises(OeleoConnectionError, match="Failed to list remote content"):
+        ssh_connector.list_entries(".xyz")
+
+
+def _run_locally(cmd):
+    proc = subprocess.Popen(
+        ["sh", "-c", cmd],
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    channel = SimpleNamespace(recv_exit_status=proc.wait)
+    stdout = SimpleNamespace(read=proc.stdout.read, channel=channel)
+    return proc.stdin, stdout, proc.stderr
+
+
+def test_ssh_list_entries_falls_back_to_stat_without_find_printf(
+    ssh_connector, local_tmp_path
+):
+    commands = []
+
+    def exec_command(cmd):
+        # a find without -printf, like the one of BusyBox
+        commands.append(cmd)
+        if "-printf" in cmd:
+            cmd = "echo 'find: unrecognized: -printf' >&2; exit 1"
+        return _run_locally(cmd)
+
+    old = local_tmp_path / "filename1.xyz"
+    os.utime(old, (1_600_000_000, 1_600_000_000))
+    ssh_connector.directory = local_tmp_path
+    ssh_connector.c.client.exec_command.side_effect = exec_command
+
+    entries = ssh_connector.list_entries(".xyz")
+    assert sorted(entries) == [
+        RemoteEntry(PurePosixPath(old), 19, 1_600_000_000.0),
+        RemoteEntry(
+            PurePosixPath(local_tmp_path / "filename2.xyz"),
+            19,
+            int((local_tmp_path / "filename2.xyz").stat().st_mtime),
+        ),
+    ]
+    assert "-exec stat -c" in commands[-1]
+
+    commands.clear()
+    not_before = [("not_before", datetime.fromtimestamp(1_650_000_000))]
+    entries = ssh_connector.list_entries(".xyz", additional_filters=not_before)
+    assert [entry.path.name for entry in entries] == ["filename2.xyz"]
+    assert len(commands) == 1  # stat -c is used until the next reconnect
+
+
+@pytest.mark.parametrize("failure", ["exit 1", "broken channel"])
+def test_ssh_list_entries_keeps_printf_when_find_fails_otherwise(
+    ssh_connector, local_tmp_path, failure
+):
+    commands = []
+
+    def exec_command(cmd):
+        commands.append(cmd)
+        if cmd.startswith("find ") and "-maxdepth 0" not in cmd:
+            if failure == "broken channel":
+                raise EOFError(failure)
+            # e.g. an unreadable subdirectory
+            cmd = "echo 'find: sub: Permission denied' >&2; exit 1"
+        return _run_locally(cmd)
+
+    ssh_connector.directory = local_tmp_path
+    ssh_connector.c.client.exec_command.side_effect = exec_command
+
+    with pytest.raises(OeleoConnectionError):
+        ssh_connector.list_entries(".xyz")
+    assert not any("-exec stat" in cmd for cmd in commands)
+    assert ssh_connector._entry_listing is None
+
+
+def test_ssh_list_entries_skips_malformed_stat_records(ssh_connector):
+    ssh_connector._entry_listing = "-c"
+    _serve(ssh_connector, b"12 1700000000 /data out/a\nb.xyz\n3 1700000001 /c.xyz\n")
+
+    entries = ssh_connector.list_entries(".xyz")
+
+    assert entries == [
+        RemoteEntry(PurePosixPath("/data out/a"), 12, 1700000000.0),
+        RemoteEntry(PurePosixPath("/c.xyz"), 3, 1700000001.0),
+    ]
+
+
+def test_local_list_entries_has_size_and_mtime(local_tmp_path):
+    entries = LocalConnector(directory=local_tmp_path).list_entries(".xyz")
+
+    assert len(entries) == 2
+    for entry in entries:
+        st = entry.path.stat()
+        assert entry.size == st.st_size
+        assert entry.mtime == st.st_mtime
+
+
+def test_check_skips_remote_checksum_when_size_differs(tmp_path):
+    local_dir = tmp_path / "from"
+    local_dir.mkdir()
+    (local_dir / "a.xyz").write_text("grown since last copy")
+    (local_dir / "b.xyz").write_text("same")
+    local_sum = ChecksumChecker().check(local_dir / "b.xyz")["checksum"]
+
+    external = MagicMock()
+    external.is_local = False
+    external.directory = PurePosixPath("/data")
+    external.list_entries.return_value = [
+        RemoteEntry(PurePosixPath("/data/a.xyz"), 3, 0.0),
+        RemoteEntry(PurePosixPath("/data/b.xyz"), 4, 0.0),
+    ]
+    external.calculate_checksums.side_effect = lambda paths, **kwargs: {
+        p: local_sum for p in paths
+    }
+    reporter = MagicMock()
+    reporter.should_die.return_value = False
+
+    worker = Worker(
+        checker=ChecksumChecker(),
+        bookkeeper=MagicMock(),
+        local_connector=LocalConnector(directory=local_dir),
+        external_connector=external,
+        reporter=reporter,
+        extension=".xyz",
+        external_name_generator=lambda con, f: con.directory / f.name,
+    )
+    worker.filter_local()
+    worker.check()
+
+    requested = external.calculate_checksums.call_args.args[0]
+    assert requested == [PurePosixPath("/data/b.xyz")]
+    assert worker.number_of_external_duplicates == 2
+    assert worker.number_of_duplicates_out_of_sync == 1
@@ -0,0 +1,45 @@
+"""Unit tests for RemoteIndex, the hashed lookup used for "exists remotely" checks."""
+
+from pathlib import Path, PurePosixPath, PureWindowsPath
+
+from oeleo.connectors import RemoteIndex
+
+
+def test_index_matches_absolute_and_relative_forms():
+    index = RemoteIndex(
+        PurePosixPath("/data/out"),
+        [PurePosixPath("/data/out/a.xyz"), PurePosixPath("/data/out/sub/b.xyz")],
+    )
+
+    assert PurePosixPath("/data/out/a.xyz") in index
+    assert "a.xyz" in index
+    assert PurePosixPath("sub/b.xyz") in index
+    assert PurePosixPath("/data/out/c.xyz") not in index
+    assert len(index) == 2
+
+
+def test_index_matches_across_path_flavours():
+    index = RemoteIndex("/data/out", ["/data/out/sub/a.xyz"])
+
+    assert Path("/data/out/sub/a.xyz") in index
+    assert PureWindowsPath("sub\\a.xyz") in index
+
+
+def test_index_keeps_values_and_original_paths():
+    index = RemoteIndex(PurePosixPath("/data"))
+    index.add(PurePosixPath("/data/a.xyz"), value="entry-a")
+    index.add(PurePosixPath("/data/b.xyz"))
+
+    assert index.get("a.xyz") == "entry-a"
+    assert index.get("b.xyz") == PurePosixPath("/data/b.xyz")
+    assert index.get("missing.xyz", "nope") == "nope"
+    assert sorted(map(str, index)) == ["/data/b.xyz", "entry-a"]
+
+
+def test_index_handles_large_listings_quickly():
+    names = [PurePosixPath(f"/data/file_{i}.xyz") for i in range(100_000)]
+    index = RemoteIndex(PurePosixPath("/data"), names)
+
+    hits = sum(1 for i in range(0, 200_000, 2) if f"file_{i}.xyz" in index)
+
+    assert hits == 50_000
@@ -0,0 +1,60 @@
+"""Unit tests for the single-pass directory walker (oeleo.filters.scan_files)."""
+
+import os
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from oeleo.connectors import LocalConnector
+from oeleo.filters import ScannedPath, additional_filtering, base_filter, scan_files
+from oeleo.utils import stat_fingerprint
+
+
+def _names(paths):
+    return sorted(p.name for p in paths)
+
+
+def test_scan_files_matches_like_glob(local_tmp_path_with_subdirs):
+    d = local_tmp_path_with_subdirs
+    (d / "folder.xyz").mkdir()
+
+    for extension in [".xyz", ".txt", ".*", ".none"]:
+        expected = [p for p in d.glob(f"*{extension}") if p.is_file()]
+        assert _names(scan_files(d, extension)) == _names(expected)
+    assert _names(scan_files(d, [".xyz", ".txt"])) == _names(
+        p for p in d.iterdir() if p.is_file()
+    )
+    recursive = list(scan_files(d, ".xyz", recursive=True))
+    assert sorted(recursive) == sorted(p for p in d.rglob("*.xyz") if p.is_file())
+
+
+def test_scanned_paths_carry_their_stat(local_tmp_path):
+    paths = list(scan_files(local_tmp_path, ".xyz"))
+    assert all(isinstance(p, ScannedPath) for p in paths)
+    assert paths[0].stat_result == os.stat(paths[0])
+    assert paths[0].parent.stat_result is None
+    assert paths[0] == local_tmp_path / paths[0].name
+
+
+def test_filters_and_checker_reuse_the_scanned_stat(local_tmp_path):
+    paths = list(base_filter(local_tmp_path, [".xyz", ".txt"]))
+    yesterday = datetime.now() - timedelta(days=1)
+    with patch("os.stat", side_effect=AssertionError("stat called")):
+        kept = list(additional_filtering(paths, [("not_before", yesterday)]))
+        fingerprint = stat_fingerprint(kept[0])
+    assert _names(kept) == ["filename1.xyz", "filename2.xyz", "filename3.txt"]
+    assert fingerprint["size"] == len("some random strings")
+
+
+def test_local_connector_lists_in_one_walk(local_tmp_path_with_subdirs):
+    connector = LocalConnector(
+        directory=local_tmp_path_with_subdirs, include_subdirs=True
+    )
+    with patch("os.scandir", wraps=os.scandir) as scandir:
+        entries = connector.list_entries(".xyz")
+    assert scandir.call_count == 3  # the top directory and its two subdirs
+    assert _names(e.path for e in entries) == [
+        "filename1.xyz",
+        "filename1.xyz",
+        "filename2.xyz",
+        "filename2.xyz",
+    ]
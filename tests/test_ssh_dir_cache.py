@@ -0,0 +1,104 @@
+"""Unit tests for the cache of known remote directories in SSHConnector."""
+
+import shlex
+from pathlib import Path, PurePosixPath
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from oeleo.connectors import SSHConnector
+from oeleo.workers import simple_worker
+
+
+@pytest.fixture
+def connector(monkeypatch):
+    monkeypatch.setenv("OELEO_PASSWORD", "secret")
+    monkeypatch.setenv("OELEO_USERNAME", "tester")
+    monkeypatch.setenv("OELEO_EXTERNAL_HOST", "localhost")
+    monkeypatch.setattr("oeleo.connectors.time.sleep", lambda s: None)
+    connector = SSHConnector(directory="/data", use_password=True, is_posix=True)
+    fake = MagicMock()
+    fake.run.return_value.ok = True
+    fake.run.return_value.stdout = ""
+    connector.c = fake
+    connector.connect = MagicMock()
+    connector._put_file = MagicMock()
+    return connector
+
+
+def _mkdir_calls(connector):
+    return [
+        c.args[0] for c in connector.c.run.call_args_list if c.args[0].startswith("mkdir")
+    ]
+
+
+def test_move_func_creates_each_directory_once(connector):
+    for i in range(5):
+        assert connector.move_func(Path(f"f{i}.xyz"), PurePosixPath(f"/data/sub/f{i}.xyz"))
+
+    assert _mkdir_calls(connector) == ["mkdir -p /data/sub"]
+    assert connector._put_file.call_count == 5
+
+
+def test_reconnect_invalidates_cache(connector):
+    connector.move_func(Path("a.xyz"), PurePosixPath("/data/sub/a.xyz"))
+    connector.reconnect()
+    connector.move_func(Path("b.xyz"), PurePosixPath("/data/sub/b.xyz"))
+
+    assert len(_mkdir_calls(connector)) == 2
+
+
+def test_failed_put_invalidates_cache(connector):
+    connector._put_file.side_effect = [OSError("no such dir"), None]
+
+    assert connector.move_func(Path("a.xyz"), PurePosixPath("/data/sub/a.xyz"))
+
+    assert len(_mkdir_calls(connector)) == 2
+
+
+def test_ensure_dirs_creates_missing_dirs_in_one_command(connector):
+    connector._remember_dirs(["/data/known"])
+
+    connector.ensure_dirs(
+        [
+            PurePosixPath("/data/known"),
+            PurePosixPath("/data/new one"),
+            PurePosixPath("/data/new two"),
+            PurePosixPath("/data/new one"),
+        ]
+    )
+    connector.ensure_dirs([PurePosixPath("/data/new two")])
+
+    assert _mkdir_calls(connector) == [
+        f"mkdir -p {shlex.quote('/data/new one')} {shlex.quote('/data/new two')}"
+    ]
+
+
+def test_listing_seeds_cache(connector):
+    connector.c.run.return_value.stdout = "/data/sub/a.xyz\n/data/b.xyz\n"
+    connector._list_content("*.xyz", max_depth=None, hide=True)
+
+    connector.move_func(Path("c.xyz"), PurePosixPath("/data/sub/c.xyz"))
+
+    assert _mkdir_calls(connector) == []
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_worker_only_ensures_dirs_of_new_files(
+    local_tmp_path, external_tmp_path, max_workers
+):
+    worker = simple_worker(
+        db_name=":memory:",
+        base_directory_from=local_tmp_path,
+        base_directory_to=external_tmp_path,
+        max_workers=max_workers,
+    )
+    worker.connect_to_db()
+    with patch.object(worker.external_connector, "ensure_dirs") as ensure_dirs:
+        worker.filter_local()
+        worker.run()
+        ensure_dirs.assert_called_once_with({external_tmp_path})
+
+        worker.filter_local()
+        worker.run()
+        ensure_dirs.assert_called_once()
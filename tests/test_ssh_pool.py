@@ -0,0 +1,133 @@
+"""Unit tests for the SSH connection pool used by SSHConnector."""
+
+from pathlib import PurePosixPath
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import oeleo.connectors as connectors
+from oeleo.connectors import OeleoConnectionError, SSHConnectionPool, SSHConnector
+
+
+@pytest.fixture
+def ssh_env(monkeypatch):
+    monkeypatch.setenv("OELEO_PASSWORD", "secret")
+    monkeypatch.setenv("OELEO_USERNAME", "tester")
+    monkeypatch.setenv("OELEO_EXTERNAL_HOST", "localhost")
+    monkeypatch.delenv("OELEO_SSH_POOL_SIZE", raising=False)
+
+
+def _fake_connection():
+    c = MagicMock()
+    c.run.return_value.ok = True
+    c.is_connected = True
+    return c
+
+
+def test_pool_creates_lazily_and_reuses_connections():
+    factory = MagicMock(side_effect=lambda: _fake_connection())
+    pool = SSHConnectionPool(factory, size=2)
+    assert len(pool) == 0
+
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+
+    assert first is second
+    assert factory.call_count == 1
+    assert len(pool) == 1
+
+
+def test_pool_is_bounded():
+    pool = SSHConnectionPool(_fake_connection, size=2)
+    a = pool.checkout()
+    b = pool.checkout()
+    assert a is not b
+
+    with pytest.raises(OeleoConnectionError):
+        pool.checkout(timeout=0.01)
+
+    pool.checkin(a)
+    assert pool.checkout(timeout=0.01) is a
+
+
+def test_pool_drops_unhealthy_and_broken_connections():
+    discarded = []
+    pool = SSHConnectionPool(_fake_connection, size=1, on_discard=discarded.append)
+
+    with pool.connection() as c:
+        c.is_connected = False
+    assert discarded == [c]
+    c.close.assert_called_once()
+
+    with pytest.raises(OSError):
+        with pool.connection() as broken:
+            raise OSError("channel closed")
+    assert discarded == [c, broken]
+
+    with pool.connection() as fresh:
+        assert fresh is not broken
+
+
+def test_pool_close_closes_idle_and_returned_connections():
+    pool = SSHConnectionPool(_fake_connection, size=2)
+    idle = pool.checkout()
+    busy = pool.checkout()
+    pool.checkin(idle)
+
+    pool.close()
+    idle.close.assert_called_once()
+    busy.close.assert_not_called()
+
+    pool.checkin(busy)
+    busy.close.assert_called_once()
+    assert len(pool) == 0
+
+
+def test_pool_size_from_kwarg_and_env(ssh_env, monkeypatch):
+    assert SSHConnector(directory="/data", use_password=True).pool_size == 1
+    monkeypatch.setenv("OELEO_SSH_POOL_SIZE", "4")
+    assert SSHConnector(directory="/data", use_password=True).pool_size == 4
+    assert (
+        SSHConnector(directory="/data", use_password=True, pool_size=2).pool_size == 2
+    )
+    with pytest.raises(ValueError):
+        SSHConnector(directory="/data", use_password=True, pool_size=0)
+
+
+def test_connector_borrows_from_pool(ssh_env, tmp_path):
+    connector = SSHConnector(directory="/data", use_password=True, pool_size=2)
+    connector._new_connection = MagicMock(side_effect=lambda: _fake_connection())
+    connector.connect()
+
+    with connector._borrow() as a, connector._borrow() as b:
+        assert a is not b
+        assert connector.c not in (a, b)
+
+    f = tmp_path / "data.xyz"
+    f.write_bytes(b"x")
+    with patch.object(connectors.SFTPClient, "from_transport") as from_transport:
+        assert connector.move_func(f, PurePosixPath("/data/sub/data.xyz"))
+        assert connector.move_func(f, PurePosixPath("/data/sub/other.xyz"))
+
+    # both uploads ran on one pooled connection and reused its sftp session
+    from_transport.assert_called_once()
+    connector.c.run.assert_not_called()
+    assert len(connector._sftp_clients) == 1
+
+
+def test_reconnect_replaces_the_pool(ssh_env):
+    connector = SSHConnector(directory="/data", use_password=True, pool_size=2)
+    connector._new_connection = MagicMock(side_effect=lambda: _fake_connection())
+    connector.connect()
+    with connector._borrow() as old:
+        pass
+    old_pool = connector._pool
+
+    connector.reconnect()
+
+    old.close.assert_called_once()
+    assert connector._pool is not old_pool
+    with connector._borrow() as new:
+        assert new is not old
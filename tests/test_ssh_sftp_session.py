@@ -0,0 +1,89 @@
+"""Unit tests for the persistent, tunable SFTP session used by SSHConnector uploads."""
+
+import os
+from pathlib import PurePosixPath
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+import oeleo.connectors as connectors
+from oeleo.connectors import SSHConnector
+
+
+@pytest.fixture
+def ssh_env(monkeypatch):
+    monkeypatch.setenv("OELEO_PASSWORD", "secret")
+    monkeypatch.setenv("OELEO_USERNAME", "tester")
+    monkeypatch.setenv("OELEO_EXTERNAL_HOST", "localhost")
+    for name in (
+        "OELEO_SFTP_WINDOW_SIZE",
+        "OELEO_SFTP_MAX_PACKET_SIZE",
+        "OELEO_SFTP_PIPELINED",
+        "OELEO_SFTP_BUFFER_SIZE",
+    ):
+        monkeypatch.delenv(name, raising=False)
+
+
+def _connector(**kwargs):
+    connector = SSHConnector(directory="/data", use_password=True, **kwargs)
+    connector.c = MagicMock()
+    connector.c.run.return_value.ok = True
+    return connector
+
+
+def test_sftp_settings_default_and_env(ssh_env, monkeypatch):
+    connector = _connector()
+    assert connector.sftp_window_size is None
+    assert connector.sftp_max_packet_size is None
+    assert connector.sftp_pipelined is True
+    assert connector.sftp_buffer_size == connectors.SFTP_BUFFER_SIZE
+
+    monkeypatch.setenv("OELEO_SFTP_WINDOW_SIZE", "16777216")
+    monkeypatch.setenv("OELEO_SFTP_PIPELINED", "false")
+    connector = _connector(sftp_max_packet_size=65536)
+    assert connector.sftp_window_size == 16_777_216
+    assert connector.sftp_max_packet_size == 65536
+    assert connector.sftp_pipelined is False
+
+
+def test_sftp_session_is_reused_and_tuned(ssh_env, tmp_path):
+    connector = _connector(sftp_window_size=8_388_608, sftp_max_packet_size=65536)
+    with patch.object(connectors.SFTPClient, "from_transport") as from_transport:
+        for i in range(3):
+            f = tmp_path / f"f{i}.xyz"
+            f.write_bytes(b"x")
+            assert connector.move_func(f, PurePosixPath(f"/data/f{i}.xyz"))
+
+    from_transport.assert_called_once_with(
+        connector.c.transport, window_size=8_388_608, max_packet_size=65536
+    )
+
+
+def test_put_file_streams_blocks_with_pipelining(ssh_env, tmp_path):
+    connector = _connector(sftp_buffer_size=4)
+    sftp = MagicMock()
+    remote_file = sftp.open.return_value.__enter__.return_value
+    connector._sftp_clients[id(connector.c)] = sftp
+    f = tmp_path / "data.xyz"
+    f.write_bytes(b"0123456789")
+    os.chmod(f, 0o640)
+
+    connector._put_file(f, PurePosixPath("/data/data.xyz"))
+
+    sftp.open.assert_called_once_with("/data/data.xyz", "wb", bufsize=4)
+    remote_file.set_pipelined.assert_called_once_with(True)
+    written = [c.args[0] for c in remote_file.write.call_args_list]
+    assert written == [b"0123", b"4567", b"89"]
+    sftp.chmod.assert_called_once_with("/data/data.xyz", 0o640)
+
+
+def test_close_and_reconnect_drop_sftp_session(ssh_env):
+    connector = _connector()
+    connector.connect = MagicMock()
+    sftp = MagicMock()
+    connector._sftp_clients[id(connector.c)] = sftp
+
+    connector.reconnect()
+
+    sftp.close.assert_called_once()
+    assert connector._sftp_clients == {}
@@ -0,0 +1,107 @@
+"""Unit tests for the stat fingerprint fast path in ChecksumChecker / SimpleDbHandler."""
+
+import os
+import sqlite3
+from unittest.mock import patch
+
+import pytest
+
+from oeleo.checkers import ChecksumChecker, resolve_check_mode
+from oeleo.models import SimpleDbHandler
+
+
+def _old_schema_db(path):
+    con = sqlite3.connect(path)
+    con.execute(
+        "CREATE TABLE filelist ("
+        "id INTEGER NOT NULL PRIMARY KEY, processed_date DATETIME NOT NULL, "
+        "local_name VARCHAR(255) NOT NULL, external_name VARCHAR(255), "
+        "checksum VARCHAR(255), code SMALLINT NOT NULL)"
+    )
+    con.execute(
+        "INSERT INTO filelist (processed_date, local_name, external_name, checksum, code) "
+        "VALUES ('2022-07-05 15:55:02', 'a.xyz', '/to/a.xyz', 'abc', 1)"
+    )
+    con.commit()
+    con.close()
+
+
+def test_initialize_db_migrates_old_schema(tmp_path):
+    db_path = tmp_path / "old.db"
+    _old_schema_db(db_path)
+
+    bookkeeper = SimpleDbHandler(str(db_path))
+    bookkeeper.initialize_db()
+
+    columns = {c.name for c in bookkeeper.db_instance.get_columns("filelist")}
+    assert {"size", "mtime_ns", "inode"} <= columns
+    record = bookkeeper.db_model.get(local_name="a.xyz")
+    assert record.checksum == "abc"
+    assert record.size is None
+
+
+def test_resolve_check_mode(monkeypatch):
+    monkeypatch.delenv("OELEO_CHECK_MODE", raising=False)
+    assert resolve_check_mode() == "stat"
+    monkeypatch.setenv("OELEO_CHECK_MODE", "FULL")
+    assert resolve_check_mode() == "full"
+    assert resolve_check_mode("stat") == "stat"
+    with pytest.raises(ValueError):
+        resolve_check_mode("sometimes")
+
+
+@pytest.fixture
+def registered_file(db_tmp_path, local_file_tmp_path):
+    bookkeeper = SimpleDbHandler(db_tmp_path)
+    bookkeeper.initialize_db()
+    record = bookkeeper.register(local_file_tmp_path)
+    checks = ChecksumChecker(mode="full").check(local_file_tmp_path, record=record)
+    bookkeeper.update_record("/to/x", record=record, **checks)
+    return bookkeeper, record, local_file_tmp_path
+
+
+def test_stat_mode_reuses_checksum_when_stat_unchanged(registered_file):
+    _bookkeeper, record, f = registered_file
+    checker = ChecksumChecker(mode="stat")
+
+    with patch("oeleo.checkers.calculate_checksum") as calc:
+        checks = checker.check(f, record=record)
+
+    calc.assert_not_called()
+    assert checks["checksum"] == record.checksum
+    assert checks["size"] == f.stat().st_size
+
+
+def test_stat_mode_rehashes_when_mtime_changed(registered_file):
+    _bookkeeper, record, f = registered_file
+    st = f.stat()
+    os.utime(f, ns=(st.st_atime_ns, st.st_mtime_ns + 5_000_000_000))
+
+    with patch("oeleo.checkers.calculate_checksum", return_value="new") as calc:
+        checks = ChecksumChecker(mode="stat").check(f, record=record)
+
+    calc.assert_called_once_with(f, "md5")
+    assert checks["checksum"] == "new"
+
+
+def test_full_mode_always_rehashes(registered_file):
+    _bookkeeper, record, f = registered_file
+
+    with patch("oeleo.checkers.calculate_checksum", return_value="x") as calc:
+        ChecksumChecker(mode="full").check(f, record=record)
+
+    calc.assert_called_once_with(f, "md5")
+
+
+def test_touched_file_is_unchanged_and_fingerprint_refreshed(registered_file):
+    bookkeeper, record, f = registered_file
+    st = f.stat()
+    os.utime(f, ns=(st.st_atime_ns, st.st_mtime_ns + 5_000_000_000))
+
+    checks = ChecksumChecker(mode="stat").check(f, record=record)
+    assert not bookkeeper.is_changed(record=record, **checks)
+
+    bookkeeper.refresh_record(record=record, **checks)
+    stored = bookkeeper.db_model.get(local_name=f.name)
+    assert stored.mtime_ns == st.st_mtime_ns + 5_000_000_000
+    assert stored.code == 1
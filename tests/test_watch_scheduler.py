@@ -0,0 +1,258 @@
+"""Unit tests for the watch mode (oeleo.watchers and WatchScheduler)."""
+
+import ctypes
+import errno
+import os
+import time
+from unittest.mock import patch
+
+import pytest
+
+import oeleo.watchers as watchers
+from oeleo.schedulers import WatchScheduler
+from oeleo.watchers import (
+    Debouncer,
+    InotifyWatcher,
+    PollingWatcher,
+    inotify_available,
+    resolve_watch_backend,
+)
+from oeleo.workers import simple_worker
+
+HOUR = 3_600
+
+
+def test_resolve_watch_backend(monkeypatch):
+    monkeypatch.setenv("OELEO_WATCH_BACKEND", "polling")
+    assert resolve_watch_backend() == "polling"
+    assert resolve_watch_backend("auto") in ("inotify", "watchdog", "polling")
+    with pytest.raises(ValueError):
+        resolve_watch_backend("fanotify")
+
+
+def test_debouncer_coalesces_and_waits_for_quiet_files(tmp_path):
+    a, b = tmp_path / "a.xyz", tmp_path / "b.xyz"
+    debouncer = Debouncer(quiet=5, max_delay=60)
+    debouncer.add([a, b], now=0)
+    debouncer.add([a], now=3)
+    assert debouncer.pop_ready(now=4) == []
+    assert debouncer.pop_ready(now=5) == [b]
+    for t in range(6, 60, 2):  # a is written to all the time
+        debouncer.add([a], now=t)
+        assert debouncer.pop_ready(now=t) == []
+    debouncer.add([a], now=60)
+    assert debouncer.pop_ready(now=60) == [a]
+    assert len(debouncer) == 0
+
+
+def test_polling_watcher_reports_new_and_modified_files(local_tmp_path_with_subdirs):
+    d = local_tmp_path_with_subdirs
+    watcher = PollingWatcher(d, extension=".xyz", recursive=True, interval=0)
+    watcher.start()
+    assert watcher.poll(0) == set()
+
+    (d / "subdir1" / "new.xyz").write_text("new")
+    (d / "subdir1" / "new.txt").write_text("new")
+    (d / "filename1.xyz").write_text("some more random strings")
+    assert watcher.poll(0) == {d / "subdir1" / "new.xyz", d / "filename1.xyz"}
+
+
+def test_polling_watcher_does_not_list_unchanged_directories(
+    local_tmp_path_with_subdirs,
+):
+    d = local_tmp_path_with_subdirs
+    then = time.time() - 2 * HOUR
+    for current, _, files in os.walk(d):
+        for path in [current, *(os.path.join(current, f) for f in files)]:
+            os.utime(path, (then, then))
+    watcher = PollingWatcher(
+        d, extension=".xyz", recursive=True, interval=0, full_scan_interval=HOUR
+    )
+    watcher.start()
+    assert watcher.poll(0) == set()
+    assert watcher._index.skipped == 3
+
+    (d / "subdir1" / "new.xyz").write_text("new")
+    assert watcher.poll(0) == {d / "subdir1" / "new.xyz"}
+    assert (watcher._index.listed, watcher._index.skipped) == (1, 2)
+
+    watcher._index.last_full_scan -= HOUR
+    assert watcher.poll(0) == set()  # the skipped directories kept their files
+    assert watcher._index.full
+
+
+def test_auto_backend_warns_when_it_falls_back_to_polling(monkeypatch):
+    monkeypatch.delenv("OELEO_WATCH_BACKEND", raising=False)
+    monkeypatch.setattr(watchers, "inotify_available", lambda: False)
+    monkeypatch.setattr(watchers, "watchdog", None)
+    with patch.object(watchers.log, "warning") as warning:
+        assert resolve_watch_backend() == "polling"
+    assert "polling" in warning.call_args.args[0]
+
+
+@pytest.mark.skipif(not inotify_available(), reason="needs inotify")
+def test_inotify_watcher_follows_new_directories(local_tmp_path_with_subdirs):
+    d = local_tmp_path_with_subdirs
+    watcher = InotifyWatcher(d, extension=".xyz", recursive=True)
+    watcher.start()
+    try:
+        (d / "subdir2" / "filename2.xyz").write_text("appended")
+        (d / "today").mkdir()
+        assert watcher.poll(1) == {d / "subdir2" / "filename2.xyz"}
+        (d / "today" / "run.xyz").write_text("data")
+        (d / "today" / "run.txt").write_text("data")
+        changed = set()
+        for _ in range(10):
+            changed |= watcher.poll(0.1)
+        assert changed == {d / "today" / "run.xyz"}
+    finally:
+        watcher.close()
+
+
+class _RefusingLibc:
+    """The C library, but inotify_add_watch fails for some directories."""
+
+    def __init__(self, libc, refused):
+        self._libc = libc
+        self.refused = refused
+
+    def inotify_init1(self, flags):
+        return self._libc.inotify_init1(flags)
+
+    def inotify_add_watch(self, fd, path, mask):
+        if os.fsdecode(path) in self.refused:
+            ctypes.set_errno(errno.ENOSPC)
+            return -1
+        return self._libc.inotify_add_watch(fd, path, mask)
+
+
+@pytest.mark.skipif(not inotify_available(), reason="needs inotify")
+def test_inotify_watcher_polls_directories_it_cannot_watch(
+    local_tmp_path_with_subdirs, monkeypatch
+):
+    d = local_tmp_path_with_subdirs
+    libc = _RefusingLibc(watchers._libc(), {str(d / "subdir1")})
+    monkeypatch.setattr(watchers, "_libc", lambda: libc)
+    watcher = InotifyWatcher(d, extension=".xyz", recursive=True, interval=0)
+    watcher.start()
+    try:
+        assert list(watcher._unwatched) == [str(d / "subdir1")]
+        (d / "subdir1" / "new.xyz").write_text("new")
+        (d / "subdir1" / "deeper").mkdir()
+        (d / "subdir1" / "deeper" / "deep.xyz").write_text("deep")
+        (d / "subdir2" / "filename2.xyz").write_text("appended")
+        assert watcher.poll(1) == {
+            d / "subdir1" / "new.xyz",
+            d / "subdir1" / "deeper" / "deep.xyz",
+            d / "subdir2" / "filename2.xyz",
+        }
+
+        libc.refused.clear()  # watches are free again
+        assert watcher.poll(0) == set()
+        assert watcher._unwatched == {}
+        (d / "subdir1" / "new.xyz").write_text("newer")
+        assert watcher.poll(1) == {d / "subdir1" / "new.xyz"}
+    finally:
+        watcher.close()
+
+
+class _ScriptedWatcher:
+    """A watcher that creates a file and reports it (or a lost event) on its first
+    poll."""
+
+    def __init__(self, path, lose_event=False):
+        self.path = path
+        self.lose_event = lose_event
+        self.needs_rescan = False
+        self.polls = 0
+        self.closed = False
+
+    def start(self):
+        pass
+
+    def poll(self, timeout):
+        self.polls += 1
+        if self.polls == 1:
+            self.path.write_text("new data")
+            self.needs_rescan = self.lose_event
+            return set() if self.lose_event else {self.path}
+        return set()
+
+    def close(self):
+        self.closed = True
+
+
+def test_watch_scheduler_runs_the_worker_on_changed_files(
+    local_tmp_path, external_tmp_path
+):
+    worker = simple_worker(
+        db_name=":memory:",
+        base_directory_from=local_tmp_path,
+        base_directory_to=external_tmp_path,
+    )
+    watcher = _ScriptedWatcher(local_tmp_path / "new.xyz")
+    s = WatchScheduler(
+        worker,
+        max_run_intervals=2,
+        debounce=0,
+        watcher=watcher,
+        poll_interval=0,
+        additional_filters=[("excluded", ["filename2.xyz"])],
+    )
+    with patch.object(worker, "filter_local", wraps=worker.filter_local) as scan:
+        s.start()
+
+    assert scan.call_count == 1  # only the reconciliation at the start
+    assert sorted(f.name for f in external_tmp_path.iterdir()) == [
+        "filename1.xyz",
+        "new.xyz",
+    ]
+    assert s.state["reconciliations"] == 1
+    assert watcher.closed
+
+
+def test_watch_scheduler_rescans_when_events_were_lost(
+    local_tmp_path, external_tmp_path
+):
+    worker = simple_worker(
+        db_name=":memory:",
+        base_directory_from=local_tmp_path,
+        base_directory_to=external_tmp_path,
+    )
+    watcher = _ScriptedWatcher(local_tmp_path / "new.xyz", lose_event=True)
+    s = WatchScheduler(worker, max_run_intervals=2, watcher=watcher, poll_interval=0)
+    start = time.monotonic()
+    s.start()
+
+    assert s.state["reconciliations"] == 2
+    assert time.monotonic() - start < 5  # did not wait for the debounce
+    assert (external_tmp_path / "new.xyz").is_file()
+
+
+def test_watch_scheduler_rescans_every_directory_with_incremental_scans(
+    local_tmp_path_with_subdirs, external_tmp_path
+):
+    d = local_tmp_path_with_subdirs
+    then = time.time() - 2 * HOUR
+    for current, _, files in os.walk(d):
+        for path in [current, *(os.path.join(current, f) for f in files)]:
+            os.utime(path, (then, then))
+    worker = simple_worker(
+        db_name=":memory:",
+        base_directory_from=d,
+        base_directory_to=external_tmp_path,
+        include_subdirs=True,
+        external_subdirs=True,
+        incremental_scan=True,
+        full_scan_interval=HOUR,
+    )
+    # modified in place: the mtime of its (old) directory does not change
+    changed = d / "subdir1" / "filename1.xyz"
+    watcher = _ScriptedWatcher(changed, lose_event=True)
+    s = WatchScheduler(worker, max_run_intervals=2, watcher=watcher, poll_interval=0)
+    s.start()
+
+    assert s.state["reconciliations"] == 2
+    assert worker.directory_index.full
+    copy = external_tmp_path / "subdir1" / "filename1.xyz"
+    assert copy.read_text() == "new data"
@@ -0,0 +1,244 @@
+"""Unit tests for the concurrent transfer mode of Worker.run (max_workers > 1)."""
+
+import os
+import threading
+from unittest.mock import MagicMock
+
+import pytest
+
+from oeleo.connectors import OeleoConnectionError
+from oeleo.workers import (
+    FileContext,
+    Worker,
+    resolve_max_workers,
+    simple_worker,
+)
+from oeleo.utils import ConnectionGuard
+
+
+def _threaded_worker(tmp_path, max_workers=4):
+    local = MagicMock()
+    local.directory = tmp_path / "from"
+    local.directory.mkdir(exist_ok=True)
+
+    external = MagicMock()
+    external.directory = tmp_path / "to"
+    external.directory.mkdir(exist_ok=True)
+    external.move_func.return_value = True
+
+    bookkeeper = MagicMock()
+    bookkeeper.is_changed.return_value = True
+    bookkeeper.register.side_effect = lambda f: f"record-{f.name}"
+
+    checker = MagicMock()
+    checker.check.side_effect = lambda f, **kwargs: {"checksum": f"sum-{f.name}"}
+
+    reporter = MagicMock()
+    reporter.should_die.return_value = False
+
+    worker = Worker(
+        checker=checker,
+        bookkeeper=bookkeeper,
+        local_connector=local,
+        external_connector=external,
+        reporter=reporter,
+        max_workers=max_workers,
+    )
+    return worker, external, bookkeeper
+
+
+def _make_files(tmp_path, n):
+    files = []
+    for i in range(n):
+        f = tmp_path / "from" / f"file{i}.xyz"
+        f.write_text(f"data {i}")
+        files.append(f)
+    return files
+
+
+def test_resolve_max_workers_defaults_and_env(monkeypatch):
+    monkeypatch.delenv("OELEO_MAX_WORKERS", raising=False)
+    assert resolve_max_workers(None) == 1
+    assert resolve_max_workers(8) == 8
+
+    monkeypatch.setenv("OELEO_MAX_WORKERS", "6")
+    assert resolve_max_workers(None) == 6
+    assert resolve_max_workers(2) == 2
+
+    with pytest.raises(ValueError):
+        resolve_max_workers(0)
+
+
+def test_threaded_run_commits_each_file_with_its_own_context(tmp_path):
+    worker, external, bookkeeper = _threaded_worker(tmp_path)
+    files = _make_files(tmp_path, 45)
+    worker.file_names = files
+
+    worker.run()
+
+    assert external.move_func.call_count == 45
+    assert bookkeeper.update_record.call_count == 45
+    for call in bookkeeper.update_record.call_args_list:
+        external_name = call.args[0]
+        assert call.kwargs["record"] == f"record-{external_name.name}"
+        assert call.kwargs["checksum"] == f"sum-{external_name.name}"
+
+
+def test_threaded_run_writes_db_on_calling_thread_only(tmp_path):
+    worker, external, bookkeeper = _threaded_worker(tmp_path)
+    worker.file_names = _make_files(tmp_path, 30)
+    main_thread = threading.get_ident()
+    db_threads = set()
+    move_threads = set()
+
+    def record_thread(*args, **kwargs):
+        db_threads.add(threading.get_ident())
+
+    def move(*args, **kwargs):
+        move_threads.add(threading.get_ident())
+        return True
+
+    bookkeeper.update_record.side_effect = record_thread
+    external.move_func.side_effect = move
+
+    worker.run()
+
+    assert db_threads == {main_thread}
+    assert main_thread not in move_threads
+
+
+def test_threaded_run_uses_one_executor_per_run(tmp_path, monkeypatch):
+    import oeleo.workers as workers_mod
+
+    created = []
+    original = workers_mod.ThreadPoolExecutor
+
+    def counting_executor(*args, **kwargs):
+        created.append(kwargs.get("max_workers"))
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(workers_mod, "ThreadPoolExecutor", counting_executor)
+    worker, _external, _bookkeeper = _threaded_worker(tmp_path, max_workers=3)
+    worker.file_names = _make_files(tmp_path, 50)
+
+    worker.run()
+
+    assert created == [3]
+
+
+def test_threaded_run_aborts_when_connection_lost_after_failed_move(tmp_path):
+    worker, external, bookkeeper = _threaded_worker(tmp_path, max_workers=2)
+    external.move_func.return_value = False
+    external.ensure_connection.side_effect = [None, OeleoConnectionError("gone")]
+    worker.file_names = _make_files(tmp_path, 5)
+
+    with pytest.raises(OeleoConnectionError):
+        worker.run()
+
+    bookkeeper.update_record.assert_not_called()
+
+
+def test_serial_process_file_returns_failed_path(tmp_path):
+    worker, external, bookkeeper = _threaded_worker(tmp_path, max_workers=1)
+    external.move_func.return_value = False
+    f = _make_files(tmp_path, 1)[0]
+
+    assert worker._process_file(f) == f
+    bookkeeper.update_record.assert_not_called()
+
+
+def test_prepare_file_does_not_touch_shared_external_name(tmp_path):
+    worker, _external, _bookkeeper = _threaded_worker(tmp_path)
+    f = _make_files(tmp_path, 1)[0]
+
+    ctx = worker._prepare_file(f)
+
+    assert isinstance(ctx, FileContext)
+    assert ctx.external_name == worker.external_connector.directory / f.name
+    assert ctx.record == "record-file0.xyz"
+    assert worker.external_name == ""
+
+
+def test_simple_worker_threaded_copies_all_files(
+    monkeypatch, db_tmp_path, local_tmp_path, external_tmp_path
+):
+    monkeypatch.delenv("OELEO_MAX_WORKERS", raising=False)
+    for i in range(30):
+        (local_tmp_path / f"extra{i}.xyz").write_text(f"extra {i}")
+
+    worker = simple_worker(
+        db_name=db_tmp_path,
+        base_directory_from=local_tmp_path,
+        base_directory_to=external_tmp_path,
+        max_workers=4,
+    )
+    worker.connect_to_db()
+    worker.filter_local()
+    worker.run()
+
+    assert len(os.listdir(external_tmp_path)) == 32
+    records = list(worker.bookkeeper.db_model.select())
+    assert len(records) == 32
+    assert all(r.code == 1 and r.checksum for r in records)
+
+
+def test_connection_guard_reconnects_after_transfers_in_other_threads():
+    guard = ConnectionGuard()
+    transferring, release, reconnected = (threading.Event() for _ in range(3))
+
+    def transfer():
+        with guard.use():
+            transferring.set()
+            assert release.wait(5)
+
+    t = threading.Thread(target=transfer)
+    t.start()
+    assert transferring.wait(5)
+    r = threading.Thread(target=guard.reconnect, args=(reconnected.set,))
+    r.start()
+    assert not reconnected.wait(0.1)
+    release.set()
+    t.join()
+    r.join()
+    assert reconnected.is_set()
+
+    calls = []
+    with guard.use():  # a thread may reconnect inside its own use
+        guard.reconnect(lambda: calls.append(1))
+    assert calls == [1]
+
+
+def test_threaded_run_reconnects_while_no_other_file_is_moving(tmp_path):
+    worker, external, bookkeeper = _threaded_worker(tmp_path, max_workers=2)
+    first, second = _make_files(tmp_path, 2)
+    first_moving, second_failed, reconnected = (threading.Event() for _ in range(3))
+    moving = set()
+    moving_at_reconnect = []
+
+    def move_func(path, to, **kwargs):
+        if path == first:
+            moving.add(path)
+            first_moving.set()
+            assert second_failed.wait(5)
+            # the failed move of the second file now asks for a reconnect
+            reconnected.wait(0.2)
+            moving.discard(path)
+            return True
+        if not second_failed.is_set():
+            assert first_moving.wait(5)
+            second_failed.set()
+            return False
+        return True
+
+    def reconnect():
+        moving_at_reconnect.append(set(moving))
+        reconnected.set()
+
+    external.move_func.side_effect = move_func
+    external.reconnect.side_effect = reconnect
+    worker.file_names = [first, second]
+    worker.run()
+
+    assert moving_at_reconnect == [set()]
+    assert external.move_func.call_count == 3
+    assert bookkeeper.update_record.call_count == 2